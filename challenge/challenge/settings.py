@@ -42,7 +42,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,6 +90,145 @@ DATABASES = {
     }
 }
 
+# Read replica
+# When DB_REPLICA_HOST is set, the reads of safe requests go to the replica alias, see
+# core.routers.PrimaryReplicaRouter. The other DB_REPLICA_* variables default to the primary
+# ones, and the test database of the replica mirrors the default one.
+
+if os.environ.get("DB_REPLICA_HOST"):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get("DB_REPLICA_NAME", DATABASES['default']['NAME']),
+        'USER': os.environ.get("DB_REPLICA_USER", DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get("DB_REPLICA_PASSWORD", DATABASES['default']['PASSWORD']),
+        'HOST': os.environ.get("DB_REPLICA_HOST"),
+        'PORT': os.environ.get("DB_REPLICA_PORT", DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+
+
+# Currency API
+# The provider is wrapped by core.external_apis.currency_api.CachedRateProvider, values younger
+# than TTL seconds are served from memory and values younger than STALE_TTL are served while
+# they are refreshed in background. Set CACHE_ALIAS to share the values between processes.
+
+CURRENCY_API = {
+    'PROVIDER': os.environ.get('CURRENCY_API_PROVIDER', 'core.external_apis.currency_api.HttpRateProvider'),
+    'OPTIONS': {},
+    'TTL': 60,
+    'STALE_TTL': 600,
+    'CACHE_ALIAS': os.environ.get('CURRENCY_API_CACHE_ALIAS'),
+}
+
+
+# Django REST framework
+# JSON is rendered and parsed with orjson, core.renderers.FastJSONRenderer and
+# core.parsers.FastJSONParser fall back to the DRF classes when it is not installed.
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+
+# Request profiling
+# core.middleware.ProfilingMiddleware adds a Server-Timing header with the SQL, external HTTP and
+# serializer time of every request and logs it. SAMPLE_RATE of the requests also run under cProfile,
+# and the stats of the ones slower than SLOW_REQUEST_MS are dumped to DUMP_DIR.
+
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true'),
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', 0.0)),
+    'SLOW_REQUEST_MS': 500,
+    'DUMP_DIR': os.environ.get('PROFILING_DUMP_DIR'),
+}
+
+
+# Metrics
+# core.middleware.MetricsMiddleware records the latency and query count of the requests by named
+# route, served with the other metrics of core.metrics.collectors in the Prometheus text format
+# by the metrics/ endpoint. Every worker process exposes its own metrics.
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true')
+
+
+# Client list pagination
+# Default and maximum page size of the clients/ listing, the unpaginated listing
+# (?paginate=false) is only allowed when CLIENTS_ALLOW_UNPAGINATED is True.
+
+CLIENTS_PAGE_SIZE = 100
+
+CLIENTS_MAX_PAGE_SIZE = 1000
+
+CLIENTS_ALLOW_UNPAGINATED = False
+
+# Number of clients (and accounts) inserted per statement by the clients/bulk/ endpoint.
+
+CLIENTS_BULK_BATCH_SIZE = 1000
+
+# Cache of the client detail and accounts responses, keyed by the version of the client.
+
+CLIENTS_CACHE_ALIAS = 'default'
+
+CLIENTS_CACHE_TIMEOUT = 300
+
+# Category balances
+# Number of CategoryBalance rows every category is split into, changing it requires running
+# the rebuild_category_balances command.
+
+CATEGORY_BALANCE_SHARDS = 16
+
+
+# Background jobs
+# Jobs are queued in the core_job table and run by the run_jobs command, CONCURRENCY at a time.
+# Failed attempts are retried after BACKOFF_BASE * 2 ** (attempts - 1) seconds, up to BACKOFF_MAX,
+# Workers refresh the heartbeat of their running jobs every HEARTBEAT_INTERVAL seconds, and the
+# running jobs without a heartbeat for STALE_AFTER seconds, left by a dead worker, are given back
+# to the queue. The files of the export_movements task are written to EXPORT_DIR, the temporary
+# directory by default.
+
+JOBS = {
+    'CONCURRENCY': int(os.environ.get('JOBS_CONCURRENCY', 4)),
+    'POLL_INTERVAL': 1.0,
+    'MAX_ATTEMPTS': 3,
+    'BACKOFF_BASE': 10.0,
+    'BACKOFF_MAX': 3600.0,
+    'HEARTBEAT_INTERVAL': 30.0,
+    'STALE_AFTER': 300.0,
+    'EXPORT_DIR': os.environ.get('JOBS_EXPORT_DIR'),
+}
+
+
+# Account statements
+# Default and maximum number of movements per page of clients/<pk>/accounts/<account_pk>/statement/.
+
+STATEMENTS_PAGE_SIZE = 100
+
+STATEMENTS_MAX_PAGE_SIZE = 1000
+
+
+# Bulk movements
+# Number of movements validated and written per transaction by the movements/bulk/ endpoint.
+
+MOVEMENTS_BULK_BATCH_SIZE = 1000
+
+MOVEMENTS_BULK_MAX_BATCH_SIZE = 10000
+
+# Number of movements fetched per round trip by the movements/export/ server-side cursor.
+
+MOVEMENTS_EXPORT_CHUNK_SIZE = 2000
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
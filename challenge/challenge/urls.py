@@ -17,19 +17,52 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from core.client.views import AccountBalanceAsOf
+from core.client.views import AccountPeriodTotals
+from core.client.views import AccountStatement
+from core.client.views import AsyncClientAccountBalance
+from core.client.views import AsyncClientDetail
+from core.client.views import CategoryBalanceReport
 from core.client.views import ClientAccountBalance
+from core.client.views import ClientBulkCreate
 from core.client.views import ClientCategoryAssignment
 from core.client.views import ClientDetailUpdate
 from core.client.views import ClientListCreate
+from core.external_apis.views import AsyncCurrencyValues
+from core.external_apis.views import CurrencyValues
+from core.jobs.views import JobDetailCancel
+from core.jobs.views import JobListCreate
+from core.metrics.views import Metrics
+from core.movements.views import AsyncMovementDetail
+from core.movements.views import MovementBulkCreate
 from core.movements.views import MovementCreate
 from core.movements.views import MovementDetailDelete
+from core.movements.views import MovementExport
 
 urlpatterns = [
     path('clients/', ClientListCreate.as_view(), name="clients"),
+    path('clients/bulk/', ClientBulkCreate.as_view(), name="clients_bulk"),
     path('clients/<int:pk>/', ClientDetailUpdate.as_view(), name="clients_detail"),
     path('clients/<int:pk>/accounts/', ClientAccountBalance.as_view(), name="clients_accounts"),
+    path('clients/<int:pk>/accounts/<int:account_pk>/balance/', AccountBalanceAsOf.as_view(),
+         name="clients_accounts_balance"),
+    path('clients/<int:pk>/accounts/<int:account_pk>/totals/', AccountPeriodTotals.as_view(),
+         name="clients_accounts_totals"),
+    path('clients/<int:pk>/accounts/<int:account_pk>/statement/', AccountStatement.as_view(),
+         name="clients_accounts_statement"),
     path('clients/categories/', ClientCategoryAssignment.as_view(), name="clients_category"),
+    path('categories/report/', CategoryBalanceReport.as_view(), name="categories_report"),
     path('movements/', MovementCreate.as_view(), name="movements"),
+    path('movements/bulk/', MovementBulkCreate.as_view(), name="movements_bulk"),
+    path('movements/export/', MovementExport.as_view(), name="movements_export"),
     path('movements/<int:pk>/', MovementDetailDelete.as_view(), name="movements_detail"),
+    path('currencies/', CurrencyValues.as_view(), name="currencies"),
+    path('async/clients/<int:pk>/', AsyncClientDetail.as_view(), name="async_clients_detail"),
+    path('async/clients/<int:pk>/accounts/', AsyncClientAccountBalance.as_view(), name="async_clients_accounts"),
+    path('async/movements/<int:pk>/', AsyncMovementDetail.as_view(), name="async_movements_detail"),
+    path('async/currencies/', AsyncCurrencyValues.as_view(), name="async_currencies"),
+    path('jobs/', JobListCreate.as_view(), name="jobs"),
+    path('jobs/<int:pk>/', JobDetailCancel.as_view(), name="jobs_detail"),
+    path('metrics/', Metrics.as_view(), name="metrics"),
     path('admin/', admin.site.urls),
 ]
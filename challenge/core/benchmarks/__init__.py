@@ -0,0 +1,44 @@
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+from core.routers import use_primary
+
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    """
+    Runs the block against a throwaway copy of the default database, created like the test
+    database, so benchmarks never seed or modify real data. The copy has no replica, so its
+    reads are pinned to it.
+    """
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        with use_primary():
+            yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def time_calls(function, arguments):
+    """
+    Calls function once per argument and returns the latency percentiles in milliseconds and
+    the calls per second.
+    """
+    durations = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        durations.append((time.perf_counter() - start) * 1000)
+
+    durations.sort()
+    return {
+        "calls": len(durations),
+        "p50_ms": round(statistics.median(durations), 3),
+        "p95_ms": round(durations[max(int(len(durations) * 0.95) - 1, 0)], 3),
+        "max_ms": round(durations[-1], 3),
+        "ops_per_s": round(len(durations) / (sum(durations) / 1000), 1),
+    }
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from django.test import AsyncClient
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.external_apis.currency_api import FakeRateProvider
+
+
+class FakeCurrencyServer:
+    """
+    Local HTTP server that answers like the dolarsi API after `delay` seconds and counts the
+    requests it serves, so the benchmark measures the upstream latency without the network.
+    """
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.hits = 0
+        self.lock = threading.Lock()
+        self.body = json.dumps(FakeRateProvider.DEFAULT_RATES).encode()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.build_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    def build_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so the pooled async client reuses its connections.
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with server.lock:
+                    server.hits += 1
+                time.sleep(server.delay)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(server.body)))
+                self.end_headers()
+                self.wfile.write(server.body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}/"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def summarize(latencies, elapsed, status_codes):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": sum(1 for status_code in status_codes if status_code >= 400),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000, 3),
+    }
+
+
+def run_sync(path, requests, workers):
+    """
+    Sends the requests to the sync view from a pool of `workers` threads, through the in-process
+    test client handler. No WSGI server is involved.
+    """
+    local = threading.local()
+
+    def send(number):
+        if not hasattr(local, "client"):
+            local.client = Client()
+        start = time.perf_counter()
+        response = local.client.get(path)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(send, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    return summarize([latency for latency, _ in results], elapsed, [status_code for _, status_code in results])
+
+
+async def run_async(path, requests, concurrency):
+    """
+    Sends up to `concurrency` requests at once to the async view from a single event loop, through
+    the in-process async test client handler. No ASGI server is involved.
+    """
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(send() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    return summarize([latency for latency, _ in results], elapsed, [status_code for _, status_code in results])
+
+
+def run_async_benchmark(requests=500, workers=8, concurrency=500, delay=0.05, ttl=0):
+    """
+    Requests the currency values `requests` times through the sync view with `workers` threads
+    and through the async view with `concurrency` concurrent requests, against a local fake
+    currency server answering after `delay` seconds. Every run starts with a cold cache, and the
+    default ttl of 0 makes every request need a fresh upstream value.
+
+    Both runs go through Django's in-process test clients, so they compare the sync and async
+    views and their upstream fetches, not the throughput of a WSGI or an ASGI server.
+    """
+    results = {}
+    with FakeCurrencyServer(delay) as server:
+        currency_api = {
+            "PROVIDER": "core.external_apis.currency_api.HttpRateProvider",
+            "OPTIONS": {"url": server.url, "max_connections": concurrency},
+            "TTL": ttl,
+            "STALE_TTL": ttl,
+            "CACHE_ALIAS": None,
+        }
+
+        with override_settings(CURRENCY_API=currency_api):
+            server.hits = 0
+            results["sync_view"] = run_sync(reverse("currencies"), requests, workers)
+            results["sync_view"]["upstream_fetches"] = server.hits
+
+        with override_settings(CURRENCY_API=currency_api):
+            server.hits = 0
+            results["async_view"] = asyncio.run(run_async(reverse("async_currencies"), requests, concurrency))
+            results["async_view"]["upstream_fetches"] = server.hits
+
+    results["speedup"] = round(results["async_view"]["requests_per_s"] / results["sync_view"]["requests_per_s"], 2)
+    return results
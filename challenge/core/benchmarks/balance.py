@@ -0,0 +1,56 @@
+import random
+
+from django.db import connection
+from django.db import models
+
+from core.benchmarks import time_calls
+from core.benchmarks.data import seed_accounts
+from core.benchmarks.data import seed_movements
+from core.client.utils import compute_account_balance
+from core.client.utils import get_account_balance
+from core.models import Movement
+
+# Index layout of core_movement before 0006_movement_indexes added the composite indexes and
+# 0007_movement_account_index dropped the index of the account foreign key: only that index.
+PREVIOUS_INDEXES = [models.Index(fields=["account"], name="movement_account_fk_bench_idx")]
+
+
+def vacuum_movements():
+    # Updates the planner statistics and the visibility map, without it PostgreSQL can't use
+    # index-only scans on the freshly inserted rows.
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE core_movement")
+
+
+def replace_indexes(old_indexes, new_indexes):
+    with connection.schema_editor() as schema_editor:
+        for index in old_indexes:
+            schema_editor.remove_index(Movement, index)
+        for index in new_indexes:
+            schema_editor.add_index(Movement, index)
+    vacuum_movements()
+
+
+def run_balance_benchmark(accounts, movements, samples):
+    """
+    Seeds `movements` movements over `accounts` accounts and times the balance of `samples`
+    random accounts, aggregated from the movements with the previous and the current indexes,
+    and read from the materialized Account.balance.
+    """
+    account_ids = seed_accounts(accounts)
+    seed_movements(account_ids, movements)
+    vacuum_movements()
+    sample = random.sample(account_ids, min(samples, len(account_ids)))
+
+    results = {"accounts": accounts, "movements": movements}
+    results["aggregate_current_indexes"] = time_calls(compute_account_balance, sample)
+    results["materialized_balance"] = time_calls(get_account_balance, sample)
+
+    replace_indexes(Movement._meta.indexes, PREVIOUS_INDEXES)
+    results["aggregate_previous_indexes"] = time_calls(compute_account_balance, sample)
+    replace_indexes(PREVIOUS_INDEXES, Movement._meta.indexes)
+
+    results["aggregate_speedup"] = round(results["aggregate_previous_indexes"]["p50_ms"]
+                                         / results["aggregate_current_indexes"]["p50_ms"], 1)
+    return results
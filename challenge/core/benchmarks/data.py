@@ -0,0 +1,96 @@
+import datetime
+
+import factory
+from django.db import connection
+from django.utils import timezone
+
+from core.client.utils import compute_account_balances
+from core.client.utils import compute_daily_balances
+from core.client.utils import get_daily_balances_queryset
+from core.factories import AccountFactory
+from core.factories import ClientFactory
+from core.models import Account
+from core.models import AccountDailyBalance
+from core.models import Client
+from core.models import Movement
+
+
+def clear_dataset():
+    """
+    Removes every client and the rows that depend on them, with TRUNCATE on PostgreSQL.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("TRUNCATE core_client, core_account, core_movement, core_accountdailybalance, "
+                           "core_categoryclient CASCADE")
+    else:
+        Client.objects.all().delete()
+
+
+def seed_accounts(clients, accounts_per_client=1, batch_size=10000):
+    """
+    Creates `clients` clients with `accounts_per_client` accounts each, returns the account ids.
+    """
+    client_list = Client.objects.bulk_create(
+        ClientFactory.build_batch(clients, name=factory.Sequence(lambda number: f"Cliente {number}")),
+        batch_size=batch_size
+    )
+    account_list = Account.objects.bulk_create([AccountFactory.build(client=client) for client in client_list
+                                                for _ in range(accounts_per_client)], batch_size=batch_size)
+    return [account.id for account in account_list]
+
+
+def seed_movements(account_ids, movements, days=365, batch_size=10000):
+    """
+    Spreads `movements` movements over the accounts and over the last `days` days, one outflow
+    every three movements, and updates the materialized balances and daily rollups. On PostgreSQL
+    the rows are generated by the database with generate_series, so tens of millions of rows are
+    inserted in a single statement.
+    """
+    now = timezone.now()
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO core_movement (account_id, movement_type, amount, date)
+                SELECT (%s::bigint[])[1 + number %% %s],
+                       CASE WHEN number %% 3 = 2 THEN 'cash_outflow' ELSE 'cash_inflow' END,
+                       CASE WHEN number %% 3 = 2 THEN 10.0 ELSE 100.0 END,
+                       %s - (number %% %s) * INTERVAL '1 day'
+                FROM generate_series(0, %s - 1) AS number
+                """,
+                [account_ids, len(account_ids), now, days, movements]
+            )
+            cursor.execute("ANALYZE core_movement")
+    else:
+        for start in range(0, movements, batch_size):
+            Movement.objects.bulk_create([
+                Movement(account_id=account_ids[number % len(account_ids)],
+                         movement_type="cash_outflow" if number % 3 == 2 else "cash_inflow",
+                         amount=10.0 if number % 3 == 2 else 100.0,
+                         date=now - datetime.timedelta(days=number % days))
+                for number in range(start, min(start + batch_size, movements))
+            ])
+
+    for start in range(0, len(account_ids), batch_size):
+        batch = account_ids[start:start + batch_size]
+        balances = compute_account_balances(batch)
+        Account.objects.bulk_update([Account(id=account_id, balance=balance)
+                                     for account_id, balance in balances.items()], ["balance"])
+        seed_daily_balances(batch, batch_size)
+
+
+def seed_daily_balances(account_ids, batch_size=10000):
+    """
+    Creates the daily rollups of freshly seeded accounts. On PostgreSQL they are grouped and
+    inserted by the database with a single INSERT ... SELECT.
+    """
+    if connection.vendor == "postgresql":
+        sql, params = get_daily_balances_queryset(account_ids).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO core_accountdailybalance (account_id, day, cash_in, cash_out) {sql}", params)
+    else:
+        AccountDailyBalance.objects.bulk_create([
+            AccountDailyBalance(account_id=account_id, day=day, cash_in=cash_in, cash_out=cash_out)
+            for (account_id, day), (cash_in, cash_out) in compute_daily_balances(account_ids).items()
+        ], batch_size=batch_size)
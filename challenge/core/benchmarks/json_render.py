@@ -0,0 +1,55 @@
+import io
+
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmarks import time_calls
+from core.models import Account
+from core.models import Client
+from core.models import Movement
+from core.movements.serializers import MovementSerializer
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+
+
+def build_movements_payload(rows, accounts=100):
+    """
+    Returns the MovementSerializer output of `rows` unsaved movements, spread over `accounts`
+    accounts with their nested client, so the payload is built without the database.
+    """
+    account_list = [Account(id=number, client=Client(id=number, name=f"Cliente {number}"))
+                    for number in range(1, accounts + 1)]
+    now = timezone.now()
+    movements = [Movement(id=number, account=account_list[number % accounts],
+                          movement_type="cash_outflow" if number % 3 == 2 else "cash_inflow",
+                          amount=number * 1.01, date=now)
+                 for number in range(1, rows + 1)]
+    return MovementSerializer(movements, many=True).data
+
+
+def compare(baseline, fast):
+    return {"drf": baseline, "fast": fast, "speedup": round(baseline["p50_ms"] / fast["p50_ms"], 2)}
+
+
+def run_json_benchmark(rows=10000, iterations=20):
+    """
+    Times the rendering and parsing of a payload of `rows` serialized movements with the DRF
+    JSONRenderer/JSONParser and with FastJSONRenderer/FastJSONParser.
+    """
+    payload = build_movements_payload(rows)
+    content = JSONRenderer().render(payload)
+    if FastJSONRenderer().render(payload) != content:
+        raise AssertionError("FastJSONRenderer and JSONRenderer rendered different content.")
+
+    def timer(function):
+        return time_calls(lambda _: function(), range(iterations))
+
+    return {
+        "rows": rows,
+        "bytes": len(content),
+        "render": compare(timer(lambda: JSONRenderer().render(payload)),
+                          timer(lambda: FastJSONRenderer().render(payload))),
+        "parse": compare(timer(lambda: JSONParser().parse(io.BytesIO(content))),
+                         timer(lambda: FastJSONParser().parse(io.BytesIO(content)))),
+    }
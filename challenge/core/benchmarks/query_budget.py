@@ -0,0 +1,219 @@
+import json
+import re
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.client.utils import compute_account_balances
+from core.client.utils import compute_daily_balances
+from core.models import Account
+from core.models import AccountDailyBalance
+from core.models import Category
+from core.models import CategoryClient
+from core.models import Client
+from core.models import Job
+from core.models import Movement
+
+DATASET_SIZES = {
+    "small": {"accounts": 1, "movements": 2, "categories": 1},
+    "medium": {"accounts": 5, "movements": 100, "categories": 3},
+    "large": {"accounts": 20, "movements": 1000, "categories": 10},
+}
+
+HOT_TABLES = ['"core_movement"', '"core_accountdailybalance"']
+
+DECLARE_CURSOR = re.compile(r"^DECLARE .+? CURSOR .*?FOR ", re.IGNORECASE | re.DOTALL)
+
+# Transaction control statements are not counted, atomic blocks issue BEGIN/COMMIT in autocommit
+# mode and savepoints when they are nested in the transaction of a TestCase.
+TRANSACTION_CONTROL = re.compile(r"^(BEGIN|COMMIT|ROLLBACK|(RELEASE |ROLLBACK TO )?SAVEPOINT)\b", re.IGNORECASE)
+
+
+class RouteBudget:
+    """
+    Maximum number of queries a request to a named route can run, whatever the size of the data.
+
+    kwargs, query and data are callables that receive the seeded dataset ids.
+    """
+    def __init__(self, name, method, budget, kwargs=None, query=None, data=None,
+                 content_type="application/json"):
+        self.name = name
+        self.method = method
+        self.budget = budget
+        self.kwargs = kwargs or (lambda dataset: {})
+        self.query = query or (lambda dataset: "")
+        self.data = data or (lambda dataset: None)
+        self.content_type = content_type
+
+    @property
+    def label(self):
+        return f"{self.method.upper()} {self.name}"
+
+    def url(self, dataset):
+        query = self.query(dataset)
+        return reverse(self.name, kwargs=self.kwargs(dataset)) + (f"?{query}" if query else "")
+
+
+# The routes are profiled in this order, the ones that delete the seeded rows go last.
+ROUTE_BUDGETS = [
+    RouteBudget("clients", "get", 1),
+    RouteBudget("clients", "post", 2, data=lambda dataset: {"name": "Nuevo Cliente"}),
+    RouteBudget("clients_bulk", "post", 2, data=lambda dataset: [{"name": "Nuevo Cliente"}] * 10),
+    RouteBudget("clients_detail", "get", 4, kwargs=lambda dataset: {"pk": dataset["client"]}),
+    RouteBudget("clients_detail", "put", 3, kwargs=lambda dataset: {"pk": dataset["client"]},
+                data=lambda dataset: {"name": "Cliente Modificado"}),
+    RouteBudget("clients_accounts", "get", 3, kwargs=lambda dataset: {"pk": dataset["client"]}),
+    RouteBudget("clients_accounts", "get", 3, kwargs=lambda dataset: {"pk": dataset["client"]},
+                query=lambda dataset: "currency=usd"),
+    RouteBudget("clients_accounts_balance", "get", 3,
+                kwargs=lambda dataset: {"pk": dataset["client"], "account_pk": dataset["account"]},
+                query=lambda dataset: f"date={dataset['today']}T12:00:00"),
+    RouteBudget("clients_accounts_totals", "get", 2,
+                kwargs=lambda dataset: {"pk": dataset["client"], "account_pk": dataset["account"]},
+                query=lambda dataset: f"start={dataset['today'].replace(day=1)}&end={dataset['today']}"),
+    RouteBudget("clients_accounts_statement", "get", 2,
+                kwargs=lambda dataset: {"pk": dataset["client"], "account_pk": dataset["account"]}),
+    RouteBudget("clients_category", "post", 8,
+                data=lambda dataset: {"client": dataset["client"], "category": dataset["free_category"]}),
+    RouteBudget("categories_report", "get", 1),
+    RouteBudget("movements", "post", 9,
+                data=lambda dataset: {"account": dataset["account"], "movement_type": "cash_outflow", "amount": 1}),
+    RouteBudget("movements_bulk", "post", 6,
+                data=lambda dataset: [{"account": dataset["account"], "movement_type": "cash_inflow",
+                                       "amount": 1}] * 10),
+    RouteBudget("movements_export", "get", 2, query=lambda dataset: f"client={dataset['client']}"),
+    RouteBudget("movements_detail", "get", 3, kwargs=lambda dataset: {"pk": dataset["movement"]}),
+    RouteBudget("currencies", "get", 0),
+    RouteBudget("async_clients_detail", "get", 3, kwargs=lambda dataset: {"pk": dataset["client"]}),
+    RouteBudget("async_clients_accounts", "get", 2, kwargs=lambda dataset: {"pk": dataset["client"]}),
+    RouteBudget("async_movements_detail", "get", 1, kwargs=lambda dataset: {"pk": dataset["movement"]}),
+    RouteBudget("async_currencies", "get", 0),
+    RouteBudget("metrics", "get", 0),
+    RouteBudget("jobs", "get", 1),
+    RouteBudget("jobs", "post", 1, data=lambda dataset: {"task": "rebuild_category_balances"}),
+    RouteBudget("jobs_detail", "get", 1, kwargs=lambda dataset: {"pk": dataset["job"]}),
+    RouteBudget("jobs_detail", "delete", 2, kwargs=lambda dataset: {"pk": dataset["job"]}),
+    RouteBudget("movements_detail", "delete", 6, kwargs=lambda dataset: {"pk": dataset["movement"]}),
+    # A soft delete, which locks the client and its accounts, the rows are removed later by a
+    # purge_client job.
+    RouteBudget("clients_detail", "delete", 7, kwargs=lambda dataset: {"pk": dataset["client"]}),
+]
+
+
+def seed_client_dataset(accounts, movements, categories):
+    """
+    Creates a client with `accounts` accounts of `movements` movements each and `categories`
+    assigned categories, plus one unassigned category. Returns the ids used to build the routes.
+    """
+    client = Client.objects.create(name="Cliente Presupuesto")
+    account_list = Account.objects.bulk_create([Account(client=client) for _ in range(accounts)])
+    category_list = Category.objects.bulk_create([Category(name=f"Categoria {number}")
+                                                  for number in range(categories + 1)])
+    CategoryClient.objects.bulk_create([CategoryClient(client=client, category=category)
+                                        for category in category_list[:-1]])
+
+    movement_list = Movement.objects.bulk_create([
+        Movement(account=account,
+                 movement_type="cash_outflow" if number % 3 == 2 else "cash_inflow",
+                 amount=10.0 if number % 3 == 2 else 100.0)
+        for account in account_list for number in range(movements)
+    ])
+    balances = compute_account_balances([account.id for account in account_list])
+    Account.objects.bulk_update([Account(id=account_id, balance=balance)
+                                 for account_id, balance in balances.items()], ["balance"])
+    AccountDailyBalance.objects.bulk_create([
+        AccountDailyBalance(account_id=account_id, day=day, cash_in=cash_in, cash_out=cash_out)
+        for (account_id, day), (cash_in, cash_out) in compute_daily_balances(list(balances)).items()
+    ])
+
+    return {
+        "client": client.id,
+        "account": account_list[0].id,
+        "free_category": category_list[-1].id,
+        "movement": movement_list[0].id,
+        "job": Job.objects.create(task="rebuild_balances", arguments={"accounts": [account_list[0].id]}).id,
+        "today": timezone.localdate(),
+    }
+
+
+def explain(sql):
+    """
+    Returns the plan of a captured query with sequential scans disabled, so the plan only keeps a
+    sequential scan when no index can serve the query, whatever the size of the table.
+    """
+    sql = DECLARE_CURSOR.sub("", sql)
+    with connection.cursor() as cursor:
+        cursor.execute("SET enable_seqscan = off")
+        try:
+            cursor.execute(f"EXPLAIN {sql}")
+            return "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.execute("RESET enable_seqscan")
+
+
+class QueryTimer:
+    """
+    Execute wrapper that measures the time of every query with the precision of perf_counter.
+    """
+    def __init__(self):
+        self.durations = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations.append((sql, time.perf_counter() - start))
+
+
+def profile_route(api_client, route, dataset):
+    """
+    Requests the route and returns its query count, SQL and total time in milliseconds, and,
+    on PostgreSQL, the plans of the queries over the hot tables.
+    """
+    data = route.data(dataset)
+    timer = QueryTimer()
+    with CaptureQueriesContext(connection) as queries, connection.execute_wrapper(timer):
+        start = time.perf_counter()
+        response = getattr(api_client, route.method)(path=route.url(dataset),
+                                                     data=json.dumps(data) if data is not None else None,
+                                                     content_type=route.content_type)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        total_time = time.perf_counter() - start
+
+    captured_queries = [query for query in queries.captured_queries if not TRANSACTION_CONTROL.match(query["sql"])]
+    hot_queries = [query["sql"] for query in captured_queries
+                   if any(table in query["sql"] for table in HOT_TABLES)]
+    plans = [explain(sql) for sql in hot_queries] if connection.vendor == "postgresql" else []
+
+    return {
+        "route": route.label,
+        "status_code": response.status_code,
+        "queries": len(captured_queries),
+        "budget": route.budget,
+        "sql_ms": round(sum(duration for sql, duration in timer.durations
+                            if not TRANSACTION_CONTROL.match(sql)) * 1000, 3),
+        "total_ms": round(total_time * 1000, 3),
+        "sql": [query["sql"] for query in captured_queries],
+        "plans": plans,
+        "sequential_scans": [plan for plan in plans if "Seq Scan on core_movement" in plan],
+    }
+
+
+def run_query_budget(api_client, sizes):
+    """
+    Profiles every route against a freshly seeded dataset of each size. The currency API is
+    replaced by the FakeRateProvider, so the routes are profiled offline.
+    """
+    results = []
+    with override_settings(CURRENCY_API={"PROVIDER": "core.external_apis.currency_api.FakeRateProvider"}):
+        for size_name in sizes:
+            dataset = seed_client_dataset(**DATASET_SIZES[size_name])
+            for route in ROUTE_BUDGETS:
+                results.append({"size": size_name, **profile_route(api_client, route, dataset)})
+    return results
@@ -0,0 +1,173 @@
+import json
+import platform
+import random
+import subprocess
+import time
+
+import django
+from django.db import connection
+from django.test import Client as APIClient
+from django.urls import reverse
+from django.utils import timezone
+
+from core.benchmarks import time_calls
+from core.benchmarks.balance import vacuum_movements
+from core.benchmarks.data import clear_dataset
+from core.benchmarks.data import seed_accounts
+from core.benchmarks.data import seed_movements
+from core.client.serializers import ClientSerializer
+from core.client.utils import get_account_balance
+from core.models import Client
+from core.models import Movement
+from core.movements.serializers import MovementSerializer
+from core.movements.utils import create_movement
+from core.serializers import ValuesSerializer
+
+BENCHMARK_SIZES = {
+    "small": {"clients": 1000, "accounts_per_client": 1, "movements": 100000},
+    "medium": {"clients": 10000, "accounts_per_client": 2, "movements": 5000000},
+    "large": {"clients": 100000, "accounts_per_client": 2, "movements": 50000000},
+}
+
+SERIALIZED_ROWS = 1000
+
+BULK_MOVEMENTS = 1000
+
+
+def bench_get_account_balance(context, iterations):
+    return time_calls(get_account_balance, random.choices(context["account_ids"], k=iterations))
+
+
+def bench_client_serializer(context, iterations):
+    clients = list(Client.objects.order_by("id")[:SERIALIZED_ROWS])
+    result = time_calls(lambda _: ClientSerializer(clients, many=True).data, range(iterations))
+    result["rows_per_s"] = round(result["ops_per_s"] * len(clients), 1)
+    return result
+
+
+def bench_client_values(context, iterations):
+    # Unlike client_serializer, the query is timed too, the rows are built while it's read.
+    values_serializer = ValuesSerializer(ClientSerializer)
+    queryset = values_serializer.get_queryset(Client.objects.order_by("id")[:SERIALIZED_ROWS])
+    result = time_calls(lambda _: values_serializer.to_representation(queryset.all()), range(iterations))
+    result["rows_per_s"] = round(result["ops_per_s"] * SERIALIZED_ROWS, 1)
+    return result
+
+
+def bench_movement_serializer(context, iterations):
+    movements = list(Movement.objects.select_related("account__client").order_by("id")[:SERIALIZED_ROWS])
+    result = time_calls(lambda _: MovementSerializer(movements, many=True).data, range(iterations))
+    result["rows_per_s"] = round(result["ops_per_s"] * len(movements), 1)
+    return result
+
+
+def bench_client_list_first_page(context, iterations):
+    url = reverse("clients")
+    return time_calls(lambda _: context["api_client"].get(url), range(iterations))
+
+
+def bench_client_list_next_pages(context, iterations):
+    # Every call requests the page after the previous one, so the pages get deeper and deeper.
+    state = {"url": reverse("clients")}
+
+    def get_next_page(_):
+        response = context["api_client"].get(state["url"])
+        state["url"] = response.json()["next"] or reverse("clients")
+
+    return time_calls(get_next_page, range(iterations))
+
+
+def bench_create_movement(context, iterations):
+    return time_calls(lambda account_id: create_movement(account_id, "cash_inflow", 10.0),
+                      random.choices(context["account_ids"], k=iterations))
+
+
+def bench_post_movement(context, iterations):
+    url = reverse("movements")
+    return time_calls(lambda account_id: context["api_client"].post(url, data={"account": account_id,
+                                                                               "movement_type": "cash_inflow",
+                                                                               "amount": 10.0}),
+                      random.choices(context["account_ids"], k=iterations))
+
+
+def bench_post_bulk_movements(context, iterations):
+    url = reverse("movements_bulk")
+    batches = [json.dumps([{"account": account_id, "movement_type": "cash_inflow", "amount": 10.0}
+                           for account_id in random.choices(context["account_ids"], k=BULK_MOVEMENTS)])
+               for _ in range(max(iterations // 20, 1))]
+    result = time_calls(lambda data: context["api_client"].post(url, data=data, content_type="application/json"),
+                        batches)
+    result["rows_per_s"] = round(result["ops_per_s"] * BULK_MOVEMENTS, 1)
+    return result
+
+
+# The read benchmarks run first, so the writes don't change the dataset they measure.
+BENCHMARKS = [
+    ("get_account_balance", bench_get_account_balance),
+    ("client_serializer", bench_client_serializer),
+    ("client_values", bench_client_values),
+    ("movement_serializer", bench_movement_serializer),
+    ("client_list_first_page", bench_client_list_first_page),
+    ("client_list_next_pages", bench_client_list_next_pages),
+    ("create_movement", bench_create_movement),
+    ("post_movement", bench_post_movement),
+    ("post_bulk_movements", bench_post_bulk_movements),
+]
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def get_metadata():
+    return {
+        "created_at": timezone.now().isoformat(),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "database_version": ".".join(str(part) for part in connection.get_database_version()),
+    }
+
+
+def run_benchmark_suite(sizes, iterations=200, seed=0):
+    """
+    Seeds a dataset of every size in `sizes` ({name: {"clients", "accounts_per_client",
+    "movements"}}) and runs every benchmark of BENCHMARKS against it. Returns a JSON
+    serializable report with the environment metadata and one result per size and benchmark.
+    """
+    random.seed(seed)
+    report = {"metadata": get_metadata(), "iterations": iterations, "sizes": sizes, "results": []}
+    for size_name, size in sizes.items():
+        clear_dataset()
+        start = time.perf_counter()
+        account_ids = seed_accounts(size["clients"], size["accounts_per_client"])
+        seed_movements(account_ids, size["movements"])
+        vacuum_movements()
+        report["results"].append({"size": size_name, "benchmark": "seed_dataset",
+                                  "seconds": round(time.perf_counter() - start, 3)})
+
+        context = {"account_ids": account_ids, "api_client": APIClient()}
+        for name, benchmark in BENCHMARKS:
+            report["results"].append({"size": size_name, "benchmark": name, **benchmark(context, iterations)})
+    return report
+
+
+def compare_reports(baseline, current, threshold=0.2):
+    """
+    Returns the benchmarks whose p50 latency grew more than `threshold` (0.2 is 20%) against
+    the baseline report, as (size, benchmark, baseline p50, current p50) tuples.
+    """
+    baseline_results = {(result["size"], result["benchmark"]): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        previous = baseline_results.get((result["size"], result["benchmark"]))
+        if previous is None or "p50_ms" not in result or "p50_ms" not in previous:
+            continue
+        if result["p50_ms"] > previous["p50_ms"] * (1 + threshold):
+            regressions.append((result["size"], result["benchmark"], previous["p50_ms"], result["p50_ms"]))
+    return regressions
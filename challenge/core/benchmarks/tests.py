@@ -0,0 +1,102 @@
+import json
+
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.urls import get_resolver
+
+from core.benchmarks.async_io import run_async_benchmark
+from core.benchmarks.data import seed_accounts
+from core.benchmarks.data import seed_movements
+from core.benchmarks.json_render import run_json_benchmark
+from core.benchmarks.query_budget import DATASET_SIZES
+from core.benchmarks.query_budget import ROUTE_BUDGETS
+from core.benchmarks.query_budget import run_query_budget
+from core.benchmarks.suite import BENCHMARKS
+from core.benchmarks.suite import compare_reports
+from core.benchmarks.suite import run_benchmark_suite
+from core.client.utils import compute_account_balances
+from core.client.utils import compute_daily_balances
+from core.client.utils import get_account_balances
+from core.models import AccountDailyBalance
+from core.models import Movement
+
+
+class QueryBudgetTestCase(TestCase):
+    def test_every_route_declares_a_budget(self):
+        route_names = {pattern.name for pattern in get_resolver().url_patterns if getattr(pattern, "name", None)}
+
+        self.assertEqual(route_names, {route.name for route in ROUTE_BUDGETS})
+
+    def test_routes_stay_within_query_budget(self):
+        for result in run_query_budget(self.client, DATASET_SIZES):
+            with self.subTest(size=result["size"], route=result["route"]):
+                self.assertLess(result["status_code"], 400)
+                self.assertLessEqual(result["queries"], result["budget"], "\n".join(result["sql"]))
+
+    def test_hot_queries_do_not_scan_movements_sequentially(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("EXPLAIN plans are only checked on PostgreSQL.")
+
+        for result in run_query_budget(self.client, ["small"]):
+            with self.subTest(route=result["route"]):
+                self.assertEqual(result["sequential_scans"], [])
+
+
+class SeedDataTestCase(TestCase):
+    def test_seeded_movements_keep_balances_in_sync(self):
+        account_ids = seed_accounts(3, accounts_per_client=2)
+        seed_movements(account_ids, 60)
+
+        self.assertEqual(len(account_ids), 6)
+        self.assertEqual(Movement.objects.count(), 60)
+        self.assertEqual(get_account_balances(account_ids), compute_account_balances(account_ids))
+        self.assertEqual(sum(get_account_balances(account_ids).values()), 40 * 100.0 - 20 * 10.0)
+
+        daily_balances = {(account_id, day): (cash_in, cash_out) for account_id, day, cash_in, cash_out
+                          in AccountDailyBalance.objects.values_list("account_id", "day", "cash_in", "cash_out")}
+        self.assertEqual(daily_balances, compute_daily_balances(account_ids))
+
+
+class BenchmarkSuiteTestCase(TransactionTestCase):
+    # The benchmarked reads go to the replica when one is configured.
+    databases = "__all__"
+
+    def test_suite_reports_every_benchmark(self):
+        report = run_benchmark_suite({"tiny": {"clients": 5, "accounts_per_client": 2, "movements": 50}},
+                                     iterations=3)
+
+        self.assertEqual([result["benchmark"] for result in report["results"]],
+                         ["seed_dataset", *[name for name, _ in BENCHMARKS]])
+        self.assertEqual(report["metadata"]["database"], connection.vendor)
+        self.assertEqual(json.loads(json.dumps(report)), report)
+
+    def test_compare_reports_flags_slower_benchmarks(self):
+        baseline = {"results": [{"size": "small", "benchmark": "create_movement", "p50_ms": 1.0},
+                                {"size": "small", "benchmark": "get_account_balance", "p50_ms": 1.0}]}
+        current = {"results": [{"size": "small", "benchmark": "create_movement", "p50_ms": 1.5},
+                               {"size": "small", "benchmark": "get_account_balance", "p50_ms": 1.1},
+                               {"size": "large", "benchmark": "get_account_balance", "p50_ms": 9.0}]}
+
+        self.assertEqual(compare_reports(baseline, current, threshold=0.2),
+                         [("small", "create_movement", 1.0, 1.5)])
+
+
+class AsyncBenchmarkTestCase(SimpleTestCase):
+    def test_async_run_coalesces_upstream_fetches(self):
+        results = run_async_benchmark(requests=20, workers=4, concurrency=20, delay=0.1)
+
+        self.assertEqual(results["sync_view"]["errors"], 0)
+        self.assertEqual(results["async_view"]["errors"], 0)
+        self.assertEqual(results["async_view"]["requests"], 20)
+        self.assertLess(results["async_view"]["upstream_fetches"], results["sync_view"]["upstream_fetches"])
+
+
+class JSONBenchmarkTestCase(SimpleTestCase):
+    def test_benchmark_renders_and_parses_the_payload(self):
+        results = run_json_benchmark(rows=200, iterations=3)
+
+        self.assertEqual(results["rows"], 200)
+        self.assertEqual(results["render"]["fast"]["calls"], 3)
+        self.assertEqual(set(results["parse"]), {"drf", "fast", "speedup"})
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from core.models import Client
+
+
+def get_client_version(pk):
+    """
+    Returns the (version, last_update) of the client, the only query of an unchanged poll.
+    """
+    version = Client.objects.filter(pk=pk).values_list("version", "last_update").first()
+    if version is None:
+        raise Http404
+    return version
+
+
+def versioned_client_response(request, pk, name, build_data, use_last_modified=True):
+    """
+    Serves a client response keyed by the client version, which every write to the client, its
+    accounts, movements or categories increments.
+
+    Requests whose If-None-Match or If-Modified-Since still match get a 304 Not Modified, the
+    others get the data cached for this version, and build_data() only runs on a cache miss.
+
+    Responses that also depend on something else than the client must include it in `name`, and
+    disable use_last_modified, since the client modification date doesn't change with it.
+    """
+    version, last_update = get_client_version(pk)
+    etag = f'W/"client-{pk}-{name}-v{version}"'
+    # HTTP dates have a precision of seconds.
+    last_modified = int(last_update.timestamp()) if use_last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        cache = caches[settings.CLIENTS_CACHE_ALIAS]
+        cache_key = f"client:{pk}:{name}:v{version}"
+        data = cache.get(cache_key)
+        if data is None:
+            data = build_data()
+            cache.set(cache_key, data, settings.CLIENTS_CACHE_TIMEOUT)
+        response = Response(data)
+
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core import signing
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.pagination import CursorPagination
+from rest_framework.pagination import _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from core.client.utils import get_statement_rows
+
+
+class ClientCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the client id with opaque cursors.
+
+    Every page is fetched with `WHERE id > <last id> ORDER BY id LIMIT <page size>`, so deep pages
+    cost the same as the first one. The offset DRF keeps in the cursor for duplicated positions is
+    never needed since the id is unique, cursors that carry one are rejected as invalid.
+    """
+    ordering = "id"
+    page_size_query_param = "page_size"
+
+    def __init__(self):
+        self.page_size = settings.CLIENTS_PAGE_SIZE
+        self.max_page_size = settings.CLIENTS_MAX_PAGE_SIZE
+
+    def decode_cursor(self, request):
+        cursor = super(ClientCursorPagination, self).decode_cursor(request)
+        if cursor is not None and cursor.offset:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+
+class StatementPagination(BasePagination):
+    """
+    Keyset pagination over the (date, id) of the movements of an account statement.
+
+    The cursor is signed with django.core.signing and carries the position of the last movement
+    of the page together with the balance after it, which becomes the opening balance of the
+    next page, so page N neither rescans nor re-sums the movements of the earlier pages.
+    """
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+    salt = "core.client.statement"
+
+    def __init__(self):
+        self.page_size = settings.STATEMENTS_PAGE_SIZE
+        self.max_page_size = settings.STATEMENTS_MAX_PAGE_SIZE
+
+    def paginate_statement(self, account_id, request):
+        self.request = request
+        self.account_id = account_id
+        self.opening_balance, after = self.decode_cursor(request)
+
+        page_size = self.get_page_size(request)
+        rows = get_statement_rows(account_id, page_size + 1, after=after, opening_balance=self.opening_balance)
+        self.has_next = len(rows) > page_size
+        self.rows = rows[:page_size]
+
+        return self.rows
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param], strict=True,
+                                 cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_closing_balance(self):
+        return self.rows[-1]["balance"] if self.rows else self.opening_balance
+
+    def encode_cursor(self, row):
+        return signing.dumps({"account": self.account_id, "date": row["date"].isoformat(), "id": row["id"],
+                              "balance": row["balance"]}, salt=self.salt, compress=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return 0.0, None
+
+        try:
+            position = signing.loads(encoded, salt=self.salt)
+            if position["account"] != self.account_id:
+                raise ValueError
+            date = parse_datetime(position["date"])
+            if date is None:
+                raise ValueError
+            return float(position["balance"]), (date, int(position["id"]))
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.rows[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({"account": self.account_id,
+                         "opening_balance": self.opening_balance,
+                         "closing_balance": self.get_closing_balance(),
+                         "next": self.get_next_link(),
+                         "results": data})
@@ -1,15 +1,19 @@
 from rest_framework import serializers
+from rest_framework.validators import UniqueTogetherValidator
 
 from core.models import Client, Account, Category, CategoryClient
+from core.profiling import ProfiledListSerializer
+from core.profiling import ProfiledSerializerMixin
 
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
     name = serializers.CharField(max_length=500, required=True)
 
     class Meta:
         model = Client
         fields = ['id', 'name']
+        list_serializer_class = ProfiledListSerializer
 
 
 class AccountSerializer(serializers.ModelSerializer):
@@ -34,10 +38,14 @@ class CategoryClientSerializer(serializers.ModelSerializer):
         fields = ["category"]
 
 
-class CategoryClientRequestSerializer(serializers.ModelSerializer):
+class CategoryClientRequestSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = CategoryClient
         fields = ["client", "category"]
+        validators = [
+            UniqueTogetherValidator(queryset=CategoryClient.objects.all(), fields=["client", "category"],
+                                    message="The category is already assigned to the client.")
+        ]
 
     def to_representation(self, instance):
         rep = super(CategoryClientRequestSerializer, self).to_representation(instance)
@@ -48,7 +56,7 @@ class CategoryClientRequestSerializer(serializers.ModelSerializer):
         return rep
 
 
-class FullClientInformationSerializer(serializers.Serializer):
+class FullClientInformationSerializer(ProfiledSerializerMixin, serializers.Serializer):
     client = ClientSerializer()
     account = AccountSerializer(many=True)
     categories = CategoryClientSerializer(many=True)
@@ -1,15 +1,43 @@
+import base64
+import datetime
 import json
+import threading
+from io import StringIO
 
+from asgiref.sync import sync_to_async
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import transaction
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 
+from core.client.utils import compute_account_balance
+from core.client.utils import compute_account_balances
+from core.client.utils import compute_category_balances
+from core.client.utils import compute_daily_balances
+from core.client.utils import get_account_balance
+from core.client.utils import get_account_balances
+from core.client.utils import get_balance_as_of
+from core.client.utils import get_category_balances
+from core.client.utils import purge_client
+from core.external_apis.currency_api import get_rate_provider
 from core.factories import AccountFactory
 from core.factories import CategoryFactory
 from core.factories import ClientFactory
 from core.factories import MovementFactory
 from core.models import Account
+from core.models import AccountDailyBalance
+from core.models import CategoryBalance
 from core.models import CategoryClient
+from core.models import Client
 
 
 class ClientAccountBalanceTestCase(TestCase):
@@ -34,6 +62,15 @@ class ClientAccountBalanceTestCase(TestCase):
 
         self.assertEqual(response_json["accounts"][0]["balance"], 1000.0)
 
+    async def test_async_account_balance_matches_sync_view(self):
+        response = await self.async_client.get(reverse("async_clients_accounts", kwargs={'pk': self.account.client_id}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), json.loads((await sync_to_async(self.client.get)(self.url)).content))
+
+        response = await self.async_client.get(reverse("async_clients_accounts", kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_get_account_balance_fails_client_not_found(self):
         url = reverse("clients_accounts", kwargs={'pk': 999})
         response = self.client.get(
@@ -56,6 +93,23 @@ class ClientAccountBalanceTestCase(TestCase):
 
         self.assertEqual(len(response_json["accounts"]), 0)
 
+    def test_get_account_balance_query_count_does_not_depend_on_accounts(self):
+        # The version lookup, plus the client and the balances on a cache miss.
+        with self.assertNumQueries(3):
+            self.client.get(path=self.url)
+
+        for _ in range(5):
+            account = AccountFactory(client_id=self.account.client_id)
+            account.save()
+            MovementFactory(account=account).save()
+
+        with self.assertNumQueries(3):
+            response = self.client.get(path=self.url)
+
+        response_json = json.loads(response.content)
+        self.assertEqual(len(response_json["accounts"]), 6)
+        self.assertTrue(all(account["balance"] == 1000.0 for account in response_json["accounts"]))
+
 
 class ClientListCreateTestCase(TestCase):
     def setUp(self):
@@ -77,6 +131,23 @@ class ClientListCreateTestCase(TestCase):
         self.assertEqual(response_json["name"], self.data["name"])
         self.assertEqual(Account.objects.filter(client_id=response_json["id"]).count(), 1)
 
+    def test_create_client_with_account_in_one_transaction(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                path=self.url,
+                data=self.data,
+                content_type="application/json"
+            )
+
+        # The client and account inserts, inside the savepoint of the atomic block (the test
+        # case transaction stands for the one of the request).
+        statements = [query["sql"].split()[0] for query in queries.captured_queries]
+        self.assertEqual(statements, ["SAVEPOINT", "INSERT", "INSERT", "RELEASE"])
+        response_json = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Account.objects.filter(client_id=response_json["id"]).exists())
+
     def test_create_client_fails_invalid_data(self):
         response = self.client.post(
             path=self.url,
@@ -96,7 +167,7 @@ class ClientListCreateTestCase(TestCase):
         response_json = json.loads(response.content)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertTrue(len(response_json) == 0)
+        self.assertTrue(len(response_json["results"]) == 0)
 
     def test_get_clients_with_data_success(self):
         client = ClientFactory()
@@ -108,8 +179,99 @@ class ClientListCreateTestCase(TestCase):
         response_json = json.loads(response.content)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertTrue(len(response_json) > 0)
-        self.assertEqual(response_json[0]["name"], client.name)
+        self.assertTrue(len(response_json["results"]) > 0)
+        self.assertEqual(response_json["results"][0]["name"], client.name)
+
+    def test_get_clients_paginated_by_cursor(self):
+        clients = [ClientFactory(name=f"Cliente {number}") for number in range(5)]
+        for client in clients:
+            client.save()
+
+        names = []
+        url = f"{self.url}?page_size=2"
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response_json = json.loads(self.client.get(path=url).content)
+                self.assertLessEqual(len(response_json["results"]), 2)
+                names += [client["name"] for client in response_json["results"]]
+                url = response_json["next"]
+
+        self.assertEqual(names, [client.name for client in clients])
+        self.assertEqual(len(queries), 3)
+        self.assertFalse(any("OFFSET" in query["sql"] for query in queries.captured_queries))
+
+    def test_get_clients_cursor_with_offset_fails(self):
+        ClientFactory().save()
+        cursor = base64.b64encode(b"o=1000000&p=0").decode()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path=self.url, data={"cursor": cursor})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(any("OFFSET" in query["sql"] for query in queries.captured_queries))
+
+    @override_settings(CLIENTS_MAX_PAGE_SIZE=3)
+    def test_get_clients_page_size_is_limited(self):
+        for number in range(5):
+            ClientFactory(name=f"Cliente {number}").save()
+
+        response = self.client.get(path=self.url, data={"page_size": 100})
+        response_json = json.loads(response.content)
+
+        self.assertEqual(len(response_json["results"]), 3)
+        self.assertIsNotNone(response_json["next"])
+
+    def test_get_clients_unpaginated_fails_when_not_allowed(self):
+        response = self.client.get(path=self.url, data={"paginate": "false"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(CLIENTS_ALLOW_UNPAGINATED=True)
+    def test_get_clients_unpaginated_success_when_allowed(self):
+        client = ClientFactory()
+        client.save()
+
+        response = self.client.get(path=self.url, data={"paginate": "false"})
+        response_json = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_json, [{"id": client.id, "name": client.name}])
+
+class ClientBulkCreateTestCase(TestCase):
+    def setUp(self):
+        self.url = reverse("clients_bulk")
+
+    def test_bulk_create_clients_success(self):
+        data = [{"name": f"Cliente {number}"} for number in range(50)]
+
+        # The client and account bulk inserts, plus the savepoint of the atomic block.
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                path=self.url,
+                data=data,
+                content_type="application/json"
+            )
+
+        response_json = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([client["name"] for client in response_json], [client["name"] for client in data])
+        for client in response_json:
+            self.assertEqual(Account.objects.get(pk=client["account"]).client_id, client["id"])
+
+    def test_bulk_create_clients_fails_invalid_data(self):
+        response = self.client.post(
+            path=self.url,
+            data=[{"name": "Cliente"}, {}],
+            content_type="application/json"
+        )
+
+        response_json = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("This field is required.", response_json[1]["name"])
+        self.assertFalse(Account.objects.exists())
+
 
 class ClientDetailUpdateTestCase(TestCase):
     def setUp(self):
@@ -136,6 +298,35 @@ class ClientDetailUpdateTestCase(TestCase):
         self.assertTrue(len(response_json["account"]) > 0)
         self.assertEqual(len(response_json["categories"]), 1)
 
+    async def test_async_specific_client_data_matches_sync_view(self):
+        response = await self.async_client.get(reverse("async_clients_detail", kwargs={'pk': self.new_client.id}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), json.loads((await sync_to_async(self.client.get)(self.url)).content))
+
+        response = await self.async_client.get(reverse("async_clients_detail", kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_specific_client_data_query_count_does_not_depend_on_related_rows(self):
+        # The version lookup, plus the three queries of the client data on a cache miss.
+        with self.assertNumQueries(4):
+            self.client.get(path=self.url)
+
+        for number in range(5):
+            AccountFactory(client=self.new_client).save()
+            category = CategoryFactory(name=f"Categoria {number + 2}")
+            category.save()
+            CategoryClient.objects.create(client=self.new_client, category=category)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(path=self.url)
+
+        response_json = json.loads(response.content)
+        self.assertEqual(len(response_json["account"]), 6)
+        self.assertEqual(len(response_json["categories"]), 6)
+        self.assertEqual(response_json["account"][0]["client"], {"id": self.new_client.id,
+                                                                 "name": self.new_client.name})
+
     def test_get_specific_client_data_fails_client_not_found(self):
         url = reverse("clients_detail", kwargs={'pk': 999})
         response = self.client.get(
@@ -247,6 +438,21 @@ class ClientCategoryAssignmentTestCase(TestCase):
         self.assertEqual(response_json["client"]["id"], self.new_client.id)
         self.assertEqual(response_json["category"]["id"], self.category.id)
 
+    def test_category_assignment_fails_category_already_assigned(self):
+        CategoryClient.objects.create(client=self.new_client, category=self.category)
+
+        response = self.client.post(
+            path=self.url,
+            data=self.data,
+            content_type="application/json"
+        )
+
+        response_json = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("The category is already assigned to the client.", response_json["non_field_errors"])
+        self.assertEqual(CategoryClient.objects.filter(client=self.new_client).count(), 1)
+
     def test_category_assignment_fails_client_not_found(self):
         data = {
             "client": 999,
@@ -280,3 +486,602 @@ class ClientCategoryAssignmentTestCase(TestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("Invalid pk \"998\" - object does not exist.", response_json["category"])
+
+
+class RebuildBalancesCommandTestCase(TestCase):
+    def setUp(self):
+        client = ClientFactory()
+        client.save()
+        self.account = AccountFactory(client=client)
+        self.account.save()
+
+        MovementFactory(account=self.account, movement_type="cash_inflow", amount=3000.0).save()
+        MovementFactory(account=self.account, movement_type="cash_outflow", amount=500.0).save()
+
+    def test_balance_is_maintained_on_write(self):
+        self.assertEqual(get_account_balance(self.account.id), 2500.0)
+        self.assertEqual(get_account_balance(self.account.id), compute_account_balance(self.account.id))
+
+    def test_account_save_keeps_the_maintained_balance(self):
+        category = CategoryFactory()
+        category.save()
+        CategoryClient.objects.create(client_id=self.account.client_id, category=category)
+        account = Account.objects.get(pk=self.account.id)
+        MovementFactory(account=self.account, movement_type="cash_inflow", amount=500.0).save()
+
+        account.save()
+
+        self.assertEqual(account.balance, 3000.0)
+        self.assertEqual(get_account_balance(self.account.id), compute_account_balance(self.account.id))
+        self.assertEqual(get_category_balances(), compute_category_balances())
+
+    def test_bulk_balances_match_single_account_balances(self):
+        empty_account = AccountFactory(client_id=self.account.client_id)
+        empty_account.save()
+        account_ids = [self.account.id, empty_account.id]
+
+        with self.assertNumQueries(1):
+            stored = get_account_balances(account_ids)
+        with self.assertNumQueries(1):
+            computed = compute_account_balances(account_ids)
+
+        self.assertEqual(stored, {self.account.id: 2500.0, empty_account.id: 0.0})
+        self.assertEqual(computed, stored)
+
+    def test_verify_fails_when_balance_is_out_of_sync(self):
+        Account.objects.filter(pk=self.account.id).update(balance=1.0)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_balances", verify=True, stdout=StringIO())
+
+        self.assertEqual(get_account_balance(self.account.id), 1.0)
+
+    def test_rebuild_fixes_out_of_sync_balance(self):
+        Account.objects.filter(pk=self.account.id).update(balance=1.0)
+
+        call_command("rebuild_balances", stdout=StringIO())
+        call_command("rebuild_balances", verify=True, stdout=StringIO())
+
+        self.assertEqual(get_account_balance(self.account.id), 2500.0)
+
+    def test_rebuild_fixes_out_of_sync_daily_balances(self):
+        AccountDailyBalance.objects.filter(account_id=self.account.id).update(cash_in=1.0)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_balances", verify=True, stdout=StringIO())
+
+        call_command("rebuild_balances", stdout=StringIO())
+        call_command("rebuild_balances", verify=True, stdout=StringIO())
+
+        self.assertEqual(get_balance_as_of(self.account.id, timezone.localdate()), 2500.0)
+
+
+class AccountDailyBalanceTestCase(TestCase):
+    def setUp(self):
+        client = ClientFactory()
+        client.save()
+        self.account = AccountFactory(client=client)
+        self.account.save()
+
+        self.today = timezone.localdate()
+        self.yesterday = self.today - datetime.timedelta(days=1)
+        self.now = timezone.now()
+
+        MovementFactory(account=self.account, amount=3000.0, date=self.now - datetime.timedelta(days=1)).save()
+        MovementFactory(account=self.account, movement_type="cash_outflow", amount=500.0,
+                        date=self.now - datetime.timedelta(days=1)).save()
+        self.movement = MovementFactory(account=self.account, amount=200.0, date=self.now)
+        self.movement.save()
+
+        self.balance_url = reverse("clients_accounts_balance",
+                                   kwargs={"pk": client.id, "account_pk": self.account.id})
+        self.totals_url = reverse("clients_accounts_totals",
+                                  kwargs={"pk": client.id, "account_pk": self.account.id})
+
+    def assert_rollups_in_sync(self):
+        stored = {(account_id, day): (cash_in, cash_out) for account_id, day, cash_in, cash_out
+                  in AccountDailyBalance.objects.exclude(cash_in=0, cash_out=0).values_list(
+                      "account_id", "day", "cash_in", "cash_out")}
+
+        self.assertEqual(stored, compute_daily_balances([self.account.id]))
+
+    def test_rollups_are_maintained_on_write(self):
+        self.assert_rollups_in_sync()
+
+        self.movement.amount = 50.0
+        self.movement.date = self.now - datetime.timedelta(days=1)
+        self.movement.save()
+        self.assert_rollups_in_sync()
+
+        self.movement.delete()
+        self.assert_rollups_in_sync()
+
+    def test_rollups_are_maintained_on_bulk_create(self):
+        response = self.client.post(path=reverse("movements_bulk"), data=[
+            {"account": self.account.id, "movement_type": "cash_inflow", "amount": 10.0},
+            {"account": self.account.id, "movement_type": "cash_outflow", "amount": 5.0,
+             "date": (self.now - datetime.timedelta(days=3)).isoformat()},
+        ], content_type="application/json")
+
+        self.assertEqual(response.json()["created"], 2)
+        self.assert_rollups_in_sync()
+
+    def test_backdated_movement_changes_previous_balances(self):
+        MovementFactory(account=self.account, movement_type="cash_outflow", amount=100.0,
+                        date=self.now - datetime.timedelta(days=2)).save()
+
+        self.assertEqual(get_balance_as_of(self.account.id, self.today - datetime.timedelta(days=2)), -100.0)
+        self.assertEqual(get_balance_as_of(self.account.id, self.yesterday), 2400.0)
+        self.assertEqual(get_balance_as_of(self.account.id, self.today), 2600.0)
+
+    def test_get_balance_as_of_date(self):
+        response = self.client.get(path=self.balance_url, data={"date": self.yesterday.isoformat()})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"account": self.account.id,
+                                           "date": self.yesterday.isoformat(),
+                                           "balance": 2500.0})
+
+    def test_get_balance_as_of_datetime(self):
+        before = timezone.localtime(self.now - datetime.timedelta(microseconds=1))
+
+        with self.assertNumQueries(3):
+            response = self.client.get(path=self.balance_url, data={"date": before.isoformat()})
+        self.assertEqual(response.json()["balance"], 2500.0)
+
+        response = self.client.get(path=self.balance_url, data={"date": timezone.localtime(self.now).isoformat()})
+        self.assertEqual(response.json()["balance"], 2700.0)
+
+    def test_get_period_totals(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(path=self.totals_url, data={"start": self.yesterday.isoformat(),
+                                                                   "end": self.today.isoformat()})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"account": self.account.id,
+                                           "start": self.yesterday.isoformat(),
+                                           "end": self.today.isoformat(),
+                                           "cash_in": 3200.0,
+                                           "cash_out": 500.0,
+                                           "balance_change": 2700.0})
+
+        response = self.client.get(path=self.totals_url, data={"start": self.today.isoformat(),
+                                                               "end": self.today.isoformat()})
+        self.assertEqual(response.json()["balance_change"], 200.0)
+
+    def test_invalid_dates_fail(self):
+        response = self.client.get(path=self.balance_url, data={"date": "30/11/2023"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(path=self.totals_url, data={"start": self.today.isoformat(),
+                                                               "end": self.yesterday.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("end", response.json())
+
+        response = self.client.get(path=self.totals_url, data={"start": self.today.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_account_of_other_client_is_not_found(self):
+        other_client = ClientFactory()
+        other_client.save()
+
+        response = self.client.get(path=reverse("clients_accounts_balance",
+                                                kwargs={"pk": other_client.id, "account_pk": self.account.id}),
+                                   data={"date": self.today.isoformat()})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(STATEMENTS_PAGE_SIZE=2)
+class AccountStatementTestCase(TestCase):
+    def setUp(self):
+        client = ClientFactory()
+        client.save()
+        self.account = AccountFactory(client=client)
+        self.account.save()
+
+        now = timezone.now()
+        amounts = [("cash_inflow", 1000.0), ("cash_outflow", 200.0), ("cash_inflow", 50.0),
+                   ("cash_outflow", 300.0), ("cash_inflow", 5.0)]
+        for days, (movement_type, amount) in enumerate(amounts):
+            MovementFactory(account=self.account, movement_type=movement_type, amount=amount,
+                            date=now - datetime.timedelta(days=10 - days)).save()
+        # Same date as the previous movement, it is ordered after it by id.
+        MovementFactory(account=self.account, amount=1.0, date=now - datetime.timedelta(days=6)).save()
+
+        self.url = reverse("clients_accounts_statement", kwargs={"pk": client.id, "account_pk": self.account.id})
+
+    def get_pages(self):
+        pages = []
+        url = self.url
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.json())
+            url = pages[-1]["next"]
+        return pages
+
+    def test_statement_running_balance(self):
+        pages = self.get_pages()
+        rows = [row for page in pages for row in page["results"]]
+
+        self.assertEqual(len(pages), 3)
+        self.assertEqual([row["balance"] for row in rows], [1000.0, 800.0, 850.0, 550.0, 555.0, 556.0])
+        self.assertEqual([page["opening_balance"] for page in pages], [0.0, 800.0, 550.0])
+        self.assertEqual(pages[-1]["closing_balance"], get_account_balance(self.account.id))
+
+    def test_statement_pages_use_a_fixed_number_of_queries(self):
+        response = self.client.get(self.url)
+        for _ in range(2):
+            with self.assertNumQueries(2):
+                response = self.client.get(response.json()["next"])
+
+    def test_statement_page_size(self):
+        response = self.client.get(self.url, data={"page_size": 10})
+
+        self.assertEqual(len(response.json()["results"]), 6)
+        self.assertIsNone(response.json()["next"])
+
+    def test_tampered_cursor_fails(self):
+        response = self.client.get(self.url)
+        cursor = response.json()["next"].split("cursor=")[1]
+
+        response = self.client.get(self.url, data={"cursor": cursor[:-2] + "xx"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        other_account = AccountFactory(client_id=self.account.client_id)
+        other_account.save()
+        response = self.client.get(reverse("clients_accounts_statement",
+                                           kwargs={"pk": self.account.client_id, "account_pk": other_account.id}),
+                                   data={"cursor": cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ClientConditionalGetTestCase(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.new_client = ClientFactory()
+        self.new_client.save()
+        self.account = AccountFactory(client=self.new_client)
+        self.account.save()
+        MovementFactory(account=self.account).save()
+        self.category = CategoryFactory()
+        self.category.save()
+
+        self.urls = [reverse("clients_detail", kwargs={'pk': self.new_client.id}),
+                     reverse("clients_accounts", kwargs={'pk': self.new_client.id})]
+
+    def test_unchanged_polls_only_look_up_the_version(self):
+        for url in self.urls:
+            response = self.client.get(path=url)
+
+            with self.assertNumQueries(1):
+                cached_response = self.client.get(path=url)
+            self.assertEqual(cached_response.json(), response.json())
+
+            with self.assertNumQueries(1):
+                not_modified = self.client.get(path=url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(not_modified.content, b"")
+
+            not_modified = self.client.get(path=url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_movement_write_changes_the_etag(self):
+        response = self.client.get(path=self.urls[1])
+
+        MovementFactory(account=self.account, amount=500.0).save()
+        response_after_write = self.client.get(path=self.urls[1], HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(response_after_write.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response_after_write["ETag"], response["ETag"])
+        self.assertEqual(response_after_write.json()["accounts"][0]["balance"], 1500.0)
+
+    def test_category_rename_changes_the_etag(self):
+        CategoryClient.objects.create(client=self.new_client, category=self.category)
+        response = self.client.get(path=self.urls[0])
+
+        self.category.name = "Nueva Categoria"
+        self.category.save()
+        response_after_rename = self.client.get(path=self.urls[0], HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(response_after_rename.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_after_rename.json()["categories"][0]["category"]["name"], "Nueva Categoria")
+
+        self.category.delete()
+        response_after_delete = self.client.get(path=self.urls[0], HTTP_IF_NONE_MATCH=response_after_rename["ETag"])
+        self.assertEqual(response_after_delete.status_code, status.HTTP_200_OK)
+
+    def test_rebuild_changes_the_etag(self):
+        response = self.client.get(path=self.urls[1])
+
+        Account.objects.filter(pk=self.account.id).update(balance=1.0)
+        call_command("rebuild_balances", stdout=StringIO())
+        response_after_rebuild = self.client.get(path=self.urls[1], HTTP_IF_NONE_MATCH=response["ETag"])
+
+        self.assertEqual(response_after_rebuild.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_after_rebuild.json()["accounts"][0]["balance"], 1000.0)
+
+    def test_writes_bump_the_client_version(self):
+        writes = [
+            lambda: self.client.put(path=self.urls[0], data={"name": "Nuevo Nombre"}, content_type="application/json"),
+            lambda: self.client.post(path=reverse("movements"), data={"account": self.account.id,
+                                                                      "movement_type": "cash_outflow",
+                                                                      "amount": 10.0}),
+            lambda: self.client.post(path=reverse("movements_bulk"), data=[{"account": self.account.id,
+                                                                            "amount": 10.0}],
+                                     content_type="application/json"),
+            lambda: CategoryClient.objects.create(client=self.new_client, category=self.category),
+            lambda: AccountFactory(client=self.new_client).save(),
+        ]
+        for write in writes:
+            version = Client.objects.get(pk=self.new_client.id).version
+            write()
+            self.assertEqual(Client.objects.get(pk=self.new_client.id).version, version + 1)
+
+
+@override_settings(CURRENCY_API={"PROVIDER": "core.external_apis.currency_api.FakeRateProvider"})
+class ClientAccountBalanceCurrencyTestCase(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        client = ClientFactory()
+        client.save()
+        self.accounts = []
+        for amount in (1700.0, 850.0):
+            account = AccountFactory(client=client)
+            account.save()
+            MovementFactory(account=account, amount=amount).save()
+            self.accounts.append(account)
+        self.url = reverse("clients_accounts", kwargs={"pk": client.id})
+
+    def test_balances_are_converted_with_a_single_rate_lookup(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(path=self.url, data={"currency": "usd"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["accounts"],
+                         [{"account": self.accounts[0].id, "balance": 1700.0, "converted_balance": 2.0},
+                          {"account": self.accounts[1].id, "balance": 850.0, "converted_balance": 1.0}])
+        self.assertEqual(response.json()["currency"], {"code": "usd", "rate": 850.0})
+        self.assertEqual(response.json()["total"], 2550.0)
+        self.assertEqual(response.json()["converted_total"], 3.0)
+        self.assertEqual(get_rate_provider().provider.calls, 1)
+
+    def test_converted_responses_are_cached_by_rate(self):
+        response = self.client.get(path=self.url, data={"currency": "usd_blue"})
+
+        self.assertIn("usd_blue-900.0", response["ETag"])
+        self.assertFalse(response.has_header("Last-Modified"))
+        self.assertNotEqual(response["ETag"], self.client.get(path=self.url)["ETag"])
+        not_modified = self.client.get(path=self.url, data={"currency": "usd_blue"},
+                                       HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unsupported_currency_fails(self):
+        response = self.client.get(path=self.url, data={"currency": "eur"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(CURRENCY_API={"PROVIDER": "core.external_apis.currency_api.FakeRateProvider",
+                                     "OPTIONS": {"rates": []}})
+    def test_missing_rate_fails(self):
+        response = self.client.get(path=self.url, data={"currency": "usd"})
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_account_total_usd(self):
+        self.accounts[0].refresh_from_db()
+
+        self.assertEqual(self.accounts[0].get_total_usd(), "2.00")
+
+
+class CategoryBalanceTestCase(TestCase):
+    def setUp(self):
+        self.categories = []
+        for name in ("Categoria 1", "Categoria 2"):
+            category = CategoryFactory(name=name)
+            category.save()
+            self.categories.append(category)
+
+        self.accounts = []
+        for client_name in ("Cliente 1", "Cliente 2"):
+            client = ClientFactory(name=client_name)
+            client.save()
+            account = AccountFactory(client=client)
+            account.save()
+            MovementFactory(account=account, amount=1000.0).save()
+            self.accounts.append(account)
+
+        self.assignments = [CategoryClient.objects.create(client=self.accounts[0].client, category=self.categories[0]),
+                            CategoryClient.objects.create(client=self.accounts[0].client, category=self.categories[1]),
+                            CategoryClient.objects.create(client=self.accounts[1].client, category=self.categories[0])]
+
+    def assert_rollups_in_sync(self):
+        stored = {category_id: totals for category_id, totals in get_category_balances().items()
+                  if totals != (0, 0.0)}
+        self.assertEqual(stored, compute_category_balances())
+
+    def test_rollups_follow_the_writes(self):
+        self.assertEqual(get_category_balances(), {self.categories[0].id: (2, 2000.0),
+                                                   self.categories[1].id: (1, 1000.0)})
+
+        writes = [
+            lambda: self.client.post(reverse("movements"), data={"account": self.accounts[0].id,
+                                                                 "movement_type": "cash_outflow", "amount": 250.5}),
+            lambda: self.client.post(reverse("movements_bulk"), data=[{"account": self.accounts[1].id, "amount": 10.0},
+                                                                      {"account": self.accounts[0].id, "amount": 5.0}],
+                                     content_type="application/json"),
+            lambda: self.accounts[0].movement_set.first().delete(),
+            lambda: AccountFactory(client=self.accounts[1].client, balance=300.0).save(),
+            lambda: self.accounts[1].delete(),
+            lambda: self.assignments[1].delete(),
+            lambda: CategoryClient.objects.filter(pk=self.assignments[0].pk).first().delete(),
+            lambda: CategoryClient.objects.create(client=self.accounts[0].client, category=self.categories[1]),
+            lambda: self.accounts[0].client.delete(),
+        ]
+        for write in writes:
+            write()
+            self.assert_rollups_in_sync()
+
+    @override_settings(CATEGORY_BALANCE_SHARDS=4)
+    def test_rollups_are_split_in_shards(self):
+        category = CategoryFactory(name="Categoria 3")
+        category.save()
+        CategoryClient.objects.create(client=self.accounts[1].client, category=category)
+        for _ in range(8):
+            AccountFactory(client=self.accounts[1].client, balance=10.0).save()
+
+        self.assertEqual(sorted(CategoryBalance.objects.filter(category=category).values_list("shard", flat=True)),
+                         [0, 1, 2, 3])
+        self.assertEqual(get_category_balances([category.id]), {category.id: (9, 1080.0)})
+        self.assert_rollups_in_sync()
+
+    def test_category_report(self):
+        response = self.client.get(reverse("categories_report"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [
+            {"id": self.categories[0].id, "name": "Categoria 1", "accounts": 2, "total_balance": 2000.0,
+             "average_balance": 1000.0},
+            {"id": self.categories[1].id, "name": "Categoria 2", "accounts": 1, "total_balance": 1000.0,
+             "average_balance": 1000.0},
+        ])
+
+    def test_rebuild_fixes_out_of_sync_rollups(self):
+        CategoryBalance.objects.filter(category=self.categories[0]).update(total_balance=5.0)
+        CategoryBalance.objects.filter(category=self.categories[1]).delete()
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_category_balances", "--verify", stdout=StringIO())
+
+        out = StringIO()
+        call_command("rebuild_category_balances", stdout=out)
+
+        self.assertIn("fixed 2 mismatches", out.getvalue())
+        self.assert_rollups_in_sync()
+
+
+class ClientSoftDeleteTestCase(TestCase):
+    def setUp(self):
+        self.category = CategoryFactory(name="Categoria 1")
+        self.category.save()
+
+        self.accounts = []
+        for client_name in ("Cliente 1", "Cliente 2"):
+            client = ClientFactory(name=client_name)
+            client.save()
+            account = AccountFactory(client=client)
+            account.save()
+            for amount in (1000.0, 200.0, 30.0):
+                MovementFactory(account=account, amount=amount).save()
+            CategoryClient.objects.create(client=client, category=self.category)
+            self.accounts.append(account)
+        self.deleted_account = self.accounts[0]
+
+        response = self.client.delete(reverse("clients_detail", args=[self.deleted_account.client_id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_soft_deleted_client_is_hidden(self):
+        client_id, account_id = self.deleted_account.client_id, self.deleted_account.id
+        movement_id = self.deleted_account.movement_set.first().id
+
+        self.assertTrue(Client.all_objects.filter(pk=client_id, state=False, delete_date__isnull=False).exists())
+        self.assertEqual(self.deleted_account.movement_set.count(), 3)
+        for url in (reverse("clients_detail", args=[client_id]), reverse("clients_accounts", args=[client_id]),
+                    reverse("clients_accounts_statement", args=[client_id, account_id]),
+                    reverse("movements_detail", args=[movement_id]),
+                    reverse("movements_export") + f"?account={account_id}"):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.assertEqual([client["id"] for client in self.client.get(reverse("clients")).json()["results"]],
+                         [self.accounts[1].client_id])
+        self.assertEqual(self.client.delete(reverse("clients_detail", args=[client_id])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_movements_of_soft_deleted_client_are_rejected(self):
+        response = self.client.post(reverse("movements"), data={"account": self.deleted_account.id,
+                                                                "movement_type": "cash_inflow", "amount": 10.0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(reverse("movements_bulk"), data=[{"account": self.deleted_account.id,
+                                                                      "amount": 10.0}],
+                                    content_type="application/json")
+        self.assertEqual(response.json()["results"][0]["status"], "rejected")
+
+    def test_category_rollups_leave_out_soft_deleted_client(self):
+        self.assertEqual(get_category_balances(), {self.category.id: (1, 1230.0)})
+        self.assertEqual(compute_category_balances(), {self.category.id: (1, 1230.0)})
+
+        # The rollups were subtracted by the soft delete, the purge doesn't subtract them twice.
+        call_command("purge_clients", stdout=StringIO())
+        self.assertEqual(get_category_balances(), {self.category.id: (1, 1230.0)})
+
+    def test_purge_removes_the_rows_in_batches(self):
+        sleeps = []
+        deleted = purge_client(self.deleted_account.client_id, batch_size=2, sleep_ratio=0.5, sleep=sleeps.append)
+
+        self.assertEqual(deleted["core.Movement"], 3)
+        self.assertEqual(deleted["core.AccountDailyBalance"], 1)
+        self.assertEqual(deleted["core.Account"], 1)
+        self.assertEqual(deleted["core.CategoryClient"], 1)
+        self.assertEqual(deleted["core.Client"], 1)
+        # One full batch of movements was followed by a pause, the last partial batches were not.
+        self.assertEqual(len(sleeps), 1)
+        self.assertFalse(Client.all_objects.filter(pk=self.deleted_account.client_id).exists())
+        self.assertEqual(Account.objects.count(), 1)
+
+    def test_purge_skips_live_clients(self):
+        self.assertIsNone(purge_client(self.accounts[1].client_id))
+
+        out = StringIO()
+        call_command("purge_clients", "--batch-size", "2", "--sleep-ratio", "0", stdout=out)
+
+        self.assertIn("Purged 1 clients.", out.getvalue())
+        self.assertEqual(Client.all_objects.count(), 1)
+
+
+class ConcurrentSoftDeleteTestCase(TransactionTestCase):
+    def test_soft_delete_waits_for_movements_in_flight(self):
+        category = CategoryFactory(name="Categoria 1")
+        category.save()
+        client = ClientFactory(name="Cliente 1")
+        client.save()
+        account = AccountFactory(client=client)
+        account.save()
+        MovementFactory(account=account, amount=1000.0).save()
+        CategoryClient.objects.create(client=client, category=category)
+
+        written = threading.Event()
+        release = threading.Event()
+
+        def write_movement():
+            try:
+                with transaction.atomic():
+                    MovementFactory(account=account, amount=500.0).save()
+                    written.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        def soft_delete():
+            try:
+                Client.objects.get(pk=client.pk).soft_delete()
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=write_movement)
+        writer.start()
+        written.wait(5)
+        deleter = threading.Thread(target=soft_delete)
+        deleter.start()
+        deleter.join(0.3)
+        self.assertTrue(deleter.is_alive())
+
+        release.set()
+        writer.join()
+        deleter.join()
+
+        self.assertFalse(Client.objects.filter(pk=client.pk).exists())
+        self.assertEqual(get_category_balances(), {category.id: (0, 0.0)})
+        self.assertEqual(compute_category_balances(), {})
@@ -1,20 +1,260 @@
+import datetime
+import time
+
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import RowRange
 from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+from django.db.models import Window
+from django.db.models.functions import Coalesce
+from django.db.models.functions import TruncDate
+from django.utils import timezone
 
+from core.models import Account
+from core.models import AccountDailyBalance
+from core.models import Category
+from core.models import CategoryBalance
+from core.models import CategoryClient
+from core.models import Client
 from core.models import Movement
 
 
 def get_account_balance(account_id):
-    cash_in_movements = Movement.objects.filter(account_id=account_id,
-                                                movement_type="cash_inflow"
-                                                ).aggregate(Sum('amount'))
+    balance = Account.objects.filter(pk=account_id).values_list("balance", flat=True).first()
+
+    return 0.0 if balance is None else balance
+
+
+def get_account_balances(account_ids):
+    """
+    Returns {account_id: balance} for every existing account in account_ids with a single query.
+
+    account_ids can be a list or a queryset of ids, which is then sent as a subquery.
+    """
+    return dict(Account.objects.filter(pk__in=account_ids).order_by("id").values_list("id", "balance"))
+
+
+def compute_account_balance(account_id):
+    return compute_account_balances([account_id])[account_id]
+
+
+def compute_account_balances(account_ids):
+    """
+    Computes the balance of every account in the account_ids list from the raw Movement rows,
+    with one grouped query that subtracts the outflows from the inflows in the database.
+    """
+    cash_in = Coalesce(Sum("amount", filter=Q(movement_type="cash_inflow")), Value(0.0))
+    cash_out = Coalesce(Sum("amount", filter=Q(movement_type="cash_outflow")), Value(0.0))
+
+    movements = Movement.objects.filter(account_id__in=account_ids).values("account_id").annotate(
+        balance=cash_in - cash_out
+    ).values_list("account_id", "balance")
+
+    balances = {account_id: 0.0 for account_id in account_ids}
+    balances.update(movements)
+
+    return balances
+
+
+def get_daily_balances_queryset(account_ids):
+    """
+    Returns the (account_id, day, cash_in, cash_out) rows of the daily rollups of the accounts
+    in account_ids, grouped from the raw Movement rows.
+    """
+    return Movement.objects.filter(account_id__in=account_ids).annotate(day=TruncDate("date")).values(
+        "account_id", "day"
+    ).annotate(
+        cash_in=Coalesce(Sum("amount", filter=Q(movement_type="cash_inflow")), Value(0.0)),
+        cash_out=Coalesce(Sum("amount", filter=Q(movement_type="cash_outflow")), Value(0.0))
+    ).values_list("account_id", "day", "cash_in", "cash_out")
+
+
+def compute_daily_balances(account_ids):
+    """
+    Computes the daily rollups of the accounts in account_ids from the raw Movement rows.
+    Returns {(account_id, day): (cash_in, cash_out)}.
+    """
+    return {(account_id, day): (cash_in, cash_out)
+            for account_id, day, cash_in, cash_out in get_daily_balances_queryset(account_ids)}
+
+
+def get_balance_as_of(account_id, moment):
+    """
+    Returns the balance of the account at the end of a date, or at a datetime.
+
+    The previous days are summed from the daily rollups, so at most the movements of a single day
+    are read, the ones of the day of a datetime up to that moment.
+    """
+    if not isinstance(moment, datetime.datetime):
+        return get_rollup_totals(account_id, day__lte=moment)["balance"]
+
+    day = timezone.localdate(moment)
+    day_start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    same_day = Movement.objects.filter(account_id=account_id, date__gte=day_start, date__lte=moment).aggregate(
+        cash_in=Coalesce(Sum("amount", filter=Q(movement_type="cash_inflow")), Value(0.0)),
+        cash_out=Coalesce(Sum("amount", filter=Q(movement_type="cash_outflow")), Value(0.0))
+    )
+
+    return get_rollup_totals(account_id, day__lt=day)["balance"] + same_day["cash_in"] - same_day["cash_out"]
+
+
+def get_period_totals(account_id, start, end):
+    """
+    Returns the inflow and outflow totals of the account between two dates, both included,
+    read from the daily rollups.
+    """
+    return get_rollup_totals(account_id, day__gte=start, day__lte=end)
+
+
+def get_rollup_totals(account_id, **day_filters):
+    totals = AccountDailyBalance.objects.filter(account_id=account_id, **day_filters).aggregate(
+        cash_in=Coalesce(Sum("cash_in"), Value(0.0)),
+        cash_out=Coalesce(Sum("cash_out"), Value(0.0))
+    )
+    totals["balance"] = totals["cash_in"] - totals["cash_out"]
+
+    return totals
+
+
+def get_statement_rows(account_id, limit, after=None, opening_balance=0.0):
+    """
+    Returns up to `limit` movements of the account ordered by (date, id), each one with the
+    balance after it, computed in the database as opening_balance plus a running Sum window.
+
+    `after` is the (date, id) of the last movement of the previous page. Rows before it are
+    skipped by the (account, date, id) index, so later pages don't scan the earlier ones.
+    """
+    signed_amount = Case(When(movement_type="cash_outflow", then=-F("amount")), default=F("amount"))
+
+    movements = Movement.objects.filter(account_id=account_id)
+    if after is not None:
+        date, movement_id = after
+        movements = movements.filter(Q(date__gte=date), Q(date__gt=date) | Q(id__gt=movement_id))
+
+    return list(movements.annotate(
+        balance=Window(Sum(signed_amount), order_by=[F("date").asc(), F("id").asc()],
+                       frame=RowRange(start=None, end=0)) + Value(opening_balance)
+    ).order_by("date", "id").values("id", "movement_type", "amount", "date", "balance")[:limit])
+
+
+def convert_balances(data, currency, rate):
+    """
+    Adds the balance of every account of an accounts response, and their total, converted at
+    `rate` pesos per unit of `currency`.
+    """
+    total = sum(account["balance"] for account in data["accounts"])
+
+    return {
+        **data,
+        "accounts": [{**account, "converted_balance": round(account["balance"] / rate, 2)}
+                     for account in data["accounts"]],
+        "currency": {"code": currency, "rate": rate},
+        "total": total,
+        "converted_total": round(total / rate, 2),
+    }
+
+
+def get_category_balances(category_ids=None):
+    """
+    Returns {category_id: (accounts, total_balance)} summed from the CategoryBalance rollups.
+    """
+    rollups = CategoryBalance.objects.all()
+    if category_ids is not None:
+        rollups = rollups.filter(category_id__in=category_ids)
+
+    return {category_id: (accounts, total_balance) for category_id, accounts, total_balance in rollups.values(
+        "category_id"
+    ).annotate(
+        total_accounts=Sum("accounts"), balance=Sum("total_balance")
+    ).values_list("category_id", "total_accounts", "balance")}
+
+
+def compute_category_balances(category_ids=None):
+    """
+    Computes the number and the total balance of the accounts of the clients assigned to every
+    category from the Account rows, with one grouped query. Categories without accounts are left out.
+    """
+    assignments = CategoryClient.objects.filter(client__state=True, client__account__isnull=False)
+    if category_ids is not None:
+        assignments = assignments.filter(category_id__in=category_ids)
+
+    return {category_id: (accounts, total_balance) for category_id, accounts, total_balance in assignments.values(
+        "category_id"
+    ).annotate(
+        accounts=Count("client__account"), total_balance=Sum("client__account__balance")
+    ).values_list("category_id", "accounts", "total_balance")}
+
+
+def get_category_report():
+    """
+    Returns the number, total and average balance of the accounts of every category, read from
+    the CategoryBalance rollups with a single query.
+    """
+    categories = Category.objects.annotate(
+        accounts=Coalesce(Sum("balance_shards__accounts"), 0),
+        total_balance=Coalesce(Sum("balance_shards__total_balance"), Value(0.0))
+    ).order_by("id").values("id", "name", "accounts", "total_balance")
+
+    return [{**category, "average_balance": category["total_balance"] / category["accounts"]
+             if category["accounts"] else 0.0} for category in categories]
+
+
+def create_clients_with_accounts(clients, batch_size=1000):
+    """
+    Inserts the unsaved clients and one account for each of them with two bulk_create calls
+    in a single transaction. Returns the created accounts, with their saved client.
+    """
+    with transaction.atomic():
+        clients = Client.objects.bulk_create(clients, batch_size=batch_size)
+        return Account.objects.bulk_create([Account(client=client) for client in clients], batch_size=batch_size)
+
+
+def delete_in_batches(queryset, order_by, batch_size=1000, sleep_ratio=1.0, sleep=time.sleep):
+    """
+    Deletes the rows of the queryset `batch_size` at a time, in `order_by` order, each batch in its
+    own short transaction. After every batch it sleeps `sleep_ratio` times what the batch took, so
+    the locks and the I/O are given back to the foreground writes, and a slower database slows the
+    deletes down with it. Returns the number of deleted rows.
+    """
+    deleted = 0
+    while True:
+        start = time.perf_counter()
+        with transaction.atomic():
+            ids = list(queryset.order_by(*order_by).values_list("pk", flat=True)[:batch_size])
+            if ids:
+                deleted += queryset.model.objects.filter(pk__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return deleted
+        sleep((time.perf_counter() - start) * sleep_ratio)
+
 
-    cash_out_movements = Movement.objects.filter(account_id=account_id,
-                                                 movement_type="cash_outflow"
-                                                 ).aggregate(Sum('amount'))
+def purge_client(client_id, batch_size=1000, sleep_ratio=1.0, sleep=time.sleep):
+    """
+    Removes a soft deleted client and its rows. The movements and daily rollups of every account
+    are deleted in throttled batches by delete_in_batches(), then the client is deleted with its
+    remaining accounts and category assignments. Their CategoryBalance rollups were already
+    subtracted by Client.soft_delete(). Returns the number of deleted rows by model, or None when
+    the client doesn't exist or isn't soft deleted.
+    """
+    if not Client.all_objects.filter(pk=client_id, state=False).exists():
+        return None
 
-    cash_in = 0.0 if not cash_in_movements["amount__sum"] else float(cash_in_movements["amount__sum"])
-    cash_out = 0.0 if not cash_out_movements["amount__sum"] else float(cash_out_movements["amount__sum"])
+    deleted = {}
+    account_ids = Account.objects.filter(client_id=client_id).order_by("id").values_list("id", flat=True)
+    for account_id in list(account_ids):
+        for model, order_by in ((Movement, ["id"]), (AccountDailyBalance, ["day"])):
+            deleted[model._meta.label] = deleted.get(model._meta.label, 0) + delete_in_batches(
+                model.objects.filter(account_id=account_id), order_by, batch_size, sleep_ratio, sleep
+            )
 
-    balance = cash_in - cash_out
+    with transaction.atomic():
+        _, rows = Client.all_objects.filter(pk=client_id, state=False).delete()
+    for label, count in rows.items():
+        deleted[label] = deleted.get(label, 0) + count
 
-    return balance
+    return deleted
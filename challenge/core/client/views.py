@@ -1,61 +1,124 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
 from django.http import Http404
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.dateparse import parse_datetime
+from django.views import View
 from rest_framework import status
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.client.cache import versioned_client_response
+from core.client.pagination import ClientCursorPagination
+from core.client.pagination import StatementPagination
 from core.client.serializers import ClientSerializer
 from core.client.serializers import FullClientInformationSerializer
 from core.client.serializers import CategoryClientRequestSerializer
-from core.client.utils import get_account_balance
+from core.client.utils import convert_balances
+from core.client.utils import create_clients_with_accounts
+from core.client.utils import get_account_balances
+from core.client.utils import get_balance_as_of
+from core.client.utils import get_category_report
+from core.client.utils import get_period_totals
+from core.external_apis.currency_api import CurrencyAPIError
+from core.external_apis.currency_api import get_exchange_rate
+from core.external_apis.currency_api import get_supported_currencies
+from core.jobs.queue import enqueue
 from core.models import Account
 from core.models import CategoryClient
 from core.models import Client
+from core.serializers import ValuesSerializer
 
 
 class ClientListCreate(APIView):
     """
     This view lists all clients and allows you to create a new one.
 
+    The list is paginated by id, use the `next` and `previous` links to move between pages and
+    `?page_size=` to change the page size. When CLIENTS_ALLOW_UNPAGINATED is enabled,
+    `?paginate=false` returns every client in a single response.
+
     To Create, the JSON structure is:
 
         {"name": "Nombre Ficticio"}
 
     """
+    pagination_class = ClientCursorPagination
+    values_serializer = ValuesSerializer(ClientSerializer)
+
     def get(self, request):
-        clients = Client.objects.all()
-        serializer = ClientSerializer(clients, many=True)
-        return Response(serializer.data)
+        # The list is read-only, the rows are read with values() instead of model instances.
+        clients = self.values_serializer.get_queryset(Client.objects.all())
+
+        if request.query_params.get("paginate") == "false":
+            if not settings.CLIENTS_ALLOW_UNPAGINATED:
+                return Response({"paginate": ["Unpaginated listing is disabled."]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return Response(self.values_serializer.to_representation(clients.order_by("id")))
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(clients, request, view=self)
+        return paginator.get_paginated_response(self.values_serializer.to_representation(page))
 
     def post(self, request):
         serializer = ClientSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
-            client_id = Client.objects.last().id
-            client_account = Account.objects.create(client_id=client_id)
-            client_account.save()
+            with transaction.atomic():
+                client = serializer.save()
+                # bulk_create skips Account.save(), a new client needs no version bump.
+                Account.objects.bulk_create([Account(client=client)])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ClientBulkCreate(APIView):
+    """
+    This view creates many clients at once, each one with its account, in a single transaction.
+
+    The JSON structure is:
+
+        [{"name": "Nombre Ficticio"}, {"name": "Otro Nombre"}]
+
+    """
+    def post(self, request):
+        serializer = ClientSerializer(data=request.data, many=True)
+        if serializer.is_valid():
+            accounts = create_clients_with_accounts([Client(**data) for data in serializer.validated_data],
+                                                    batch_size=settings.CLIENTS_BULK_BATCH_SIZE)
+            return Response([{"id": account.client.id, "name": account.client.name, "account": account.id}
+                             for account in accounts], status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 class ClientDetailUpdate(APIView):
     """
     This view returns specific client information and allows you to delete it and update it.
 
      * NOTE: You can update only the client name
+     * NOTE: Deleted clients disappear at once, their rows are purged later by a purge_client job
 
     """
     def get(self, request, pk):
-        client = get_object_or_404(Client.objects.all(), pk=pk)
-        account = Account.objects.filter(client_id=client.id)
-        category = CategoryClient.objects.filter(client_id=client.id)
+        return versioned_client_response(request, pk, "detail", lambda: self.get_client_data(pk))
+
+    def get_client_data(self, pk):
+        # The accounts get their client from the prefetch, and the categories are joined in the
+        # same query, so the response costs three queries whatever the number of related rows.
+        client = get_object_or_404(Client.objects.prefetch_related(
+            "account_set",
+            Prefetch("categoryclient_set", queryset=CategoryClient.objects.select_related("category"))
+        ), pk=pk)
         data = {
             "client": client,
-            "account": account,
-            "categories": category
+            "account": client.account_set.all(),
+            "categories": client.categoryclient_set.all()
         }
         serializer = FullClientInformationSerializer(data)
-        return Response(serializer.data)
+        return serializer.data
 
     def put(self, request, pk):
         client = get_object_or_404(Client.objects.all(), pk=pk)
@@ -67,10 +130,33 @@ class ClientDetailUpdate(APIView):
 
     def delete(self, request, pk):
         client = get_object_or_404(Client.objects.all(), pk=pk)
-        client.delete()
+        with transaction.atomic():
+            client.soft_delete()
+            enqueue("purge_client", {"client_id": client.id})
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class AsyncClientDetail(View):
+    """
+    Async variant of the specific client information, read through the async ORM.
+    """
+    async def get(self, request, pk):
+        client = await Client.objects.prefetch_related(
+            "account_set",
+            Prefetch("categoryclient_set", queryset=CategoryClient.objects.select_related("category"))
+        ).filter(pk=pk).afirst()
+        if client is None:
+            raise Http404
+
+        data = {
+            "client": client,
+            "account": client.account_set.all(),
+            "categories": client.categoryclient_set.all()
+        }
+        serializer = FullClientInformationSerializer(data)
+        return JsonResponse(serializer.data)
+
+
 class ClientCategoryAssignment(APIView):
     """
     This view allows you to assign a category to a specific client.
@@ -88,20 +174,150 @@ class ClientCategoryAssignment(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class CategoryBalanceReport(APIView):
+    """
+    This view returns the number, total and average balance of the accounts of the clients of
+    every category, read from the CategoryBalance rollups.
+    """
+    def get(self, request):
+        return Response(get_category_report())
+
+
 class ClientAccountBalance(APIView):
+    """
+    This view returns the balance of every account of the client.
+
+    `?currency=usd` also returns every balance and their total converted to that currency, see
+    CURRENCY_API["CURRENCIES"] for the supported codes. The rate is read once per request.
+    """
     def get(self, request, pk):
+        currency = request.query_params.get("currency")
+        if currency is None:
+            return versioned_client_response(request, pk, "accounts", lambda: self.get_balance_data(pk))
+
+        if currency not in get_supported_currencies():
+            return Response({"currency": [f"Unsupported currency, choose one of: "
+                                          f"{', '.join(sorted(get_supported_currencies()))}."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            rate = get_exchange_rate(currency)
+        except CurrencyAPIError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        # The converted response changes with the rate too, so the rate is part of its ETag.
+        return versioned_client_response(request, pk, f"accounts-{currency}-{rate}",
+                                         lambda: convert_balances(self.get_balance_data(pk), currency, rate),
+                                         use_last_modified=False)
+
+    def get_balance_data(self, pk):
         client = get_object_or_404(Client.objects.all(), pk=pk)
 
-        accounts = Account.objects.filter(client_id=client.id)
+        balances = get_account_balances(Account.objects.filter(client_id=client.id).values("id"))
+
+        account_list = [{"account": account_id, "balance": balance} for account_id, balance in balances.items()]
+
+        return {"client": ClientSerializer(client).data,
+                "accounts": account_list}
+
+
+class AsyncClientAccountBalance(View):
+    """
+    Async variant of ClientAccountBalance, read through the async ORM.
+    """
+    async def get(self, request, pk):
+        client = await Client.objects.filter(pk=pk).afirst()
+        if client is None:
+            raise Http404
+
+        accounts = Account.objects.filter(client_id=client.id).order_by("id").values_list("id", "balance")
+        account_list = [{"account": account_id, "balance": balance} async for account_id, balance in accounts]
+
+        return JsonResponse({"client": ClientSerializer(client).data,
+                             "accounts": account_list})
+
+
+def parse_date_param(value, allow_datetime=False):
+    """
+    Parses a YYYY-MM-DD query parameter, or an ISO 8601 datetime when allow_datetime is True.
+    Naive datetimes are taken in the current timezone. Returns None when the value is invalid.
+    """
+    try:
+        if allow_datetime and value and "T" in value:
+            moment = parse_datetime(value)
+            if moment is not None and timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            return moment
+        return parse_date(value or "")
+    except ValueError:
+        return None
+
+
+class AccountBalanceAsOf(APIView):
+    """
+    This view returns the balance of a client account at the end of a date or at a datetime.
+
+        ?date=2023-11-30 or ?date=2023-11-30T15:00:00
+
+    """
+    def get(self, request, pk, account_pk):
+        account = get_object_or_404(Account.objects.alive(), pk=account_pk, client_id=pk)
+
+        moment = parse_date_param(request.query_params.get("date"), allow_datetime=True)
+        if moment is None:
+            return Response({"date": ["Enter a valid date (YYYY-MM-DD) or datetime (ISO 8601)."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"account": account.id,
+                         "date": moment.isoformat(),
+                         "balance": get_balance_as_of(account.id, moment)})
+
+
+class AccountPeriodTotals(APIView):
+    """
+    This view returns the inflow and outflow totals of a client account between two dates, both included.
+
+        ?start=2023-11-01&end=2023-11-30
+
+    """
+    def get(self, request, pk, account_pk):
+        account = get_object_or_404(Account.objects.alive(), pk=account_pk, client_id=pk)
+
+        errors = {}
+        dates = {}
+        for param in ["start", "end"]:
+            dates[param] = parse_date_param(request.query_params.get(param))
+            if dates[param] is None:
+                errors[param] = ["Enter a valid date (YYYY-MM-DD)."]
+        if not errors and dates["start"] > dates["end"]:
+            errors["end"] = ["The end date must not be before the start date."]
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        totals = get_period_totals(account.id, dates["start"], dates["end"])
+
+        return Response({"account": account.id,
+                         "start": dates["start"].isoformat(),
+                         "end": dates["end"].isoformat(),
+                         "cash_in": totals["cash_in"],
+                         "cash_out": totals["cash_out"],
+                         "balance_change": totals["balance"]})
+
+
+class AccountStatement(APIView):
+    """
+    This view returns the movements of a client account ordered by date, each one with the
+    balance of the account after it.
+
+    The statement is paginated, use the `next` link to move to the following page and
+    `?page_size=` to change the page size. Every page carries its opening and closing balance.
+
+    """
+    pagination_class = StatementPagination
 
-        account_list = []
+    def get(self, request, pk, account_pk):
+        account = get_object_or_404(Account.objects.alive(), pk=account_pk, client_id=pk)
 
-        for account in accounts:
-            account_balance = {
-                "account": account.id,
-                "balance": get_account_balance(account.id)
-            }
-            account_list.append(account_balance)
+        paginator = self.pagination_class()
+        rows = paginator.paginate_statement(account.id, request)
 
-        return Response({"client": ClientSerializer(client).data,
-                         "accounts": account_list})
+        return paginator.get_paginated_response(rows)
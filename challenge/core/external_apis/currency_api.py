@@ -1,18 +1,350 @@
-import json
+import asyncio
+import copy
+import logging
+import threading
+import time
+import weakref
 
 import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from core.metrics.collectors import CURRENCY_API_DURATION
+from core.metrics.collectors import CURRENCY_API_ERRORS
+from core.profiling import timed
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
 
 URL = "https://www.dolarsi.com/api/api.php?type=valoresprincipales"
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_CURRENCY_API = {
+    "PROVIDER": "core.external_apis.currency_api.HttpRateProvider",
+    "OPTIONS": {},
+    "TTL": 60,
+    "STALE_TTL": 600,
+    "CACHE_ALIAS": None,
+    # Currency codes accepted by the balance conversions and the quote their rate is read from.
+    "CURRENCIES": {
+        "usd": "Dolar Bolsa",
+        "usd_blue": "Dolar Blue",
+        "usd_oficial": "Dolar Oficial",
+    },
+}
+
+
+class CurrencyAPIError(Exception):
+    pass
+
+
+class HttpRateProvider:
+    """
+    Fetches the currency values from the dolarsi API, giving up after `timeout` seconds.
+
+    aget_rates() uses a pooled httpx.AsyncClient per event loop, keeping up to `max_connections`
+    connections open between calls. Without httpx installed it runs get_rates() in a thread.
+    """
+    def __init__(self, url=URL, timeout=2.0, max_connections=100):
+        self.url = url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.async_clients = weakref.WeakKeyDictionary()
+
+    def get_rates(self):
+        try:
+            with timed("http"):
+                response = requests.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as error:
+            raise CurrencyAPIError(f"Could not fetch the currency values: {error}") from error
+
+    def get_async_client(self):
+        # An AsyncClient is bound to the event loop that opened its connections.
+        loop = asyncio.get_running_loop()
+        client = self.async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(timeout=self.timeout,
+                                       limits=httpx.Limits(max_connections=self.max_connections))
+            self.async_clients[loop] = client
+        return client
+
+    async def aget_rates(self):
+        if httpx is None:
+            return await sync_to_async(self.get_rates, thread_sensitive=False)()
+
+        try:
+            with timed("http"):
+                response = await self.get_async_client().get(self.url)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as error:
+            raise CurrencyAPIError(f"Could not fetch the currency values: {error}") from error
+
+
+class FakeRateProvider:
+    """
+    Local provider that answers with fixed values, so tests and benchmarks run offline.
+    """
+    DEFAULT_RATES = [
+        {"casa": {"compra": "350,00", "venta": "365,00", "nombre": "Dolar Oficial"}},
+        {"casa": {"compra": "900,00", "venta": "950,00", "nombre": "Dolar Blue"}},
+        {"casa": {"compra": "850,00", "venta": "870,00", "nombre": "Dolar Bolsa"}},
+    ]
+
+    def __init__(self, rates=None, delay=0.0):
+        self.rates = rates if rates is not None else self.DEFAULT_RATES
+        self.delay = delay
+        self.calls = 0
+
+    def get_rates(self):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return copy.deepcopy(self.rates)
+
+    async def aget_rates(self):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return copy.deepcopy(self.rates)
+
+
+class CachedRateProvider:
+    """
+    Wraps another provider with an in-process TTL cache and, optionally, a shared Django cache.
+
+     * Values younger than `ttl` seconds are served from memory.
+     * Values younger than `stale_ttl` seconds are served as they are while a background
+       thread refreshes them (stale-while-revalidate).
+     * Older values trigger a synchronous refresh, and when the upstream API fails the last
+       known good values are served no matter how old they are.
+
+    Refreshes are single-flight: callers that need a refresh while another one is running wait
+    for it and share its result. aget_rates() does the same for coroutines, every coroutine of an
+    event loop awaits the same upstream fetch.
+    """
+    def __init__(self, provider, ttl=60, stale_ttl=600, cache_alias=None,
+                 cache_key="currency_api:rates", clock=time.time):
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.cache_alias = cache_alias
+        self.cache_key = cache_key
+        self.clock = clock
+        self.entry = None
+        self.refresh_lock = threading.Lock()
+        self.background_lock = threading.Lock()
+        self.refresh_thread = None
+        self.flights = weakref.WeakKeyDictionary()
+
+    def get_rates(self):
+        entry = self.entry
+        if entry is None or self.age(entry) >= self.ttl:
+            entry = self.get_shared_entry() or entry
+
+        if entry is not None:
+            age = self.age(entry)
+            if age < self.ttl:
+                return entry["rates"]
+            if age < self.stale_ttl:
+                self.refresh_in_background()
+                return entry["rates"]
+
+        return self.refresh(entry)["rates"]
+
+    def age(self, entry):
+        return self.clock() - entry["fetched_at"]
+
+    def get_shared_entry(self):
+        if not self.cache_alias:
+            return None
+        entry = caches[self.cache_alias].get(self.cache_key)
+        if entry is not None and (self.entry is None or entry["fetched_at"] > self.entry["fetched_at"]):
+            self.entry = entry
+        return entry
+
+    def refresh(self, expired_entry=None):
+        with self.refresh_lock:
+            # Another thread refreshed the values while this one was waiting, share its result.
+            if self.entry is not None and self.entry is not expired_entry:
+                return self.entry
+
+            start = time.perf_counter()
+            try:
+                rates = self.provider.get_rates()
+            except CurrencyAPIError as error:
+                CURRENCY_API_ERRORS.inc()
+                return self.get_last_known_good(error)
+            finally:
+                CURRENCY_API_DURATION.observe(time.perf_counter() - start)
+
+            self.entry = {"rates": rates, "fetched_at": self.clock()}
+            if self.cache_alias:
+                caches[self.cache_alias].set(self.cache_key, self.entry, self.stale_ttl)
+            return self.entry
+
+    def get_last_known_good(self, error):
+        if self.entry is None:
+            raise error
+        logger.warning("Currency API failed, serving values fetched %.0f seconds ago.",
+                       self.age(self.entry), exc_info=error)
+        return self.entry
+
+    def refresh_in_background(self):
+        # Only one background refresh runs at a time, the other callers keep serving stale values.
+        if not self.background_lock.acquire(blocking=False):
+            return
+        self.refresh_thread = threading.Thread(target=self.refresh_quietly, args=(self.entry,), daemon=True)
+        self.refresh_thread.start()
+
+    def refresh_quietly(self, expired_entry):
+        try:
+            self.refresh(expired_entry)
+        except CurrencyAPIError:
+            logger.warning("Background refresh of the currency values failed.", exc_info=True)
+        finally:
+            self.background_lock.release()
+
+    async def aget_rates(self):
+        entry = self.entry
+        if entry is None or self.age(entry) >= self.ttl:
+            entry = await self.aget_shared_entry() or entry
+
+        if entry is not None:
+            age = self.age(entry)
+            if age < self.ttl:
+                return entry["rates"]
+            if age < self.stale_ttl:
+                self.get_flight(entry)
+                return entry["rates"]
+
+        # The flight is shielded, so a cancelled request doesn't cancel the fetch the others wait for.
+        return (await asyncio.shield(self.get_flight(entry)))["rates"]
+
+    async def aget_shared_entry(self):
+        if not self.cache_alias:
+            return None
+        entry = await caches[self.cache_alias].aget(self.cache_key)
+        if entry is not None and (self.entry is None or entry["fetched_at"] > self.entry["fetched_at"]):
+            self.entry = entry
+        return entry
+
+    def get_flight(self, expired_entry):
+        """
+        Returns the refresh task running in the current event loop, starting it if there is none.
+        """
+        loop = asyncio.get_running_loop()
+        flight = self.flights.get(loop)
+        if flight is None or flight.done():
+            flight = loop.create_task(self.arefresh(expired_entry))
+            flight.add_done_callback(self.log_flight_error)
+            self.flights[loop] = flight
+        return flight
+
+    async def arefresh(self, expired_entry=None):
+        if self.entry is not None and self.entry is not expired_entry:
+            return self.entry
+
+        start = time.perf_counter()
+        try:
+            rates = await self.provider.aget_rates()
+        except CurrencyAPIError as error:
+            CURRENCY_API_ERRORS.inc()
+            return self.get_last_known_good(error)
+        finally:
+            CURRENCY_API_DURATION.observe(time.perf_counter() - start)
+
+        self.entry = {"rates": rates, "fetched_at": self.clock()}
+        if self.cache_alias:
+            await caches[self.cache_alias].aset(self.cache_key, self.entry, self.stale_ttl)
+        return self.entry
+
+    @staticmethod
+    def log_flight_error(flight):
+        # Background refreshes have no caller to raise to.
+        if not flight.cancelled() and flight.exception() is not None:
+            logger.warning("Refresh of the currency values failed.", exc_info=flight.exception())
+
+
+_rate_provider = None
+
+
+def get_currency_api_config():
+    return {**DEFAULT_CURRENCY_API, **getattr(settings, "CURRENCY_API", {})}
+
+
+def get_rate_provider():
+    """
+    Returns the process wide rate provider configured by the CURRENCY_API setting.
+    """
+    global _rate_provider
+    if _rate_provider is None:
+        config = get_currency_api_config()
+        provider = import_string(config["PROVIDER"])(**config["OPTIONS"])
+        _rate_provider = CachedRateProvider(provider, ttl=config["TTL"], stale_ttl=config["STALE_TTL"],
+                                            cache_alias=config["CACHE_ALIAS"])
+    return _rate_provider
+
+
+@receiver(setting_changed)
+def reset_rate_provider(setting, **kwargs):
+    global _rate_provider
+    if setting == "CURRENCY_API":
+        _rate_provider = None
+
 
 def get_currencies_values(dollar_name=None):
-    payload = {}
-    headers = {}
+    dollar_list = get_rate_provider().get_rates()
+    return find_currency(dollar_list, dollar_name)
+
+
+async def aget_currencies_values(dollar_name=None):
+    dollar_list = await get_rate_provider().aget_rates()
+    return find_currency(dollar_list, dollar_name)
+
+
+def get_supported_currencies():
+    return get_currency_api_config()["CURRENCIES"]
+
+
+def get_exchange_rate(currency):
+    """
+    Returns the buying price in pesos of one unit of a currency of CURRENCY_API["CURRENCIES"],
+    from a single read of the rate provider.
+    """
+    name = get_supported_currencies()[currency]
+    quote = get_currencies_values(name)
+    try:
+        rate = parse_rate(quote["casa"]["compra"])
+    except (TypeError, KeyError, ValueError):
+        rate = None
+
+    if not rate:
+        raise CurrencyAPIError(f"The currency API has no rate for {name}.")
+    return rate
+
+
+def parse_rate(value):
+    """
+    Parses the prices of the API, formatted like "1.015,50".
+    """
+    if "," in value:
+        value = value.replace(".", "").replace(",", ".")
+    return float(value)
+
 
-    response = requests.request("GET", URL, headers=headers, data=payload)
+def find_currency(dollar_list, dollar_name=None):
     if not dollar_name:
-        return json.loads(response.text)
+        return dollar_list
     else:
-        dollar_list = json.loads(response.text)
         res = next((sub for sub in dollar_list if sub['casa']['nombre'] == dollar_name), None)
         return res
@@ -0,0 +1,209 @@
+import asyncio
+from unittest import mock
+
+import httpx
+import requests
+from django.core.cache import caches
+from django.test import SimpleTestCase
+from django.test import override_settings
+from django.urls import reverse
+
+from core.external_apis.currency_api import CachedRateProvider
+from core.external_apis.currency_api import CurrencyAPIError
+from core.external_apis.currency_api import FakeRateProvider
+from core.external_apis.currency_api import HttpRateProvider
+from core.external_apis.currency_api import get_currencies_values
+from core.external_apis.currency_api import get_rate_provider
+
+
+class FailingRateProvider:
+    def get_rates(self):
+        raise CurrencyAPIError("Upstream is down")
+
+    async def aget_rates(self):
+        raise CurrencyAPIError("Upstream is down")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CachedRateProviderTestCase(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.fake_provider = FakeRateProvider()
+        self.provider = CachedRateProvider(self.fake_provider, ttl=60, stale_ttl=600, clock=self.clock)
+
+    def test_values_are_cached_while_fresh(self):
+        self.provider.get_rates()
+        self.clock.now += 59
+        self.provider.get_rates()
+
+        self.assertEqual(self.fake_provider.calls, 1)
+
+    def test_stale_values_are_served_while_refreshed_in_background(self):
+        self.provider.get_rates()
+        self.fake_provider.rates = [{"casa": {"compra": "1,00", "venta": "1,00", "nombre": "Dolar Bolsa"}}]
+        self.clock.now += 120
+
+        rates = self.provider.get_rates()
+        self.provider.refresh_thread.join()
+
+        self.assertEqual(rates, FakeRateProvider.DEFAULT_RATES)
+        self.assertEqual(self.fake_provider.calls, 2)
+        self.assertEqual(self.provider.get_rates(), self.fake_provider.rates)
+
+    def test_expired_values_are_refreshed_synchronously(self):
+        self.provider.get_rates()
+        self.clock.now += 601
+        self.provider.get_rates()
+
+        self.assertEqual(self.fake_provider.calls, 2)
+        self.assertIsNone(self.provider.refresh_thread)
+
+    def test_last_known_good_values_are_served_when_upstream_fails(self):
+        rates = self.provider.get_rates()
+        self.provider.provider = FailingRateProvider()
+        self.clock.now += 10000
+
+        with self.assertLogs("core.external_apis.currency_api", "WARNING"):
+            self.assertEqual(self.provider.get_rates(), rates)
+
+    def test_upstream_error_without_values_is_raised(self):
+        provider = CachedRateProvider(FailingRateProvider(), clock=self.clock)
+
+        with self.assertRaises(CurrencyAPIError):
+            provider.get_rates()
+
+    def test_values_are_shared_through_django_cache(self):
+        caches["default"].clear()
+        provider = CachedRateProvider(self.fake_provider, cache_alias="default", clock=self.clock)
+        other_provider = CachedRateProvider(FailingRateProvider(), cache_alias="default", clock=self.clock)
+
+        self.assertEqual(provider.get_rates(), other_provider.get_rates())
+        self.assertEqual(self.fake_provider.calls, 1)
+
+
+class AsyncCachedRateProviderTestCase(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.fake_provider = FakeRateProvider(delay=0.05)
+        self.provider = CachedRateProvider(self.fake_provider, ttl=60, stale_ttl=600, clock=self.clock)
+
+    async def test_concurrent_callers_share_one_fetch(self):
+        results = await asyncio.gather(*(self.provider.aget_rates() for _ in range(500)))
+
+        self.assertEqual(self.fake_provider.calls, 1)
+        self.assertTrue(all(rates == FakeRateProvider.DEFAULT_RATES for rates in results))
+
+    async def test_stale_values_are_served_while_refreshed_in_background(self):
+        await self.provider.aget_rates()
+        self.fake_provider.rates = [{"casa": {"compra": "1,00", "venta": "1,00", "nombre": "Dolar Bolsa"}}]
+        self.clock.now += 120
+
+        results = await asyncio.gather(*(self.provider.aget_rates() for _ in range(10)))
+        await asyncio.gather(*self.provider.flights.values())
+
+        self.assertTrue(all(rates == FakeRateProvider.DEFAULT_RATES for rates in results))
+        self.assertEqual(self.fake_provider.calls, 2)
+        self.assertEqual(await self.provider.aget_rates(), self.fake_provider.rates)
+
+    async def test_last_known_good_values_are_served_when_upstream_fails(self):
+        rates = await self.provider.aget_rates()
+        self.provider.provider = FailingRateProvider()
+        self.clock.now += 10000
+
+        with self.assertLogs("core.external_apis.currency_api", "WARNING"):
+            self.assertEqual(await self.provider.aget_rates(), rates)
+
+    async def test_upstream_error_without_values_is_raised(self):
+        provider = CachedRateProvider(FailingRateProvider(), clock=self.clock)
+
+        with self.assertLogs("core.external_apis.currency_api", "WARNING"):
+            with self.assertRaises(CurrencyAPIError):
+                await provider.aget_rates()
+
+
+class HttpRateProviderTestCase(SimpleTestCase):
+    def test_request_uses_timeout(self):
+        with mock.patch("core.external_apis.currency_api.requests.get") as get:
+            get.return_value.json.return_value = FakeRateProvider.DEFAULT_RATES
+            rates = HttpRateProvider(timeout=0.5).get_rates()
+
+        self.assertEqual(rates, FakeRateProvider.DEFAULT_RATES)
+        self.assertEqual(get.call_args.kwargs["timeout"], 0.5)
+
+    def test_request_errors_are_wrapped(self):
+        with mock.patch("core.external_apis.currency_api.requests.get", side_effect=requests.Timeout):
+            with self.assertRaises(CurrencyAPIError):
+                HttpRateProvider().get_rates()
+
+    def mock_async_client(self, status_code=200):
+        transport = httpx.MockTransport(lambda request: httpx.Response(status_code,
+                                                                       json=FakeRateProvider.DEFAULT_RATES))
+        async_client = httpx.AsyncClient
+        return mock.patch("core.external_apis.currency_api.httpx.AsyncClient",
+                          side_effect=lambda **kwargs: async_client(transport=transport, **kwargs))
+
+    async def test_async_requests_reuse_a_pooled_client(self):
+        provider = HttpRateProvider(timeout=0.5, max_connections=10)
+
+        with self.mock_async_client() as client_class:
+            rates = await provider.aget_rates()
+            await provider.aget_rates()
+
+        self.assertEqual(rates, FakeRateProvider.DEFAULT_RATES)
+        self.assertEqual(client_class.call_count, 1)
+        self.assertEqual(client_class.call_args.kwargs["timeout"], 0.5)
+
+    async def test_async_request_errors_are_wrapped(self):
+        with self.mock_async_client(status_code=500):
+            with self.assertRaises(CurrencyAPIError):
+                await HttpRateProvider().aget_rates()
+
+
+@override_settings(CURRENCY_API={"PROVIDER": "core.external_apis.currency_api.FakeRateProvider"})
+class GetCurrenciesValuesTestCase(SimpleTestCase):
+    def test_get_currency_by_name(self):
+        dollar = get_currencies_values("Dolar Bolsa")
+
+        self.assertEqual(dollar["casa"]["compra"], "850,00")
+        self.assertIsNone(get_currencies_values("Dolar Inexistente"))
+
+    def test_provider_is_reused_between_calls(self):
+        get_currencies_values()
+        get_currencies_values()
+
+        self.assertEqual(get_rate_provider().provider.calls, 1)
+
+
+@override_settings(CURRENCY_API={"PROVIDER": "core.external_apis.currency_api.FakeRateProvider",
+                                 "OPTIONS": {"delay": 0.05}})
+class CurrencyValuesTestCase(SimpleTestCase):
+    def test_get_currency_values(self):
+        response = self.client.get(reverse("currencies"), data={"name": "Dolar Bolsa"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["casa"]["compra"], "850,00")
+
+        response = self.client.get(reverse("currencies"), data={"name": "Dolar Inexistente"})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_concurrent_async_requests_trigger_one_upstream_fetch(self):
+        responses = await asyncio.gather(*(self.async_client.get(reverse("async_currencies"))
+                                           for _ in range(500)))
+
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertEqual(responses[0].json(), FakeRateProvider.DEFAULT_RATES)
+        self.assertEqual(get_rate_provider().provider.calls, 1)
+
+    @override_settings(CURRENCY_API={"PROVIDER": "core.external_apis.tests.FailingRateProvider"})
+    async def test_async_upstream_error(self):
+        with self.assertLogs("core.external_apis.currency_api", "WARNING"):
+            response = await self.async_client.get(reverse("async_currencies"))
+
+        self.assertEqual(response.status_code, 503)
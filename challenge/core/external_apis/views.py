@@ -0,0 +1,41 @@
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.external_apis.currency_api import CurrencyAPIError
+from core.external_apis.currency_api import aget_currencies_values
+from core.external_apis.currency_api import get_currencies_values
+
+CURRENCY_NOT_FOUND_MESSAGE = "Currency not found."
+
+
+class CurrencyValues(APIView):
+    """
+    This view returns the currency values, or only the one named by `?name=Dolar Bolsa`.
+    """
+    def get(self, request):
+        try:
+            currencies = get_currencies_values(request.query_params.get("name"))
+        except CurrencyAPIError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if currencies is None:
+            return Response({"detail": CURRENCY_NOT_FOUND_MESSAGE}, status=status.HTTP_404_NOT_FOUND)
+        return Response(currencies)
+
+
+class AsyncCurrencyValues(View):
+    """
+    Async variant of CurrencyValues, waiting for the currency API doesn't hold a worker thread.
+    """
+    async def get(self, request):
+        try:
+            currencies = await aget_currencies_values(request.GET.get("name"))
+        except CurrencyAPIError as error:
+            return JsonResponse({"detail": str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        if currencies is None:
+            return JsonResponse({"detail": CURRENCY_NOT_FOUND_MESSAGE}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse(currencies, safe=False)
@@ -0,0 +1,16 @@
+from django.conf import settings
+
+DEFAULT_JOBS = {
+    "CONCURRENCY": 4,
+    "POLL_INTERVAL": 1.0,
+    "MAX_ATTEMPTS": 3,
+    "BACKOFF_BASE": 10.0,
+    "BACKOFF_MAX": 3600.0,
+    "HEARTBEAT_INTERVAL": 30.0,
+    "STALE_AFTER": 300.0,
+    "EXPORT_DIR": None,
+}
+
+
+def get_jobs_options():
+    return {**DEFAULT_JOBS, **getattr(settings, "JOBS", {})}
@@ -0,0 +1,186 @@
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from django.db import connections
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.jobs import get_jobs_options
+from core.jobs.tasks import TASKS
+from core.models import Job
+from core.routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task, arguments=None, max_attempts=None, delay=0.0):
+    """
+    Queues a job that runs the task `delay` seconds from now. Enqueued inside a transaction, the
+    job only becomes visible to the workers when the transaction commits.
+    """
+    if task not in TASKS:
+        raise ValueError(f"Unknown task \"{task}\".")
+
+    return Job.objects.create(task=task, arguments=arguments or {},
+                              max_attempts=max_attempts or get_jobs_options()["MAX_ATTEMPTS"],
+                              run_at=timezone.now() + datetime.timedelta(seconds=delay))
+
+
+def get_backoff(attempts):
+    """
+    Seconds to wait before the next attempt of a job that failed `attempts` times.
+    """
+    options = get_jobs_options()
+    return min(options["BACKOFF_BASE"] * 2 ** (attempts - 1), options["BACKOFF_MAX"])
+
+
+def claim_jobs(worker, limit):
+    """
+    Marks up to `limit` due jobs as running for the worker and returns them. The rows are locked
+    with SKIP LOCKED, so concurrent workers claim different jobs without waiting for each other.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(Job.objects.select_for_update(skip_locked=True).filter(
+            status="queued", run_at__lte=now
+        ).order_by("run_at", "id")[:limit])
+        if jobs:
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status="running", attempts=F("attempts") + 1, started_at=now, heartbeat_at=now, worker=worker
+            )
+
+    for job in jobs:
+        job.status, job.attempts, job.started_at, job.heartbeat_at, job.worker = (
+            "running", job.attempts + 1, now, now, worker
+        )
+    return jobs
+
+
+def owned_by(job):
+    """
+    Filters the job row while it still runs the attempt the worker claimed. The other workers can
+    claim it again once requeue_stale_jobs() gives it back.
+    """
+    return Job.objects.filter(pk=job.pk, status="running", worker=job.worker, attempts=job.attempts)
+
+
+def send_heartbeats(jobs):
+    now = timezone.now()
+    return sum(owned_by(job).update(heartbeat_at=now) for job in jobs)
+
+
+def requeue_stale_jobs(stale_after):
+    """
+    Gives back the running jobs without a heartbeat for `stale_after` seconds, left behind by a
+    worker that died. The lost run counts as a failed attempt.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status="running", heartbeat_at__lt=now - datetime.timedelta(seconds=stale_after))
+    error = "The worker running the job was lost."
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(status="failed", error=error, finished_at=now)
+    queued = stale.update(status="queued", error=error, run_at=now)
+    return failed + queued
+
+
+def run_job(job):
+    """
+    Runs a claimed job and records its result. A failed attempt queues the job again after
+    get_backoff() seconds, or fails it when it has no attempts left. The result of a job that was
+    given to another worker in the meantime is dropped.
+    """
+    try:
+        with use_primary():
+            result = TASKS[job.task](**job.arguments)
+    except Exception:
+        logger.warning("Job %s (%s) failed, attempt %s of %s.", job.pk, job.task, job.attempts, job.max_attempts,
+                       exc_info=True)
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = "queued"
+            job.run_at = timezone.now() + datetime.timedelta(seconds=get_backoff(job.attempts))
+        else:
+            job.status = "failed"
+            job.finished_at = timezone.now()
+    else:
+        job.status, job.result, job.error, job.finished_at = "succeeded", result, "", timezone.now()
+
+    if not owned_by(job).update(status=job.status, result=job.result, error=job.error, run_at=job.run_at,
+                                finished_at=job.finished_at):
+        logger.warning("Job %s (%s) was given to another worker, the result of attempt %s is dropped.",
+                       job.pk, job.task, job.attempts)
+    return job
+
+
+class Worker:
+    """
+    Runs the queued jobs in a pool of `concurrency` threads, polling the table every
+    `poll_interval` seconds while it has free threads and no due jobs. Every `heartbeat_interval`
+    seconds it refreshes the heartbeat of its running jobs and gives back the stale ones of the
+    dead workers.
+
+    With burst=True run() returns once the queue has no due jobs left, otherwise it runs until
+    stop() is called, which lets the running jobs finish.
+    """
+    def __init__(self, concurrency=None, poll_interval=None, stale_after=None, heartbeat_interval=None, name=None):
+        options = get_jobs_options()
+        self.concurrency = concurrency or options["CONCURRENCY"]
+        self.poll_interval = options["POLL_INTERVAL"] if poll_interval is None else poll_interval
+        self.stale_after = stale_after or options["STALE_AFTER"]
+        self.heartbeat_interval = heartbeat_interval or options["HEARTBEAT_INTERVAL"]
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+        self.processed = 0
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self, burst=False):
+        requeue_stale_jobs(self.stale_after)
+        last_heartbeat = time.monotonic()
+
+        # {future: job} of the jobs running in the pool.
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job") as pool:
+            while not self.stopping.is_set():
+                finished = [future for future in running if future.done()]
+                self.processed += len(finished)
+                for future in finished:
+                    del running[future]
+
+                if time.monotonic() - last_heartbeat >= self.heartbeat_interval:
+                    send_heartbeats(running.values())
+                    requeue_stale_jobs(self.stale_after)
+                    last_heartbeat = time.monotonic()
+
+                jobs = claim_jobs(self.name, self.concurrency - len(running)) if len(running) < self.concurrency else []
+                running.update({pool.submit(self.process, job): job for job in jobs})
+                if burst and not running:
+                    break
+
+                if jobs:
+                    continue
+                if running:
+                    # Wakes up as soon as a job finishes, to claim the next one.
+                    wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                else:
+                    self.stopping.wait(self.poll_interval)
+
+        self.processed += len(running)
+        return self.processed
+
+    @staticmethod
+    def process(job):
+        try:
+            return run_job(job)
+        finally:
+            # Every thread has its own connection, closed with the job so none is left idle.
+            connections.close_all()
@@ -0,0 +1,29 @@
+import inspect
+
+from rest_framework import serializers
+
+from core.jobs.tasks import TASKS
+from core.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ["id", "task", "arguments", "status", "attempts", "max_attempts", "run_at", "result", "error",
+                  "worker", "created_at", "started_at", "heartbeat_at", "finished_at"]
+        read_only_fields = fields
+
+
+class JobRequestSerializer(serializers.Serializer):
+    task = serializers.ChoiceField(choices=sorted(TASKS))
+    arguments = serializers.DictField(required=False, default=dict)
+    max_attempts = serializers.IntegerField(required=False, min_value=1, max_value=100)
+    delay = serializers.FloatField(required=False, min_value=0.0, default=0.0)
+
+    def validate(self, data):
+        # Arguments the task doesn't accept would fail every attempt.
+        try:
+            inspect.signature(TASKS[data["task"]]).bind(**data["arguments"])
+        except TypeError as error:
+            raise serializers.ValidationError({"arguments": [str(error)]})
+        return data
@@ -0,0 +1,74 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.utils import timezone
+
+from core.client.utils import purge_client as purge_client_rows
+from core.jobs import get_jobs_options
+from core.models import Movement
+from core.movements.export import EXPORT_FORMATS
+from core.movements.export import iter_movement_rows
+
+
+def purge_client(client_id, batch_size=1000, sleep_ratio=1.0):
+    """
+    Removes the rows of a soft deleted client, see core.client.utils.purge_client.
+    """
+    return purge_client_rows(client_id, batch_size, sleep_ratio)
+
+
+def rebuild_balances(accounts=None, verify=False):
+    return run_command("rebuild_balances", *command_options("--account", accounts), verify=verify)
+
+
+def rebuild_category_balances(categories=None, verify=False):
+    return run_command("rebuild_category_balances", *command_options("--category", categories), verify=verify)
+
+
+def export_movements(account=None, client=None, output="csv"):
+    """
+    Writes the movements of an account or a client to a new file of JOBS["EXPORT_DIR"], in the
+    formats of the movements/export/ endpoint. Returns the path of the file, which is named after
+    the export time, so repeated exports never overwrite each other.
+    """
+    movements = Movement.objects.alive()
+    if account is not None:
+        movements, filename = movements.filter(account_id=account), f"account_{account}_movements"
+    elif client is not None:
+        movements, filename = movements.filter(account__client_id=client), f"client_{client}_movements"
+    else:
+        raise ValueError("An account or client is required.")
+
+    _, export = EXPORT_FORMATS[output]
+    export_dir = get_jobs_options()["EXPORT_DIR"] or tempfile.gettempdir()
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f"{filename}_{timezone.now():%Y%m%dT%H%M%S%f}.{output}")
+    # "x" fails instead of overwriting a file of the same name.
+    with open(path, "x", newline="") as file:
+        for chunk in export(iter_movement_rows(movements, settings.MOVEMENTS_EXPORT_CHUNK_SIZE)):
+            file.write(chunk)
+
+    return {"path": path}
+
+
+def command_options(option, values):
+    return [argument for value in values or [] for argument in (option, str(value))]
+
+
+def run_command(name, *args, **options):
+    out = StringIO()
+    call_command(name, *args, stdout=out, **options)
+    return {"output": out.getvalue()}
+
+
+# Functions the jobs can run, by task name. They receive the arguments of the job and return a
+# JSON serializable result, an exception fails the attempt.
+TASKS = {
+    "purge_client": purge_client,
+    "rebuild_balances": rebuild_balances,
+    "rebuild_category_balances": rebuild_category_balances,
+    "export_movements": export_movements,
+}
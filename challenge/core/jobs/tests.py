@@ -0,0 +1,231 @@
+import datetime
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from core.factories import AccountFactory
+from core.factories import ClientFactory
+from core.factories import MovementFactory
+from core.jobs.queue import Worker
+from core.jobs.queue import claim_jobs
+from core.jobs.queue import enqueue
+from core.jobs.queue import get_backoff
+from core.jobs.queue import requeue_stale_jobs
+from core.jobs.queue import run_job
+from core.jobs.queue import send_heartbeats
+from core.jobs.tasks import TASKS
+from core.models import Account
+from core.models import Client
+from core.models import Job
+
+
+@override_settings(JOBS={"BACKOFF_BASE": 10.0, "BACKOFF_MAX": 25.0, "MAX_ATTEMPTS": 3})
+class JobQueueTestCase(TestCase):
+    def setUp(self):
+        client = ClientFactory()
+        client.save()
+        self.account = AccountFactory(client=client)
+        self.account.save()
+        MovementFactory(account=self.account, amount=100.0).save()
+
+    def test_claim_only_takes_due_jobs_in_order(self):
+        later = enqueue("rebuild_balances", delay=60)
+        first = enqueue("rebuild_balances")
+        second = enqueue("rebuild_category_balances")
+
+        self.assertEqual([job.id for job in claim_jobs("worker-1", 5)], [first.id, second.id])
+        self.assertEqual(claim_jobs("worker-2", 5), [])
+        self.assertEqual(Job.objects.get(pk=first.pk).status, "running")
+        self.assertEqual(Job.objects.get(pk=later.pk).status, "queued")
+
+    def test_run_job_records_the_result(self):
+        Account.objects.filter(pk=self.account.pk).update(balance=5.0)
+        enqueue("rebuild_balances", {"accounts": [self.account.id]})
+
+        job = run_job(claim_jobs("worker-1", 1)[0])
+
+        self.assertEqual(job.status, "succeeded")
+        self.assertIn("fixed 1 mismatches", Job.objects.get(pk=job.pk).result["output"])
+        self.assertEqual(Account.objects.get(pk=self.account.pk).balance, 100.0)
+
+    def run_flaky_job(self, failures, max_attempts):
+        calls = []
+
+        def flaky(failures):
+            calls.append(failures)
+            if len(calls) <= failures:
+                raise RuntimeError("Upstream unavailable")
+            return {"calls": len(calls)}
+
+        job = Job.objects.create(task="flaky", arguments={"failures": failures}, max_attempts=max_attempts)
+        delays = []
+        with mock.patch.dict(TASKS, {"flaky": flaky}), self.assertLogs("core.jobs.queue", "WARNING"):
+            while job.status in ("queued", "running"):
+                Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+                job = run_job(claim_jobs("worker-1", 1)[0])
+                delays.append(job.run_at - job.started_at)
+
+        return Job.objects.get(pk=job.pk), delays
+
+    def test_failed_attempts_are_retried_with_backoff(self):
+        job, delays = self.run_flaky_job(failures=2, max_attempts=3)
+
+        self.assertEqual((job.status, job.attempts, job.result, job.error), ("succeeded", 3, {"calls": 3}, ""))
+        self.assertGreaterEqual(delays[0], datetime.timedelta(seconds=10))
+        self.assertGreaterEqual(delays[1], datetime.timedelta(seconds=20))
+        self.assertEqual([get_backoff(attempts) for attempts in (1, 2, 3)], [10.0, 20.0, 25.0])
+
+    def test_job_fails_after_its_last_attempt(self):
+        job, _ = self.run_flaky_job(failures=5, max_attempts=2)
+
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+        self.assertIn("Upstream unavailable", job.error)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_stale_jobs_are_requeued(self):
+        job = enqueue("rebuild_balances", max_attempts=2)
+        claim_jobs("worker-1", 1)
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - datetime.timedelta(hours=2))
+
+        self.assertEqual(requeue_stale_jobs(3600), 1)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, "queued")
+
+        claim_jobs("worker-2", 1)
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - datetime.timedelta(hours=2))
+        requeue_stale_jobs(3600)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, "failed")
+
+    def test_heartbeats_keep_long_jobs_running(self):
+        job = enqueue("rebuild_balances")
+        claimed = claim_jobs("worker-1", 1)
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - datetime.timedelta(hours=2),
+                                             heartbeat_at=timezone.now() - datetime.timedelta(hours=2))
+
+        self.assertEqual(send_heartbeats(claimed), 1)
+        self.assertEqual(requeue_stale_jobs(3600), 0)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, "running")
+
+    def test_requeued_job_result_is_dropped(self):
+        job = enqueue("rebuild_balances")
+        lost = claim_jobs("worker-1", 1)[0]
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - datetime.timedelta(hours=2))
+        requeue_stale_jobs(3600)
+        claim_jobs("worker-2", 1)
+
+        with self.assertLogs("core.jobs.queue", "WARNING"):
+            run_job(lost)
+
+        job = Job.objects.get(pk=job.pk)
+        self.assertEqual((job.status, job.worker, job.attempts, job.result), ("running", "worker-2", 2, None))
+        self.assertEqual(send_heartbeats([lost]), 0)
+
+    def test_unknown_task_fails(self):
+        with self.assertRaises(ValueError):
+            enqueue("drop_database")
+
+    def test_export_movements(self):
+        with tempfile.TemporaryDirectory() as export_dir, self.settings(JOBS={"EXPORT_DIR": export_dir}):
+            paths = []
+            for _ in range(2):
+                enqueue("export_movements", {"account": self.account.id, "output": "ndjson"})
+                job = run_job(claim_jobs("worker-1", 1)[0])
+                self.assertEqual(job.status, "succeeded")
+                paths.append(job.result["path"])
+
+            self.assertNotEqual(paths[0], paths[1])
+            for path in paths:
+                with open(path) as file:
+                    self.assertEqual(len(file.readlines()), 1)
+                self.assertEqual(os.path.dirname(path), export_dir)
+
+    @override_settings()
+    def test_export_movements_without_jobs_setting(self):
+        del settings.JOBS
+        path = TASKS["export_movements"](client=self.account.client_id)["path"]
+        os.remove(path)
+
+        self.assertEqual(os.path.dirname(path), tempfile.gettempdir())
+
+    def test_export_leaves_out_soft_deleted_clients(self):
+        Client.objects.get(pk=self.account.client_id).soft_delete()
+
+        with tempfile.TemporaryDirectory() as export_dir, self.settings(JOBS={"EXPORT_DIR": export_dir}):
+            with open(TASKS["export_movements"](client=self.account.client_id)["path"]) as file:
+                self.assertEqual(file.readlines(), ["id,account,movement_type,amount,date\n"])
+
+    def test_client_delete_queues_its_purge(self):
+        response = self.client.delete(reverse("clients_detail", args=[self.account.client_id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        job = Job.objects.get(task="purge_client")
+        self.assertEqual(job.arguments, {"client_id": self.account.client_id})
+        self.assertEqual(run_job(claim_jobs("worker-1", 1)[0]).status, "succeeded")
+        self.assertFalse(Client.all_objects.filter(pk=self.account.client_id).exists())
+
+
+class JobEndpointsTestCase(TestCase):
+    def test_queue_and_read_a_job(self):
+        response = self.client.post(reverse("jobs"), data={"task": "rebuild_category_balances",
+                                                           "arguments": {"verify": True}},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["status"], "queued")
+
+        response = self.client.get(reverse("jobs_detail", args=[response.json()["id"]]))
+        self.assertEqual(response.json()["task"], "rebuild_category_balances")
+        self.assertEqual(len(self.client.get(reverse("jobs") + "?status=queued").json()), 1)
+        self.assertEqual(self.client.get(reverse("jobs") + "?status=failed").json(), [])
+
+    def test_invalid_jobs_are_rejected(self):
+        for data in ({"task": "drop_database"}, {"task": "rebuild_balances", "arguments": {"table": "core_client"}},
+                     {"task": "rebuild_balances", "max_attempts": 0}):
+            with self.subTest(data=data):
+                response = self.client.post(reverse("jobs"), data=data, content_type="application/json")
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Job.objects.exists())
+
+    def test_only_queued_jobs_can_be_cancelled(self):
+        job = enqueue("rebuild_balances")
+
+        self.assertEqual(self.client.delete(reverse("jobs_detail", args=[job.id])).status_code,
+                         status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, "cancelled")
+        self.assertEqual(self.client.delete(reverse("jobs_detail", args=[job.id])).status_code,
+                         status.HTTP_409_CONFLICT)
+
+
+class WorkerTestCase(TransactionTestCase):
+    def test_worker_runs_the_due_jobs_in_threads(self):
+        clients = [ClientFactory(name=f"Cliente {number}") for number in range(3)]
+        for client in clients:
+            client.save()
+            AccountFactory(client=client).save()
+            client.soft_delete()
+            enqueue("purge_client", {"client_id": client.id, "sleep_ratio": 0})
+        enqueue("rebuild_balances", delay=60)
+
+        processed = Worker(concurrency=2, poll_interval=0.01).run(burst=True)
+
+        self.assertEqual(processed, 3)
+        self.assertEqual(Job.objects.filter(status="succeeded").count(), 3)
+        self.assertEqual(Job.objects.filter(status="queued").count(), 1)
+        self.assertFalse(Client.all_objects.exists())
+
+    def test_run_jobs_command(self):
+        enqueue("rebuild_category_balances")
+
+        out = StringIO()
+        call_command("run_jobs", "--burst", "--concurrency", "2", stdout=out)
+
+        self.assertIn("Processed 1 jobs.", out.getvalue())
+        self.assertEqual(Job.objects.get().status, "succeeded")
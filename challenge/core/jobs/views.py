@@ -0,0 +1,54 @@
+from rest_framework import status
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.jobs.queue import enqueue
+from core.jobs.serializers import JobRequestSerializer
+from core.jobs.serializers import JobSerializer
+from core.models import Job
+
+
+class JobListCreate(APIView):
+    """
+    This view lists the latest background jobs and allows you to queue a new one:
+
+        {"task": "rebuild_balances", "arguments": {"accounts": [1, 2]}, "max_attempts": 3, "delay": 0}
+
+     * ?status=queued|running|succeeded|failed|cancelled filters the list.
+     * ?limit= sets the number of listed jobs, 100 by default.
+
+    """
+    def get(self, request):
+        jobs = Job.objects.order_by("-id")
+        if "status" in request.query_params:
+            jobs = jobs.filter(status=request.query_params["status"])
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 100)), 1000))
+        except ValueError:
+            limit = 100
+
+        return Response(JobSerializer(jobs[:limit], many=True).data)
+
+    def post(self, request):
+        serializer = JobRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        job = enqueue(**serializer.validated_data)
+        return Response(JobSerializer(job).data, status=status.HTTP_201_CREATED)
+
+
+class JobDetailCancel(APIView):
+    """
+    This view returns the status of a background job and allows you to cancel it while it is queued.
+    """
+    def get(self, request, pk):
+        return Response(JobSerializer(get_object_or_404(Job.objects.all(), pk=pk)).data)
+
+    def delete(self, request, pk):
+        job = get_object_or_404(Job.objects.all(), pk=pk)
+        if not Job.objects.filter(pk=pk, status="queued").update(status="cancelled"):
+            return Response({"non_field_errors": [f"Only queued jobs can be cancelled, this one is {job.status}."]},
+                            status=status.HTTP_409_CONFLICT)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from core.benchmarks import benchmark_database
+from core.benchmarks.suite import BENCHMARK_SIZES
+from core.benchmarks.suite import compare_reports
+from core.benchmarks.suite import run_benchmark_suite
+
+
+class Command(BaseCommand):
+    help = ("Runs the benchmark suite against synthetic datasets of several sizes, in a throwaway database, "
+            "and writes the results as JSON. With --baseline it fails when a benchmark got slower.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", action="append", dest="sizes", choices=list(BENCHMARK_SIZES),
+                            help="Dataset size to benchmark (can be repeated), small by default.")
+        parser.add_argument("--iterations", type=int, default=200, help="Calls timed per benchmark.")
+        parser.add_argument("--output", help="Writes the JSON report to this file instead of stdout.")
+        parser.add_argument("--baseline", help="JSON report of a previous run to compare against.")
+        parser.add_argument("--threshold", type=float, default=0.2,
+                            help="Accepted p50 slowdown against the baseline, 0.2 is 20%%.")
+        parser.add_argument("--keepdb", action="store_true", help="Keeps the benchmark database between runs.")
+
+    def handle(self, *args, **options):
+        sizes = {name: BENCHMARK_SIZES[name] for name in options["sizes"] or ["small"]}
+        with benchmark_database(keepdb=options["keepdb"]):
+            report = run_benchmark_suite(sizes, options["iterations"])
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline_file:
+                regressions = compare_reports(json.load(baseline_file), report, options["threshold"])
+            for size, benchmark, previous, current in regressions:
+                self.stderr.write(f"{size} {benchmark}: p50 {previous} ms -> {current} ms")
+            if regressions:
+                raise CommandError(f"{len(regressions)} benchmarks are slower than the baseline.")
@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks.async_io import run_async_benchmark
+
+
+class Command(BaseCommand):
+    help = ("Compares the sync and async currency views under concurrent load, through the in-process "
+            "test clients (no WSGI or ASGI server), against a local fake currency server.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=8, help="Worker threads of the sync run.")
+        parser.add_argument("--concurrency", type=int, default=500, help="Concurrent requests of the async run.")
+        parser.add_argument("--delay", type=float, default=0.05, help="Latency of the fake currency server.")
+        parser.add_argument("--ttl", type=int, default=0,
+                            help="Seconds the currency values are cached, 0 makes every request need them.")
+
+    def handle(self, *args, **options):
+        results = run_async_benchmark(options["requests"], options["workers"], options["concurrency"],
+                                      options["delay"], options["ttl"])
+
+        self.stdout.write(json.dumps(results, indent=2))
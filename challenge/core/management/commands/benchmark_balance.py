@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import benchmark_database
+from core.benchmarks.balance import run_balance_benchmark
+
+
+class Command(BaseCommand):
+    help = ("Times the account balance, aggregated from the movements with the previous and the current "
+            "core_movement indexes and read from the materialized balance, in a throwaway database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--movements", type=int, default=10000000)
+        parser.add_argument("--accounts", type=int, default=1000)
+        parser.add_argument("--samples", type=int, default=50, help="Number of accounts timed.")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            results = run_balance_benchmark(options["accounts"], options["movements"], options["samples"])
+
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,16 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks.json_render import run_json_benchmark
+
+
+class Command(BaseCommand):
+    help = "Compares the DRF JSON renderer and parser with the orjson ones on a payload of serialized movements."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(run_json_benchmark(options["rows"], options["iterations"]), indent=2))
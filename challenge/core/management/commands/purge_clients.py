@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from core.client.utils import purge_client
+from core.models import Client
+from core.routers import use_primary
+
+
+class Command(BaseCommand):
+    help = ("Removes the soft deleted clients with their accounts, movements and category assignments, "
+            "in small throttled batches so the foreground writes keep their latency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Number of rows deleted by each transaction.")
+        parser.add_argument("--sleep-ratio", type=float, default=1.0,
+                            help="Pause after every batch, as a multiple of the time the batch took.")
+        parser.add_argument("--limit", type=int, default=None,
+                            help="Maximum number of clients purged by this run.")
+
+    def handle(self, *args, **options):
+        with use_primary():
+            client_ids = Client.all_objects.filter(state=False).order_by("delete_date", "id").values_list(
+                "id", flat=True
+            )
+            if options["limit"] is not None:
+                client_ids = client_ids[:options["limit"]]
+
+            purged = 0
+            for client_id in list(client_ids):
+                deleted = purge_client(client_id, options["batch_size"], options["sleep_ratio"])
+                if deleted is None:
+                    continue
+                purged += 1
+                self.stdout.write(f"Client {client_id}: " + ", ".join(
+                    f"{count} {label}" for label, count in sorted(deleted.items())
+                ))
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} clients."))
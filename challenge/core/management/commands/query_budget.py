@@ -0,0 +1,40 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.test import Client
+
+from core.benchmarks import benchmark_database
+from core.benchmarks.query_budget import DATASET_SIZES
+from core.benchmarks.query_budget import run_query_budget
+
+
+class Command(BaseCommand):
+    help = ("Requests every route against seeded datasets of several sizes, in a throwaway database, "
+            "and reports its query count, SQL time and the EXPLAIN plans of the hot queries.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", action="append", dest="sizes", choices=list(DATASET_SIZES),
+                            help="Dataset size to profile (can be repeated), all of them by default.")
+        parser.add_argument("--output", help="Writes the JSON report to this file instead of stdout.")
+        parser.add_argument("--plans", action="store_true", help="Includes the SQL and the EXPLAIN plans.")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            results = run_query_budget(Client(), options["sizes"] or list(DATASET_SIZES))
+
+        if not options["plans"]:
+            for result in results:
+                del result["sql"], result["plans"]
+
+        report = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
+
+        failures = [f"{result['size']} {result['route']}" for result in results
+                    if result["queries"] > result["budget"] or result["sequential_scans"]]
+        if failures:
+            raise CommandError(f"Query budget exceeded or sequential scan on core_movement: {', '.join(failures)}")
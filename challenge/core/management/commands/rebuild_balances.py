@@ -0,0 +1,103 @@
+import math
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from core.client.utils import compute_account_balances
+from core.client.utils import compute_daily_balances
+from core.models import Account
+from core.models import AccountDailyBalance
+from core.models import Client
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the materialized Account.balance and the AccountDailyBalance rollups from the raw Movement rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--account", type=int, action="append", dest="accounts",
+                            help="Only process this account id (can be repeated).")
+        parser.add_argument("--verify", action="store_true",
+                            help="Only report the accounts whose balance is out of sync, without fixing them.")
+        parser.add_argument("--tolerance", type=float, default=1e-6,
+                            help="Maximum absolute difference accepted between both balances.")
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="Number of accounts recomputed per query and transaction.")
+
+    def handle(self, *args, **options):
+        accounts = Account.objects.order_by("id")
+        if options["accounts"]:
+            accounts = accounts.filter(id__in=options["accounts"])
+
+        checked = 0
+        mismatches = 0
+        batch = []
+        for account_id in accounts.values_list("id", flat=True).iterator(chunk_size=options["batch_size"]):
+            batch.append(account_id)
+            if len(batch) == options["batch_size"]:
+                checked, mismatches = self.process_batch(batch, checked, mismatches, options)
+                batch = []
+        if batch:
+            checked, mismatches = self.process_batch(batch, checked, mismatches, options)
+
+        if options["verify"] and mismatches:
+            raise CommandError(f"{mismatches} of {checked} account balances are out of sync.")
+
+        action = "found" if options["verify"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} accounts, {action} {mismatches} mismatches."))
+
+    def process_batch(self, account_ids, checked, mismatches, options):
+        # The account rows are locked while their balances are recomputed, so movements
+        # written concurrently for these accounts wait instead of being lost.
+        with transaction.atomic():
+            stored = dict(Account.objects.select_for_update().filter(pk__in=account_ids
+                                                                     ).order_by("id").values_list("id", "balance"))
+            computed = compute_account_balances(account_ids)
+
+            out_of_sync = []
+            for account_id, balance in stored.items():
+                checked += 1
+                if math.isclose(balance, computed[account_id], abs_tol=options["tolerance"]):
+                    continue
+
+                mismatches += 1
+                self.stdout.write(f"Account {account_id}: stored balance {balance}, "
+                                  f"movements balance {computed[account_id]}")
+                out_of_sync.append(Account(id=account_id, balance=computed[account_id]))
+
+            if out_of_sync and not options["verify"]:
+                Account.objects.bulk_update(out_of_sync, ["balance"])
+
+            out_of_sync_days = self.process_daily_balances(account_ids, options)
+            mismatches += len(out_of_sync_days)
+
+            # bulk_update() skips Account.save(), the cached responses of the clients are expired here.
+            fixed = {account.id for account in out_of_sync} | set(out_of_sync_days)
+            if fixed and not options["verify"]:
+                Client.objects.filter(account__id__in=fixed).bump_version()
+
+        return checked, mismatches
+
+    def process_daily_balances(self, account_ids, options):
+        stored = {(account_id, day): (cash_in, cash_out) for account_id, day, cash_in, cash_out
+                  in AccountDailyBalance.objects.filter(account_id__in=account_ids
+                                                        ).values_list("account_id", "day", "cash_in", "cash_out")}
+        computed = compute_daily_balances(account_ids)
+
+        out_of_sync = sorted({
+            account_id for account_id, day in stored.keys() | computed.keys()
+            if not all(math.isclose(stored_total, computed_total, abs_tol=options["tolerance"])
+                       for stored_total, computed_total in zip(stored.get((account_id, day), (0.0, 0.0)),
+                                                               computed.get((account_id, day), (0.0, 0.0))))
+        })
+        for account_id in out_of_sync:
+            self.stdout.write(f"Account {account_id}: daily balances out of sync with its movements")
+
+        if out_of_sync and not options["verify"]:
+            AccountDailyBalance.objects.filter(account_id__in=out_of_sync).delete()
+            AccountDailyBalance.objects.bulk_create([
+                AccountDailyBalance(account_id=account_id, day=day, cash_in=cash_in, cash_out=cash_out)
+                for (account_id, day), (cash_in, cash_out) in computed.items() if account_id in out_of_sync
+            ])
+
+        return out_of_sync
@@ -0,0 +1,59 @@
+import math
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connections
+from django.db import router
+from django.db import transaction
+
+from core.client.utils import compute_category_balances
+from core.client.utils import get_category_balances
+from core.models import CategoryBalance
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the CategoryBalance rollups from the Account balances and the category assignments. "
+            "Run rebuild_balances first if the Account balances themselves may be out of sync.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--category", type=int, action="append", dest="categories",
+                            help="Only process this category id (can be repeated).")
+        parser.add_argument("--verify", action="store_true",
+                            help="Only report the categories whose rollups are out of sync, without fixing them.")
+        parser.add_argument("--tolerance", type=float, default=1e-6,
+                            help="Maximum absolute difference accepted between both total balances.")
+
+    def handle(self, *args, **options):
+        connection = connections[router.db_for_write(CategoryBalance)]
+        with transaction.atomic(using=connection.alias):
+            if connection.vendor == "postgresql" and not options["verify"]:
+                # Writes to the rollups wait for the rebuild, so the balance changes committed
+                # after the accounts are read are applied on top of the rebuilt rows.
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LOCK TABLE {connection.ops.quote_name(CategoryBalance._meta.db_table)} "
+                                   f"IN SHARE ROW EXCLUSIVE MODE")
+
+            stored = get_category_balances(options["categories"])
+            computed = compute_category_balances(options["categories"])
+
+            out_of_sync = []
+            for category_id in sorted(stored.keys() | computed.keys()):
+                stored_accounts, stored_balance = stored.get(category_id, (0, 0.0))
+                accounts, balance = computed.get(category_id, (0, 0.0))
+                if stored_accounts == accounts and math.isclose(stored_balance, balance,
+                                                                abs_tol=options["tolerance"]):
+                    continue
+
+                self.stdout.write(f"Category {category_id}: stored {stored_accounts} accounts with balance "
+                                  f"{stored_balance}, computed {accounts} accounts with balance {balance}")
+                out_of_sync.append(category_id)
+
+            if out_of_sync and not options["verify"]:
+                CategoryBalance.objects.rebuild(out_of_sync)
+
+        checked = len(stored.keys() | computed.keys())
+        if options["verify"] and out_of_sync:
+            raise CommandError(f"{len(out_of_sync)} of {checked} category rollups are out of sync.")
+
+        action = "found" if options["verify"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} categories, {action} {len(out_of_sync)} mismatches."))
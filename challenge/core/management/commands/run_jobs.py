@@ -0,0 +1,29 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from core.jobs.queue import Worker
+
+
+class Command(BaseCommand):
+    help = ("Runs the background jobs of the database queue in a pool of threads. "
+            "SIGINT and SIGTERM stop the worker once its running jobs finish.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=None,
+                            help="Number of jobs run at the same time (default JOBS[\"CONCURRENCY\"]).")
+        parser.add_argument("--poll-interval", type=float, default=None,
+                            help="Seconds between polls of an empty queue (default JOBS[\"POLL_INTERVAL\"]).")
+        parser.add_argument("--burst", action="store_true",
+                            help="Exit once there are no due jobs left instead of waiting for new ones.")
+
+    def handle(self, *args, **options):
+        worker = Worker(concurrency=options["concurrency"], poll_interval=options["poll_interval"])
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: worker.stop())
+
+        self.stdout.write(f"Worker {worker.name} running {worker.concurrency} jobs at a time.")
+        processed = worker.run(burst=options["burst"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs."))
@@ -0,0 +1,185 @@
+import bisect
+import math
+import threading
+import weakref
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class Metric:
+    """
+    Base of the metrics of the registry, kept in one shard per thread.
+
+    Every thread only writes to its own shard, a {label values: value} dict, so updates take no
+    lock, the GIL keeps each dict consistent. The lock is only taken by the first update of a
+    thread, to register its shard, by collect(), which merges the shards, and when a thread ends,
+    to fold its shard into the values of the finished threads. So servers that start a thread per
+    request keep one shard per live thread.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.local = threading.local()
+        self.shards = {}
+        self.finished = {}
+        self.shards_lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def get_shard(self):
+        try:
+            return self.local.owner.shard
+        except AttributeError:
+            owner = self.local.owner = ShardOwner()
+            with self.shards_lock:
+                self.shards[id(owner.shard)] = owner.shard
+            # The thread-local owner is released when its thread ends.
+            weakref.finalize(owner, self.fold, owner.shard)
+            return owner.shard
+
+    def fold(self, shard):
+        with self.shards_lock:
+            for key, value in shard.items():
+                finished = self.finished.get(key)
+                self.finished[key] = self.copy(value) if finished is None else self.merge(finished, value)
+            del self.shards[id(shard)]
+
+    def get_key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def get_values(self):
+        """
+        Returns {label values: value} merged from the shards of every thread.
+        """
+        with self.shards_lock:
+            shards = list(self.shards.values())
+            values = {key: self.copy(value) for key, value in self.finished.items()}
+
+        for shard in shards:
+            # list() copies the items while holding the GIL, the owner thread may be writing.
+            for key, value in list(shard.items()):
+                values[key] = self.merge(values[key], value) if key in values else self.copy(value)
+        return values
+
+    def format_labels(self, key, **extra):
+        labels = [*zip(self.labelnames, key), *extra.items()]
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        for key, value in sorted(self.get_values().items()):
+            yield from self.format_samples(key, value)
+
+
+class ShardOwner:
+    """
+    Holds the shard of a thread, its finalizer folds the shard once the thread ends.
+    """
+    def __init__(self):
+        self.shard = {}
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        shard = self.get_shard()
+        key = self.get_key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def copy(self, value):
+        return value
+
+    def merge(self, total, value):
+        return total + value
+
+    def format_samples(self, key, value):
+        yield f"{self.name}_total{self.format_labels(key)} {format_value(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super(Histogram, self).__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        shard = self.get_shard()
+        key = self.get_key(labels)
+        # [count per bucket..., count over the last bucket, sum]
+        counts = shard.get(key)
+        if counts is None:
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def copy(self, value):
+        return list(value)
+
+    def merge(self, total, value):
+        return [a + b for a, b in zip(total, value)]
+
+    def format_samples(self, key, value):
+        cumulative = 0
+        for bound, count in zip([*self.buckets, math.inf], value):
+            cumulative += count
+            yield f"{self.name}_bucket{self.format_labels(key, le=format_value(bound))} {cumulative}"
+        yield f"{self.name}_sum{self.format_labels(key)} {format_value(value[-1])}"
+        yield f"{self.name}_count{self.format_labels(key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        return "".join(f"{line}\n" for metric in self.metrics for line in metric.collect())
+
+
+def escape_label(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value)
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = Histogram("http_request_duration_seconds",
+                             "Latency of the HTTP requests by named route and method.", ["route", "method"])
+
+REQUESTS = Counter("http_requests", "HTTP requests by named route, method and status code.",
+                   ["route", "method", "status"])
+
+REQUEST_QUERIES = Histogram("http_request_db_queries", "Database queries run by each HTTP request.",
+                            ["route", "method"], buckets=QUERY_COUNT_BUCKETS)
+
+CURRENCY_API_DURATION = Histogram("currency_api_request_duration_seconds",
+                                  "Latency of the calls to the upstream currency API.")
+
+CURRENCY_API_ERRORS = Counter("currency_api_errors", "Failed calls to the upstream currency API.")
+
+MOVEMENTS_CREATED = Counter("movements_created", "Created movements by movement type.", ["movement_type"])
+
+MOVEMENTS_REJECTED = Counter("movements_rejected", "Rejected movements by reason.", ["reason"])
@@ -0,0 +1,124 @@
+import threading
+
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from core.factories import AccountFactory
+from core.factories import ClientFactory
+from core.metrics.collectors import Counter
+from core.metrics.collectors import Histogram
+from core.metrics.collectors import Registry
+
+
+def get_sample(text, sample):
+    for line in text.splitlines():
+        if line.startswith(f"{sample} "):
+            return float(line.split(" ")[-1])
+    return 0.0
+
+
+class CollectorsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_renders_one_sample_per_label_set(self):
+        counter = Counter("jobs", "Processed jobs.", ["status"], registry=self.registry)
+        counter.inc(status="done")
+        counter.inc(2, status="done")
+        counter.inc(status='fail"ed')
+
+        self.assertEqual(self.registry.render(), "# HELP jobs Processed jobs.\n"
+                                                 "# TYPE jobs counter\n"
+                                                 "jobs_total{status=\"done\"} 3\n"
+                                                 "jobs_total{status=\"fail\\\"ed\"} 1\n")
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("latency", "Latency.", buckets=[0.1, 1], registry=self.registry)
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value)
+
+        self.assertEqual(self.registry.render().splitlines()[2:], ['latency_bucket{le="0.1"} 2',
+                                                                   'latency_bucket{le="1"} 3',
+                                                                   'latency_bucket{le="+Inf"} 4',
+                                                                   "latency_sum 3.65",
+                                                                   "latency_count 4"])
+
+    def test_labels_must_match_the_declared_ones(self):
+        counter = Counter("jobs", "Processed jobs.", ["status"], registry=self.registry)
+
+        with self.assertRaises(ValueError):
+            counter.inc(state="done")
+
+    def test_threads_update_their_own_shard(self):
+        counter = Counter("hits", "Hits.", registry=self.registry)
+        histogram = Histogram("sizes", "Sizes.", buckets=[1], registry=self.registry)
+
+        def work():
+            for _ in range(10000):
+                counter.inc()
+                histogram.observe(1)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(get_sample(self.registry.render(), "hits_total"), 80000)
+        self.assertEqual(get_sample(self.registry.render(), "sizes_count"), 80000)
+
+    def test_values_of_finished_threads_are_kept(self):
+        counter = Counter("hits", "Hits.", ["route"], registry=self.registry)
+        counter.inc(route="main")
+
+        for _ in range(50):
+            threads = [threading.Thread(target=counter.inc, kwargs={"route": "thread"}) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        text = self.registry.render()
+        self.assertEqual(get_sample(text, 'hits_total{route="main"}'), 1)
+        self.assertEqual(get_sample(text, 'hits_total{route="thread"}'), 500)
+
+
+@override_settings(CURRENCY_API={"PROVIDER": "core.external_apis.currency_api.FakeRateProvider"})
+class MetricsEndpointTestCase(TestCase):
+    def setUp(self):
+        client = ClientFactory()
+        client.save()
+        self.account = AccountFactory(client=client)
+        self.account.save()
+
+    def get_metrics(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        return response.content.decode()
+
+    def post_movement(self, movement_type, amount):
+        return self.client.post(reverse("movements"), data={"account": self.account.id,
+                                                            "movement_type": movement_type, "amount": amount})
+
+    def test_metrics_count_requests_and_movements(self):
+        samples = ['http_requests_total{route="movements",method="POST",status="201"}',
+                   'http_request_duration_seconds_count{route="movements",method="POST"}',
+                   'http_request_db_queries_count{route="movements",method="POST"}',
+                   'movements_created_total{movement_type="cash_inflow"}',
+                   'movements_rejected_total{reason="insufficient_balance"}',
+                   'movements_rejected_total{reason="invalid"}',
+                   "currency_api_request_duration_seconds_count"]
+        before = self.get_metrics()
+
+        self.post_movement("cash_inflow", 100)
+        self.post_movement("cash_outflow", 1000)
+        self.post_movement("cash_outflow", "many")
+        self.client.get(reverse("currencies"))
+
+        after = self.get_metrics()
+        self.assertEqual([get_sample(after, sample) - get_sample(before, sample) for sample in samples],
+                         [1, 3, 3, 1, 1, 1, 1])
@@ -0,0 +1,14 @@
+from django.http import HttpResponse
+from django.views import View
+
+from core.metrics.collectors import REGISTRY
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metrics(View):
+    """
+    This view returns the metrics of the worker process in the Prometheus text format.
+    """
+    def get(self, request):
+        return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,185 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from core.metrics.collectors import REQUESTS
+from core.metrics.collectors import REQUEST_DURATION
+from core.metrics.collectors import REQUEST_QUERIES
+from core.profiling import get_profiling_options
+from core.profiling import profile_request
+from core.routers import use_primary
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+logger = logging.getLogger("core.profiling")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Pins the reads of unsafe requests (POST, PUT, PATCH, DELETE) to the primary database, so
+    validations such as the balance check of a new movement never read a lagging replica.
+    Safe requests read from the replicas until they write something.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with use_primary(request.method not in SAFE_METHODS):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with use_primary(request.method not in SAFE_METHODS):
+            return await self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in (PROFILING["ENABLED"]) profile of every request: the number and time of its SQL
+    queries, the time spent calling external HTTP APIs and building serializer data. They are
+    sent back in a Server-Timing header and logged as a JSON line by the core.profiling logger.
+
+    A SAMPLE_RATE fraction of the sync requests also runs under cProfile, and the stats of the
+    ones slower than SLOW_REQUEST_MS are dumped to DUMP_DIR, to be read with pstats. Disabled,
+    the middleware is removed from the chain.
+    """
+    sync_capable = True
+    async_capable = True
+
+    # cProfile can't follow several profiled requests at the same time.
+    profiler_lock = threading.Lock()
+
+    def __init__(self, get_response):
+        self.options = get_profiling_options()
+        if not self.options["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        profiler = self.start_profiler()
+        start = time.perf_counter()
+        try:
+            with profile_request() as profile:
+                response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.profiler_lock.release()
+        return self.finish(request, response, profile, time.perf_counter() - start, profiler)
+
+    async def __acall__(self, request):
+        # cProfile only follows the thread that enabled it, so async requests are never sampled.
+        start = time.perf_counter()
+        with profile_request() as profile:
+            response = await self.get_response(request)
+        return self.finish(request, response, profile, time.perf_counter() - start)
+
+    def start_profiler(self):
+        if not self.options["DUMP_DIR"] or random.random() >= self.options["SAMPLE_RATE"]:
+            return None
+        if not self.profiler_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def finish(self, request, response, profile, duration, profiler=None):
+        total_ms = round(duration * 1000, 3)
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={profile.duration_ms("db")};desc="{profile.count("db")} queries"',
+            f'http;dur={profile.duration_ms("http")};desc="{profile.count("http")} calls"',
+            f'serializer;dur={profile.duration_ms("serializer")}',
+            f"total;dur={total_ms}",
+        ])
+
+        route = request.resolver_match.view_name if request.resolver_match else None
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "route": route,
+            "status": response.status_code,
+            "total_ms": total_ms,
+            "db_queries": profile.count("db"),
+            "db_ms": profile.duration_ms("db"),
+            "http_calls": profile.count("http"),
+            "http_ms": profile.duration_ms("http"),
+            "serializer_ms": profile.duration_ms("serializer"),
+            "profile": None,
+        }
+        if profiler is not None and total_ms >= self.options["SLOW_REQUEST_MS"]:
+            record["profile"] = self.dump_profile(profiler, request, route, total_ms)
+
+        logger.info(json.dumps(record), extra={"profile": record})
+        return response
+
+    def dump_profile(self, profiler, request, route, total_ms):
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{request.method}-{route or 'unresolved'}-{round(total_ms)}ms"
+        path = os.path.join(self.options["DUMP_DIR"], f"{name}-{uuid.uuid4().hex[:8]}.prof")
+        os.makedirs(self.options["DUMP_DIR"], exist_ok=True)
+        profiler.dump_stats(path)
+        return path
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status code and number of database queries of every request, by named
+    route, in the metrics served by the metrics/ endpoint. Requests that match no route are
+    recorded as "unresolved", so arbitrary paths don't create new series. Set METRICS_ENABLED
+    to False to leave it out of the chain.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+        with profile_request() as profile:
+            response = self.get_response(request)
+        self.record(request, response, profile, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with profile_request() as profile:
+            response = await self.get_response(request)
+        self.record(request, response, profile, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, profile, duration):
+        route = request.resolver_match.view_name if request.resolver_match else "unresolved"
+        REQUEST_DURATION.observe(duration, route=route, method=request.method)
+        REQUEST_QUERIES.observe(profile.count("db"), route=route, method=request.method)
+        REQUESTS.inc(route=route, method=request.method, status=response.status_code)
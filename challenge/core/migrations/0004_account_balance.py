@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:07
+
+from django.db import migrations, models
+from django.db.models import FloatField
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+
+def movements_total(Movement, movement_type):
+    total = Movement.objects.filter(account=OuterRef("pk"),
+                                    movement_type=movement_type
+                                    ).values("account").annotate(total=Sum("amount")).values("total")
+    return Coalesce(Subquery(total), Value(0.0), output_field=FloatField())
+
+
+def populate_account_balance(apps, schema_editor):
+    Account = apps.get_model("core", "Account")
+    Movement = apps.get_model("core", "Movement")
+
+    Account.objects.update(
+        balance=movements_total(Movement, "cash_inflow") - movements_total(Movement, "cash_outflow")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_remove_account_balance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='balance',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(populate_account_balance, migrations.RunPython.noop),
+    ]
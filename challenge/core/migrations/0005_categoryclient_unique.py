@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:15
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicated_categories(apps, schema_editor):
+    CategoryClient = apps.get_model("core", "CategoryClient")
+
+    first_assignments = CategoryClient.objects.values("client", "category").annotate(first_id=Min("id")).values("first_id")
+    CategoryClient.objects.exclude(id__in=first_assignments).delete()
+
+
+class Migration(migrations.Migration):
+    # The duplicated assignments are only deleted together with the constraint that keeps them
+    # from coming back, both in the same transaction.
+
+    dependencies = [
+        ('core', '0004_account_balance'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicated_categories, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='categoryclient',
+            constraint=models.UniqueConstraint(fields=('client', 'category'), name='unique_client_category'),
+        ),
+    ]
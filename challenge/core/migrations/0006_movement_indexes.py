@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:15
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The movement indexes are built with CREATE INDEX CONCURRENTLY, so the table keeps accepting
+    # writes while they are created, which can't be done inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_categoryclient_unique'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='movement',
+            index=models.Index(fields=['account', 'movement_type'], include=('amount',), name='movement_account_type_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='movement',
+            index=models.Index(fields=['account', 'id'], name='movement_account_id_idx'),
+        ),
+    ]
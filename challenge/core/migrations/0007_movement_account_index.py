@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # The single column index of the account foreign key is only dropped once the composite
+    # indexes of 0006_movement_indexes, which start with the account, can serve its lookups.
+
+    dependencies = [
+        ('core', '0006_movement_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movement',
+            name='account',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.account'),
+        ),
+    ]
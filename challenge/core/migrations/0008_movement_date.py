@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:21
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Q
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+import django.utils.timezone
+
+# The movements had no date before this migration and nothing else records when they were made,
+# so they are all stamped with this sentinel instead of the time the migration runs. They come
+# before any real movement: balances as of a date after the migration are right, older dates and
+# the periods that include the sentinel day mix the undated history together.
+UNDATED_MOVEMENT_DATE = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def populate_daily_balances(apps, schema_editor):
+    AccountDailyBalance = apps.get_model("core", "AccountDailyBalance")
+    Movement = apps.get_model("core", "Movement")
+
+    daily_totals = Movement.objects.annotate(day=TruncDate("date")).values("account_id", "day").annotate(
+        cash_in=Coalesce(Sum("amount", filter=Q(movement_type="cash_inflow")), Value(0.0)),
+        cash_out=Coalesce(Sum("amount", filter=Q(movement_type="cash_outflow")), Value(0.0))
+    ).order_by()
+
+    batch = []
+    for totals in daily_totals.iterator(chunk_size=5000):
+        batch.append(AccountDailyBalance(**totals))
+        if len(batch) == 5000:
+            AccountDailyBalance.objects.bulk_create(batch)
+            batch = []
+    AccountDailyBalance.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    # The date index is built concurrently by 0009_movement_date_index, outside this transaction.
+
+    dependencies = [
+        ('core', '0007_movement_account_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDailyBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('cash_in', models.FloatField(default=0.0)),
+                ('cash_out', models.FloatField(default=0.0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='movement',
+            name='date',
+            field=models.DateTimeField(default=UNDATED_MOVEMENT_DATE, verbose_name='Movement Date'),
+        ),
+        migrations.AlterField(
+            model_name='movement',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Movement Date'),
+        ),
+        migrations.AddField(
+            model_name='accountdailybalance',
+            name='account',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='core.account'),
+        ),
+        migrations.AddConstraint(
+            model_name='accountdailybalance',
+            constraint=models.UniqueConstraint(fields=('account', 'day'), name='unique_account_day'),
+        ),
+        migrations.RunPython(populate_daily_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:21
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The movement index is built with CREATE INDEX CONCURRENTLY, see 0006_movement_indexes.
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_movement_date'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='movement',
+            index=models.Index(fields=['account', 'date', 'id'], name='movement_account_date_idx'),
+        ),
+    ]
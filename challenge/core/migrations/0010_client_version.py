@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_movement_date_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='client',
+            options={'verbose_name': 'Client'},
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='date_joined',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Create Date'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='delete_date',
+            field=models.DateTimeField(blank=True, default=None, null=True, verbose_name='Delete Date'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='last_update',
+            field=models.DateTimeField(auto_now=True, verbose_name='Modification Date'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='state',
+            field=models.BooleanField(default=True, verbose_name='State'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='Version'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_client_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('accounts', models.IntegerField(default=0)),
+                ('total_balance', models.FloatField(default=0.0)),
+                ('category', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='balance_shards', to='core.category')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='categorybalance',
+            constraint=models.UniqueConstraint(fields=('category', 'shard'), name='unique_category_shard'),
+        ),
+    ]
@@ -1,6 +1,13 @@
+from django.conf import settings
+from django.db import connections
 from django.db import models
+from django.db import router
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Q
+from django.utils import timezone
 
-from core.external_apis.currency_api import get_currencies_values
+from core.external_apis.currency_api import get_exchange_rate
 
 
 class BaseModel(models.Model):
@@ -14,24 +21,137 @@ class BaseModel(models.Model):
         verbose_name = 'Base Model'
 
 
-class Client(models.Model):
+class ClientQuerySet(models.QuerySet):
+    def bump_version(self):
+        """
+        Increments the version of the selected clients, which changes the ETag and the cache key
+        of their detail and accounts responses.
+        """
+        return self.update(version=F("version") + 1, last_update=timezone.now())
+
+
+class ClientManager(models.Manager.from_queryset(ClientQuerySet)):
+    """
+    Hides the soft deleted clients, Client.all_objects also returns them.
+    """
+    def get_queryset(self):
+        return super(ClientManager, self).get_queryset().filter(state=True)
+
+
+class Client(BaseModel):
     name = models.TextField(blank=False, null=False, default="N/D")
+    version = models.PositiveIntegerField('Version', default=1)
+
+    objects = ClientManager()
+    all_objects = ClientQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Client'
+
+    def save(self, *args, **kwargs):
+        updating = not self._state.adding
+        if updating:
+            self.version = F("version") + 1
+        super(Client, self).save(*args, **kwargs)
+        if updating:
+            self.refresh_from_db(fields=["version"])
+
+    def delete(self, *args, **kwargs):
+        # The accounts and category assignments are deleted in cascade, without their delete().
+        with transaction.atomic(savepoint=False):
+            CategoryBalance.objects.add_accounts(-1, client=self.pk)
+            return super(Client, self).delete(*args, **kwargs)
+
+    def soft_delete(self):
+        """
+        Hides the client, its accounts and movements from every endpoint with a single row update.
+        The rows are removed later, in small batches, by the purge_clients command.
+        """
+        with transaction.atomic(savepoint=False):
+            # The rollups are subtracted from the balances, so the writes that could still add to
+            # them are waited for first. The locks are taken in the order of the movement writes,
+            # accounts and then client, and the client lock also blocks new accounts and assignments.
+            locked = list(Account.objects.select_for_update().filter(client_id=self.pk).order_by("id").values_list(
+                "id", flat=True
+            ))
+            list(Client.objects.select_for_update().filter(pk=self.pk).values_list("id", flat=True))
+            # Accounts created while the client lock was awaited.
+            list(Account.objects.select_for_update().filter(client_id=self.pk).exclude(id__in=locked).values_list(
+                "id", flat=True
+            ))
+            CategoryBalance.objects.add_accounts(-1, client=self.pk)
+            now = timezone.now()
+            Client.objects.filter(pk=self.pk).update(state=False, delete_date=now, version=F("version") + 1,
+                                                     last_update=now)
+            self.state = False
+            self.delete_date = now
 
 
 class Category(models.Model):
     name = models.TextField(blank=False, null=False, default="N/D")
 
+    def save(self, *args, **kwargs):
+        # The clients responses show the name of their categories.
+        with transaction.atomic(savepoint=False):
+            updating = not self._state.adding
+            super(Category, self).save(*args, **kwargs)
+            if updating:
+                Client.objects.filter(categoryclient__category=self.pk).bump_version()
+
+    def delete(self, *args, **kwargs):
+        # The assignments are deleted in cascade, so their clients are looked up first.
+        with transaction.atomic(savepoint=False):
+            Client.objects.filter(categoryclient__category=self.pk).bump_version()
+            return super(Category, self).delete(*args, **kwargs)
+
+
+class AccountQuerySet(models.QuerySet):
+    def alive(self):
+        """
+        Leaves out the accounts of soft deleted clients.
+        """
+        return self.filter(client__state=True)
+
 
 class Account(models.Model):
     client = models.ForeignKey(Client, on_delete=models.CASCADE)
+    balance = models.FloatField(default=0.0)
+
+    objects = AccountQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        # The CategoryBalance rollups count the account, and its balance, in the categories of its client.
+        with transaction.atomic(savepoint=False):
+            updating = not self._state.adding
+            if updating:
+                CategoryBalance.objects.add_accounts(-1, account=self.pk)
+                # The balance is maintained by the movement writes, the one loaded with the instance
+                # may be stale and is only written when asked for.
+                if kwargs.get("update_fields") is None:
+                    kwargs["update_fields"] = [field.name for field in self._meta.concrete_fields
+                                               if not field.primary_key and field.name != "balance"]
+            super(Account, self).save(*args, **kwargs)
+            if updating and "balance" not in kwargs["update_fields"]:
+                self.refresh_from_db(fields=["balance"])
+            CategoryBalance.objects.add_accounts(1, account=self.pk)
+            Client.objects.filter(pk=self.client_id).bump_version()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            Client.objects.filter(pk=self.client_id).bump_version()
+            CategoryBalance.objects.add_accounts(-1, account=self.pk)
+            return super(Account, self).delete(*args, **kwargs)
 
     def get_total_usd(self):
-        dollar_value = get_currencies_values("Dolar Bolsa")["casa"]["compra"].replace(",", ".")
+        return "{:.2f}".format(self.balance / get_exchange_rate("usd"))
 
-        if dollar_value:
-            return "{:.2f}".format(self.balance / float(dollar_value))
-        else:
-            return 0
+
+class MovementQuerySet(models.QuerySet):
+    def alive(self):
+        """
+        Leaves out the movements of soft deleted clients.
+        """
+        return self.filter(account__client__state=True)
 
 
 class Movement(models.Model):
@@ -39,12 +159,286 @@ class Movement(models.Model):
         ('cash_outflow', 'Egreso'),
         ('cash_inflow', 'Ingreso')
     ]
-    account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, db_index=False)
     movement_type = models.CharField(max_length=20, choices=MOVEMENT_TYPE, blank=False,
                                      null=False, default='cash_inflow')
     amount = models.FloatField(null=False, blank=False, default=0.0)
+    # The movements created before the field existed are dated 1970-01-01 UTC, see 0008_movement_date.
+    date = models.DateTimeField('Movement Date', default=timezone.now)
+
+    objects = MovementQuerySet.as_manager()
+
+    class Meta:
+        # Every index starts with the account, so the foreign key does not need an index of its own.
+        # The amount is included in the (account, movement_type) index on PostgreSQL, so the balance
+        # aggregations are answered with index-only scans.
+        indexes = [
+            models.Index(fields=["account", "movement_type"], include=["amount"], name="movement_account_type_idx"),
+            models.Index(fields=["account", "id"], name="movement_account_id_idx"),
+            models.Index(fields=["account", "date", "id"], name="movement_account_date_idx"),
+        ]
+
+    def get_signed_amount(self):
+        if self.movement_type == "cash_outflow":
+            return -float(self.amount)
+        return float(self.amount)
+
+    def get_daily_totals(self, sign=1):
+        """
+        Returns the (account_id, day, cash_in, cash_out) the movement adds to its daily rollup,
+        or removes from it when sign is -1.
+        """
+        amount = sign * float(self.amount)
+        day = timezone.localdate(self.date)
+        if self.movement_type == "cash_outflow":
+            return self.account_id, day, 0.0, amount
+        return self.account_id, day, amount, 0.0
+
+    def save(self, *args, **kwargs):
+        # Account.balance and the AccountDailyBalance rollups are materialized sums of the
+        # account movements, they are kept up to date in the same transaction that writes the movement,
+        # which also bumps the version of the client.
+        with transaction.atomic(savepoint=False):
+            daily_totals = [self.get_daily_totals()]
+            account_ids = {self.account_id}
+            previous = None
+            if not self._state.adding:
+                previous = Movement.objects.filter(pk=self.pk).first()
+            if previous:
+                Account.objects.filter(pk=previous.account_id).update(
+                    balance=F("balance") - previous.get_signed_amount()
+                )
+                daily_totals.append(previous.get_daily_totals(sign=-1))
+                account_ids.add(previous.account_id)
+            super(Movement, self).save(*args, **kwargs)
+            Account.objects.filter(pk=self.account_id).update(balance=F("balance") + self.get_signed_amount())
+            AccountDailyBalance.objects.add_totals(daily_totals)
+            CategoryBalance.objects.add_balances([(account_id, cash_in - cash_out)
+                                                  for account_id, day, cash_in, cash_out in daily_totals])
+            Client.objects.filter(account__id__in=account_ids).bump_version()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            Account.objects.filter(pk=self.account_id).update(balance=F("balance") - self.get_signed_amount())
+            AccountDailyBalance.objects.add_totals([self.get_daily_totals(sign=-1)])
+            CategoryBalance.objects.add_balances([(self.account_id, -self.get_signed_amount())])
+            Client.objects.filter(account__id=self.account_id).bump_version()
+            return super(Movement, self).delete(*args, **kwargs)
+
+
+class AccountDailyBalanceManager(models.Manager):
+    def add_totals(self, daily_totals):
+        """
+        Adds (account_id, day, cash_in, cash_out) totals to the rollups with INSERT ... ON CONFLICT,
+        so the missing days are created and the existing ones incremented in a single statement.
+        """
+        merged_totals = {}
+        for account_id, day, cash_in, cash_out in daily_totals:
+            current_in, current_out = merged_totals.get((account_id, day), (0.0, 0.0))
+            merged_totals[(account_id, day)] = (current_in + cash_in, current_out + cash_out)
+        if not merged_totals:
+            return
+
+        connection = connections[router.db_for_write(self.model)]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        rows = list(merged_totals.items())
+        # 4 parameters per row, far below the parameter limit of the database drivers.
+        for start in range(0, len(rows), 5000):
+            batch = rows[start:start + 5000]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} (account_id, day, cash_in, cash_out) "
+                    f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(batch))} "
+                    f"ON CONFLICT (account_id, day) DO UPDATE SET "
+                    f"cash_in = {table}.cash_in + EXCLUDED.cash_in, "
+                    f"cash_out = {table}.cash_out + EXCLUDED.cash_out",
+                    [value for (account_id, day), totals in batch for value in (account_id, day, *totals)]
+                )
+
+
+class AccountDailyBalance(models.Model):
+    """
+    Daily rollup of the inflows and outflows of an account, maintained on every movement write.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, db_index=False)
+    day = models.DateField()
+    cash_in = models.FloatField(default=0.0)
+    cash_out = models.FloatField(default=0.0)
+
+    objects = AccountDailyBalanceManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account", "day"], name="unique_account_day"),
+        ]
 
 
 class CategoryClient(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     client = models.ForeignKey(Client, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["client", "category"], name="unique_client_category"),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            updating = not self._state.adding
+            if updating:
+                CategoryBalance.objects.add_accounts(-1, assignment=self.pk)
+            super(CategoryClient, self).save(*args, **kwargs)
+            CategoryBalance.objects.add_accounts(1, assignment=self.pk)
+            Client.objects.filter(pk=self.client_id).bump_version()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            Client.objects.filter(pk=self.client_id).bump_version()
+            CategoryBalance.objects.add_accounts(-1, assignment=self.pk)
+            return super(CategoryClient, self).delete(*args, **kwargs)
+
+
+class CategoryBalanceManager(models.Manager):
+    """
+    Keeps the CategoryBalance rollups up to date with INSERT ... SELECT ... ON CONFLICT statements,
+    which find the categories of the accounts through their client in the database, so a write
+    costs one statement whatever the number of categories. Soft deleted clients are left out.
+    The rows are locked in (category, shard) order, so concurrent writes never deadlock on them.
+    """
+    def get_tables(self):
+        connection = connections[router.db_for_write(self.model)]
+        return connection, {model.__name__: connection.ops.quote_name(model._meta.db_table)
+                            for model in (self.model, Account, CategoryClient, Client)}
+
+    def upsert(self, connection, table, select, params):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (category_id, shard, accounts, total_balance) {select} "
+                f"GROUP BY 1, 2 ORDER BY 1, 2 "
+                f"ON CONFLICT (category_id, shard) DO UPDATE SET "
+                f"accounts = {table}.accounts + EXCLUDED.accounts, "
+                f"total_balance = {table}.total_balance + EXCLUDED.total_balance",
+                params
+            )
+
+    def add_balances(self, balances):
+        """
+        Adds (account_id, balance change) pairs, the balance changes of written movements, to the
+        categories of the client of each account.
+        """
+        merged_balances = {}
+        for account_id, balance in balances:
+            merged_balances[account_id] = merged_balances.get(account_id, 0.0) + balance
+        if not merged_balances:
+            return
+
+        connection, tables = self.get_tables()
+        rows = list(merged_balances.items())
+        for start in range(0, len(rows), 5000):
+            batch = rows[start:start + 5000]
+            self.upsert(
+                connection, tables["CategoryBalance"],
+                f"SELECT cc.category_id, a.id %% %s, 0, SUM(v.balance) "
+                f"FROM (VALUES {', '.join(['(%s, %s)'] * len(batch))}) AS v (account_id, balance) "
+                f"JOIN {tables['Account']} a ON a.id = v.account_id "
+                f"JOIN {tables['Client']} c ON c.id = a.client_id AND c.state "
+                f"JOIN {tables['CategoryClient']} cc ON cc.client_id = a.client_id",
+                [settings.CATEGORY_BALANCE_SHARDS] + [value for row in batch for value in row]
+            )
+
+    def add_accounts(self, sign, account=None, client=None, assignment=None):
+        """
+        Adds (sign=1) or removes (sign=-1) the count and the balance of the accounts that match the
+        id of an account, a client or a CategoryClient assignment to the categories of their client,
+        as they are in the database. Removals run before the rows change and additions after.
+        """
+        column, value = next((column, value) for column, value in (("a.id", account), ("a.client_id", client),
+                                                                   ("cc.id", assignment)) if value is not None)
+        connection, tables = self.get_tables()
+        self.upsert(
+            connection, tables["CategoryBalance"],
+            f"SELECT cc.category_id, a.id %% %s, %s * COUNT(*), %s * SUM(a.balance) "
+            f"FROM {tables['Account']} a "
+            f"JOIN {tables['Client']} c ON c.id = a.client_id AND c.state "
+            f"JOIN {tables['CategoryClient']} cc ON cc.client_id = a.client_id "
+            f"WHERE {column} = %s",
+            [settings.CATEGORY_BALANCE_SHARDS, sign, sign, value]
+        )
+
+    def rebuild(self, category_ids):
+        """
+        Replaces the rollups of the categories with the ones computed from the Account rows.
+        """
+        self.filter(category_id__in=category_ids).delete()
+
+        connection, tables = self.get_tables()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {tables['CategoryBalance']} (category_id, shard, accounts, total_balance) "
+                f"SELECT cc.category_id, a.id %% %s, COUNT(*), SUM(a.balance) "
+                f"FROM {tables['Account']} a "
+                f"JOIN {tables['Client']} c ON c.id = a.client_id AND c.state "
+                f"JOIN {tables['CategoryClient']} cc ON cc.client_id = a.client_id "
+                f"WHERE cc.category_id IN ({', '.join(['%s'] * len(category_ids))}) "
+                f"GROUP BY 1, 2",
+                [settings.CATEGORY_BALANCE_SHARDS, *category_ids]
+            )
+
+
+class CategoryBalance(models.Model):
+    """
+    Rollup of the number and the total balance of the accounts of the clients assigned to a
+    category, maintained on every write of a movement, an account or an assignment.
+
+    Every category is split in CATEGORY_BALANCE_SHARDS rows by account id, so concurrent writes of
+    the accounts of a large category don't all wait for the same row. The report sums them.
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, db_index=False,
+                                 related_name="balance_shards")
+    shard = models.PositiveSmallIntegerField()
+    accounts = models.IntegerField(default=0)
+    total_balance = models.FloatField(default=0.0)
+
+    objects = CategoryBalanceManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["category", "shard"], name="unique_category_shard"),
+        ]
+
+
+class Job(models.Model):
+    """
+    Background job of the database queue, run by the run_jobs command.
+
+    `task` names a function of core.jobs.tasks.TASKS, called with the `arguments`. Failed jobs are
+    queued again at `run_at`, with an exponential backoff, until they run `max_attempts` times.
+    """
+    STATUS = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    task = models.CharField(max_length=100)
+    arguments = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField('Run Date', default=timezone.now)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    worker = models.CharField(max_length=100, blank=True, default="")
+    created_at = models.DateTimeField('Create Date', auto_now_add=True)
+    started_at = models.DateTimeField('Start Date', null=True, blank=True)
+    # Refreshed by the worker while the job runs, see core.jobs.queue.requeue_stale_jobs().
+    heartbeat_at = models.DateTimeField('Heartbeat Date', null=True, blank=True)
+    finished_at = models.DateTimeField('Finish Date', null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll the due jobs, the finished ones are left out of the index.
+            models.Index(fields=["run_at", "id"], condition=Q(status="queued"), name="job_queued_idx"),
+            models.Index(fields=["heartbeat_at"], condition=Q(status="running"), name="job_heartbeat_idx"),
+        ]
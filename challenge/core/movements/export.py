@@ -0,0 +1,46 @@
+import csv
+import io
+import json
+
+EXPORT_FIELDS = ["id", "account", "movement_type", "amount", "date"]
+
+
+def iter_movement_rows(queryset, chunk_size):
+    """
+    Yields lists of up to chunk_size movement tuples, reading them through a server-side cursor
+    so the memory used does not depend on the number of exported movements.
+    """
+    rows = queryset.order_by("id").values_list("id", "account_id", "movement_type", "amount", "date")
+
+    chunk = []
+    for movement_id, account_id, movement_type, amount, date in rows.iterator(chunk_size=chunk_size):
+        chunk.append((movement_id, account_id, movement_type, amount, date.isoformat()))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_csv(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(EXPORT_FIELDS)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(chunks):
+    for chunk in chunks:
+        yield "".join(json.dumps(dict(zip(EXPORT_FIELDS, row))) + "\n" for row in chunk)
+
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", export_csv),
+    "ndjson": ("application/x-ndjson", export_ndjson),
+}
@@ -1,33 +1,64 @@
 from rest_framework import serializers
 
 from core.client.serializers import AccountSerializer
-from core.client.utils import get_account_balance
+from core.metrics.collectors import MOVEMENTS_REJECTED
 from core.models import Account
 from core.models import Movement
+from core.movements.utils import INSUFFICIENT_BALANCE_MESSAGE
+from core.movements.utils import InsufficientBalance
+from core.movements.utils import create_movement
+from core.profiling import ProfiledSerializerMixin
 
 
-class MovementSerializer(serializers.ModelSerializer):
+class MovementSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
+    account = serializers.PrimaryKeyRelatedField(queryset=Account.objects.alive())
 
     class Meta:
         model = Movement
-        fields = ["id", "account", "movement_type", "amount"]
+        fields = ["id", "account", "movement_type", "amount", "date"]
 
     def validate(self, data):
-        balance = get_account_balance(data["account"])
+        # Early rejection without locking, the definitive check is done by create_movement.
+        balance = data["account"].balance
         if data["movement_type"] == "cash_outflow":
             if balance < float(data["amount"]):
+                MOVEMENTS_REJECTED.inc(reason="insufficient_balance")
                 raise serializers.ValidationError({
-                    "field_amount": "Your account balance is lower than the amount that you want to extract."
+                    "field_amount": INSUFFICIENT_BALANCE_MESSAGE
                 }
                 )
 
         return data
 
+    def create(self, validated_data):
+        try:
+            return create_movement(validated_data["account"].id,
+                                   validated_data["movement_type"],
+                                   validated_data["amount"],
+                                   validated_data.get("date"))
+        except InsufficientBalance:
+            raise serializers.ValidationError({
+                "field_amount": INSUFFICIENT_BALANCE_MESSAGE
+            }
+            )
+
     def to_representation(self, instance):
         rep = super(MovementSerializer, self).to_representation(instance)
 
         rep["movement_type"] = instance.get_movement_type_display()
-        rep["account"] = AccountSerializer(Account.objects.get(pk=rep["account"])).data
+        rep["account"] = AccountSerializer(instance.account).data
 
         return rep
+
+
+class MovementBulkItemSerializer(serializers.ModelSerializer):
+    """
+    Validates the fields of a bulk movement without fetching its account, the accounts and
+    balances of the whole batch are checked together by bulk_create_movements.
+    """
+    account = serializers.IntegerField()
+
+    class Meta:
+        model = Movement
+        fields = ["account", "movement_type", "amount", "date"]
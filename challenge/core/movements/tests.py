@@ -1,13 +1,26 @@
+import csv
+import gzip
+import io
 import json
-
+import sys
+import threading
+import time
+import unittest
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import Client
 from django.test import TestCase
+from django.test import TransactionTestCase
 from django.urls import reverse
 from rest_framework import status
 
+from core.client.utils import compute_account_balance
 from core.client.utils import get_account_balance
 from core.factories import AccountFactory
 from core.factories import ClientFactory
 from core.factories import MovementFactory
+from core.models import Movement
 
 
 class MovementCreateTestCase(TestCase):
@@ -101,6 +114,19 @@ class MovementDetailDeleteTestCase(TestCase):
         self.assertEqual(response_json["amount"], movement.amount)
         self.assertEqual(response_json["movement_type"], movement.get_movement_type_display())
 
+    async def test_async_movement_data_matches_sync_view(self):
+        movement = MovementFactory(account=self.account)
+        await sync_to_async(movement.save)()
+
+        response = await self.async_client.get(reverse("async_movements_detail", kwargs={'pk': movement.id}))
+        sync_response = await sync_to_async(self.client.get)(reverse("movements_detail", kwargs={'pk': movement.id}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), json.loads(sync_response.content))
+
+        response = await self.async_client.get(reverse("async_movements_detail", kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_get_movement_data_fails_movement_not_found(self):
 
         url = reverse("movements_detail", kwargs={'pk': 999})
@@ -134,3 +160,230 @@ class MovementDetailDeleteTestCase(TestCase):
         )
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@unittest.skipUnless(connection.features.has_select_for_update, "The database does not support row locking.")
+class ConcurrentMovementCreateTestCase(TransactionTestCase):
+    threads = 8
+    movements_per_thread = 5
+
+    def setUp(self):
+        client = ClientFactory()
+        client.save()
+        self.account = AccountFactory(client=client)
+        self.account.save()
+        self.other_account = AccountFactory(client=client)
+        self.other_account.save()
+
+        MovementFactory(account=self.account, movement_type="cash_inflow", amount=1000.0).save()
+
+        self.url = reverse("movements")
+        self.status_codes = []
+        self.status_codes_lock = threading.Lock()
+
+    def post_movements(self, data):
+        api_client = Client()
+        try:
+            for _ in range(self.movements_per_thread):
+                response = api_client.post(path=self.url, data=data, content_type="application/json")
+                with self.status_codes_lock:
+                    self.status_codes.append(response.status_code)
+        finally:
+            connection.close()
+
+    def run_threads(self, data_list):
+        threads = [threading.Thread(target=self.post_movements, args=(data,)) for data in data_list]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        sys.stderr.write(f"\n{self.id()}: {len(self.status_codes)} requests in {elapsed:.3f}s "
+                         f"({len(self.status_codes) / elapsed:.0f} req/s)\n")
+
+    def test_parallel_outflows_never_overdraw_the_account(self):
+        data = {"account": self.account.id, "movement_type": "cash_outflow", "amount": 50}
+
+        self.run_threads([data] * self.threads)
+
+        self.assertEqual(self.status_codes.count(status.HTTP_201_CREATED), 20)
+        self.assertEqual(self.status_codes.count(status.HTTP_400_BAD_REQUEST), 20)
+        self.assertEqual(get_account_balance(self.account.id), 0.0)
+        self.assertEqual(compute_account_balance(self.account.id), 0.0)
+
+    def test_parallel_movements_of_different_accounts(self):
+        outflow = {"account": self.account.id, "movement_type": "cash_outflow", "amount": 10}
+        inflow = {"account": self.other_account.id, "movement_type": "cash_inflow", "amount": 10}
+
+        self.run_threads([outflow, inflow] * (self.threads // 2))
+
+        self.assertEqual(self.status_codes.count(status.HTTP_201_CREATED), self.threads * self.movements_per_thread)
+        self.assertEqual(Movement.objects.filter(account=self.other_account).count(), 20)
+        self.assertEqual(get_account_balance(self.account.id), 800.0)
+        self.assertEqual(get_account_balance(self.other_account.id), 200.0)
+
+
+class MovementBulkCreateTestCase(TestCase):
+    def setUp(self):
+        client = ClientFactory()
+        client.save()
+        self.account = AccountFactory(client=client)
+        self.account.save()
+        self.other_account = AccountFactory(client=client)
+        self.other_account.save()
+
+        self.url = reverse("movements_bulk")
+
+    def test_bulk_create_movements_success(self):
+        data = [
+            {"account": self.account.id, "movement_type": "cash_inflow", "amount": 1000},
+            {"account": self.other_account.id, "movement_type": "cash_inflow", "amount": 300},
+            {"account": self.account.id, "movement_type": "cash_outflow", "amount": 400},
+        ]
+
+        response = self.client.post(
+            path=self.url,
+            data=data,
+            content_type="application/json"
+        )
+
+        response_json = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_json["created"], 3)
+        self.assertEqual([result["status"] for result in response_json["results"]], ["created"] * 3)
+        self.assertEqual(get_account_balance(self.account.id), 600.0)
+        self.assertEqual(get_account_balance(self.other_account.id), 300.0)
+        self.assertEqual(compute_account_balance(self.account.id), 600.0)
+
+    def test_bulk_create_movements_reports_failed_rows(self):
+        data = [
+            {"account": self.account.id, "movement_type": "cash_inflow", "amount": 500},
+            {"account": self.account.id, "movement_type": "cash_outflow", "amount": 400},
+            {"account": self.account.id, "movement_type": "cash_outflow", "amount": 200},
+            {"account": 999, "movement_type": "cash_inflow", "amount": 10},
+            {"account": self.account.id, "movement_type": "invalid", "amount": 10},
+            {"account": self.account.id, "movement_type": "cash_outflow", "amount": 100},
+        ]
+
+        response = self.client.post(
+            path=f"{self.url}?batch_size=2",
+            data=data,
+            content_type="application/json"
+        )
+
+        response_json = json.loads(response.content)
+        results = response_json["results"]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_json["created"], 3)
+        self.assertEqual(response_json["rejected"], 3)
+        self.assertEqual([result["index"] for result in results], list(range(6)))
+        self.assertIn("Your account balance is lower than the amount that you want to extract.",
+                      results[2]["errors"]["field_amount"])
+        self.assertIn("Invalid pk \"999\" - object does not exist.", results[3]["errors"]["account"])
+        self.assertIn("movement_type", results[4]["errors"])
+        self.assertEqual(results[5]["status"], "created")
+        self.assertEqual(get_account_balance(self.account.id), 0.0)
+
+    def test_bulk_create_movements_from_ndjson(self):
+        lines = [
+            json.dumps({"account": self.account.id, "movement_type": "cash_inflow", "amount": 100}),
+            "",
+            json.dumps({"account": self.account.id, "movement_type": "cash_inflow", "amount": 50}),
+        ]
+
+        response = self.client.post(
+            path=self.url,
+            data="\n".join(lines),
+            content_type="application/x-ndjson"
+        )
+
+        response_json = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_json["created"], 2)
+        self.assertEqual(get_account_balance(self.account.id), 150.0)
+
+    def test_bulk_create_movements_fails_invalid_ndjson(self):
+        response = self.client.post(
+            path=self.url,
+            data='{"account": 1}\n{"account"',
+            content_type="application/x-ndjson"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_movements_fails_payload_is_not_a_list(self):
+        response = self.client.post(
+            path=self.url,
+            data={"account": self.account.id},
+            content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MovementExportTestCase(TestCase):
+    def setUp(self):
+        client = ClientFactory()
+        client.save()
+        self.account = AccountFactory(client=client)
+        self.account.save()
+        self.other_account = AccountFactory(client=client)
+        self.other_account.save()
+
+        MovementFactory(account=self.account, amount=1000.0).save()
+        MovementFactory(account=self.account, movement_type="cash_outflow", amount=250.5).save()
+        MovementFactory(account=self.other_account, amount=10.0).save()
+
+        self.url = reverse("movements_export")
+
+    def test_export_account_movements_csv(self):
+        response = self.client.get(path=self.url, data={"account": self.account.id})
+
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(rows[0], ["id", "account", "movement_type", "amount", "date"])
+        self.assertEqual([row[2:4] for row in rows[1:]], [["cash_inflow", "1000.0"], ["cash_outflow", "250.5"]])
+
+    def test_export_client_movements_ndjson_gzip(self):
+        response = self.client.get(path=self.url, data={"client": self.account.client_id,
+                                                        "output": "ndjson",
+                                                        "compress": "gzip"})
+
+        content = gzip.decompress(b"".join(response.streaming_content)).decode()
+        movements = [json.loads(line) for line in content.splitlines()]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(len(movements), 3)
+        self.assertEqual(movements[2], {"id": movements[2]["id"], "account": self.other_account.id,
+                                        "movement_type": "cash_inflow", "amount": 10.0,
+                                        "date": movements[2]["date"]})
+
+    def test_export_movements_does_not_depend_on_movement_count(self):
+        for _ in range(10):
+            MovementFactory(account=self.account).save()
+
+        with self.assertNumQueries(2):
+            response = self.client.get(path=self.url, data={"account": self.account.id, "output": "ndjson"})
+            content = b"".join(response.streaming_content)
+
+        self.assertEqual(len(content.splitlines()), 12)
+
+    def test_export_movements_fails_account_not_found(self):
+        response = self.client.get(path=self.url, data={"account": 999})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_export_movements_fails_invalid_parameters(self):
+        response = self.client.get(path=self.url, data={"account": self.account.id, "output": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(path=self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,94 @@
+from django.db import transaction
+
+from core.metrics.collectors import MOVEMENTS_CREATED
+from core.metrics.collectors import MOVEMENTS_REJECTED
+from core.models import Account
+from core.models import AccountDailyBalance
+from core.models import CategoryBalance
+from core.models import Client
+from core.models import Movement
+
+INSUFFICIENT_BALANCE_MESSAGE = "Your account balance is lower than the amount that you want to extract."
+
+
+class InsufficientBalance(Exception):
+    pass
+
+
+def create_movement(account_id, movement_type, amount, date=None):
+    """
+    Checks the account balance and inserts the movement as a single atomic operation.
+
+    Only the account row is locked (SELECT ... FOR UPDATE), and only for the check and the insert,
+    so concurrent outflows of the same account are serialized while other accounts never wait.
+    """
+    with transaction.atomic():
+        balance = Account.objects.select_for_update().values_list("balance", flat=True).get(pk=account_id)
+        if movement_type == "cash_outflow" and balance < float(amount):
+            MOVEMENTS_REJECTED.inc(reason="insufficient_balance")
+            raise InsufficientBalance(INSUFFICIENT_BALANCE_MESSAGE)
+
+        movement = Movement(account_id=account_id, movement_type=movement_type, amount=amount)
+        if date is not None:
+            movement.date = date
+        movement.save()
+
+    MOVEMENTS_CREATED.inc(movement_type=movement_type)
+    return movement
+
+
+def bulk_create_movements(rows):
+    """
+    Creates a batch of already validated movements in a single transaction.
+
+    rows is a list of (index, data) pairs where data has the "account" id, "movement_type", "amount"
+    and optionally "date". The accounts of the batch are locked in id order, the outflows are
+    checked against a running balance per account, and the accepted movements are inserted with
+    one bulk_create.
+    Returns a dict {index: result} with a "created" or "rejected" result for every row.
+    """
+    results = {}
+    account_ids = sorted({data["account"] for _, data in rows})
+
+    with transaction.atomic():
+        # The accounts of soft deleted clients are rejected like unknown ones. Only the account rows are locked.
+        balances = dict(Account.objects.alive().select_for_update(of=("self",)).filter(
+            pk__in=account_ids
+        ).order_by("id").values_list("id", "balance"))
+        accepted = []
+        for index, data in rows:
+            account_id = data["account"]
+            if account_id not in balances:
+                MOVEMENTS_REJECTED.inc(reason="unknown_account")
+                results[index] = {"index": index, "status": "rejected",
+                                  "errors": {"account": [f"Invalid pk \"{account_id}\" - object does not exist."]}}
+                continue
+
+            # The fields left out of the item keep their model defaults.
+            movement = Movement(account_id=account_id, **{field: value for field, value in data.items()
+                                                          if field != "account"})
+            if movement.movement_type == "cash_outflow" and balances[account_id] < float(movement.amount):
+                MOVEMENTS_REJECTED.inc(reason="insufficient_balance")
+                results[index] = {"index": index, "status": "rejected",
+                                  "errors": {"field_amount": [INSUFFICIENT_BALANCE_MESSAGE]}}
+                continue
+
+            balances[account_id] += movement.get_signed_amount()
+            accepted.append((index, movement))
+
+        Movement.objects.bulk_create([movement for _, movement in accepted])
+
+        touched_accounts = {movement.account_id for _, movement in accepted}
+        Account.objects.bulk_update([Account(id=account_id, balance=balances[account_id])
+                                     for account_id in touched_accounts], ["balance"])
+        AccountDailyBalance.objects.add_totals(movement.get_daily_totals() for _, movement in accepted)
+        CategoryBalance.objects.add_balances((movement.account_id, movement.get_signed_amount())
+                                             for _, movement in accepted)
+        if touched_accounts:
+            Client.objects.filter(account__id__in=touched_accounts).bump_version()
+
+    for index, movement in accepted:
+        MOVEMENTS_CREATED.inc(movement_type=movement.movement_type)
+        results[index] = {"index": index, "status": "created", "id": movement.id}
+
+    return results
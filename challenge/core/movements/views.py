@@ -1,11 +1,25 @@
+from django.conf import settings
 from django.http import Http404
+from django.http import JsonResponse
+from django.http import StreamingHttpResponse
+from django.utils.text import compress_sequence
+from django.views import View
 from rest_framework import status
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from core.metrics.collectors import MOVEMENTS_REJECTED
+from core.models import Account
+from core.models import Client
 from core.models import Movement
+from core.movements.export import EXPORT_FORMATS
+from core.movements.export import iter_movement_rows
+from core.movements.parsers import NDJSONParser
+from core.movements.serializers import MovementBulkItemSerializer
 from core.movements.serializers import MovementSerializer
+from core.movements.utils import bulk_create_movements
+from core.parsers import FastJSONParser
 
 
 class MovementCreate(APIView):
@@ -19,6 +33,9 @@ class MovementCreate(APIView):
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
+        # The insufficient balance rejections are counted by the serializer.
+        if "field_amount" not in serializer.errors:
+            MOVEMENTS_REJECTED.inc(reason="invalid")
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -27,11 +44,112 @@ class MovementDetailDelete(APIView):
     This view returns specific client information and allows you to delete it and update it.
     """
     def get(self, request, pk):
-        movement = get_object_or_404(Movement.objects.all(), pk=pk)
+        movement = get_object_or_404(Movement.objects.alive(), pk=pk)
         serializer = MovementSerializer(movement)
         return Response(serializer.data)
 
     def delete(self, request, pk):
-        movement = get_object_or_404(Movement.objects.all(), pk=pk)
+        movement = get_object_or_404(Movement.objects.alive(), pk=pk)
         movement.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncMovementDetail(View):
+    """
+    Async variant of the specific movement information, read through the async ORM.
+    """
+    async def get(self, request, pk):
+        movement = await Movement.objects.alive().select_related("account__client").filter(pk=pk).afirst()
+        if movement is None:
+            raise Http404
+
+        serializer = MovementSerializer(movement)
+        return JsonResponse(serializer.data)
+
+
+class MovementBulkCreate(APIView):
+    """
+    This view creates many movements at once, it accepts a JSON array or NDJSON (application/x-ndjson):
+
+        [{"account": 1, "movement_type": "cash_inflow", "amount": 1000},
+         {"account": 1, "movement_type": "cash_outflow", "amount": 200}]
+
+    The movements are written in batches of `?batch_size=` items. Invalid movements are reported
+    in the results with their index and errors, without aborting the rest of the batch.
+    """
+    parser_classes = [FastJSONParser, NDJSONParser]
+
+    def get_batch_size(self, request):
+        try:
+            batch_size = int(request.query_params.get("batch_size", settings.MOVEMENTS_BULK_BATCH_SIZE))
+        except ValueError:
+            batch_size = settings.MOVEMENTS_BULK_BATCH_SIZE
+        return max(1, min(batch_size, settings.MOVEMENTS_BULK_MAX_BATCH_SIZE))
+
+    def post(self, request):
+        if not isinstance(request.data, list):
+            return Response({"non_field_errors": ["Expected a list of movements."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = {}
+        valid_rows = []
+        for index, item in enumerate(request.data):
+            serializer = MovementBulkItemSerializer(data=item)
+            if serializer.is_valid():
+                valid_rows.append((index, serializer.validated_data))
+            else:
+                MOVEMENTS_REJECTED.inc(reason="invalid")
+                results[index] = {"index": index, "status": "rejected", "errors": serializer.errors}
+
+        batch_size = self.get_batch_size(request)
+        for start in range(0, len(valid_rows), batch_size):
+            results.update(bulk_create_movements(valid_rows[start:start + batch_size]))
+
+        results = [results[index] for index in range(len(request.data))]
+        created = sum(1 for result in results if result["status"] == "created")
+
+        return Response({"created": created,
+                         "rejected": len(results) - created,
+                         "results": results})
+
+
+class MovementExport(APIView):
+    """
+    This view streams every movement of an account or a client, ordered by id.
+
+     * ?account=1 or ?client=1 selects the movements to export.
+     * ?output=csv (default) or ?output=ndjson selects the format.
+     * ?compress=gzip compresses the response (Content-Encoding: gzip).
+
+    """
+    def get(self, request):
+        output = request.query_params.get("output", "csv")
+        if output not in EXPORT_FORMATS:
+            return Response({"output": [f"\"{output}\" is not a valid choice."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if "account" in request.query_params:
+            account = get_object_or_404(Account.objects.alive(), pk=request.query_params["account"])
+            movements = Movement.objects.filter(account_id=account.id)
+            filename = f"account_{account.id}_movements"
+        elif "client" in request.query_params:
+            client = get_object_or_404(Client.objects.all(), pk=request.query_params["client"])
+            movements = Movement.objects.filter(account__client_id=client.id)
+            filename = f"client_{client.id}_movements"
+        else:
+            return Response({"non_field_errors": ["An account or client parameter is required."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        content_type, export = EXPORT_FORMATS[output]
+        rows = iter_movement_rows(movements, settings.MOVEMENTS_EXPORT_CHUNK_SIZE)
+        content = (chunk.encode() for chunk in export(rows))
+
+        compress = request.query_params.get("compress") == "gzip"
+        if compress:
+            content = compress_sequence(content)
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}.{output}"'
+        if compress:
+            response["Content-Encoding"] = "gzip"
+        return response
@@ -0,0 +1,39 @@
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(content, encoding="utf-8"):
+    """
+    Decodes a JSON document from bytes with orjson, or with the json module when orjson is
+    not installed or the content is not UTF-8. Both reject NaN and Infinity.
+    """
+    if orjson is not None and codecs.lookup(encoding).name == "utf-8":
+        return orjson.loads(content)
+    return json.loads(content.decode(encoding), parse_constant=reject_constant)
+
+
+def reject_constant(constant):
+    raise ValueError(f"Out of range float values are not JSON compliant: {constant!r}")
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser that decodes with orjson, see loads().
+    """
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+
+        try:
+            return loads(stream.read(), encoding)
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
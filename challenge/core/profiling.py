@@ -0,0 +1,117 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework import serializers
+
+DEFAULT_PROFILING = {
+    "ENABLED": False,
+    "SAMPLE_RATE": 0.0,
+    "SLOW_REQUEST_MS": 500,
+    "DUMP_DIR": None,
+}
+
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+def get_profiling_options():
+    return {**DEFAULT_PROFILING, **getattr(settings, "PROFILING", {})}
+
+
+class RequestProfile:
+    """
+    Time (in seconds) and number of calls of every timed section of a request, by category.
+    """
+    def __init__(self):
+        self.durations = {}
+        self.counts = {}
+        self.active = set()
+
+    def add(self, category, duration):
+        self.durations[category] = self.durations.get(category, 0.0) + duration
+        self.counts[category] = self.counts.get(category, 0) + 1
+
+    def duration_ms(self, category):
+        return round(self.durations.get(category, 0.0) * 1000, 3)
+
+    def count(self, category):
+        return self.counts.get(category, 0)
+
+
+@contextmanager
+def profile_request():
+    """
+    Collects the timed sections of the block, the sync_to_async threads started inside it
+    share the profile because they copy the context. Nested blocks share the outer profile.
+    """
+    if _current_profile.get() is not None:
+        yield _current_profile.get()
+        return
+
+    profile = RequestProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+@contextmanager
+def timed(category):
+    """
+    Adds the duration of the block to the profile of the current request, if any. Nested blocks
+    of the same category, such as a serializer that renders another one, are only counted once.
+    """
+    profile = _current_profile.get()
+    if profile is None or category in profile.active:
+        yield
+        return
+
+    profile.active.add(category)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.active.discard(category)
+        profile.add(category, time.perf_counter() - start)
+
+
+def profile_query(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add("db", time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def install_query_profiler(sender, connection, **kwargs):
+    # Outside a profiled request the wrapper only reads a context variable. It goes first, so
+    # the execute_wrapper() blocks opened before the connection still pop their own wrapper.
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, profile_query)
+
+
+class ProfiledListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed("serializer"):
+            return super(ProfiledListSerializer, self).data
+
+
+class ProfiledSerializerMixin:
+    """
+    Adds the time spent building serializer.data to the profile of the current request.
+    Serializers used with many=True also need Meta.list_serializer_class = ProfiledListSerializer.
+    """
+    @property
+    def data(self):
+        with timed("serializer"):
+            return super(ProfiledSerializerMixin, self).data
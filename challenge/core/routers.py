@@ -0,0 +1,49 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db import connections
+
+_use_primary = contextvars.ContextVar("use_primary", default=False)
+
+
+@contextmanager
+def use_primary(enabled=True):
+    """
+    Sends the reads of the block to the primary database, ReplicaRoutingMiddleware wraps every
+    unsafe request with it.
+    """
+    token = _use_primary.set(enabled)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends the reads to a random alias of DATABASE_REPLICAS and the writes to the primary.
+
+    Reads stay on the primary when no replica is configured, inside use_primary(), once something
+    was written in the same request (read-your-own-writes) and while a transaction is open on the
+    primary, so select_for_update() and the reads that must see the writes of the transaction
+    never reach a replica.
+    """
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or _use_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _use_primary.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,68 @@
+from functools import cached_property
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+
+from core.profiling import timed
+
+# Fields whose to_representation() returns the database value as it is.
+PASSTHROUGH_FIELDS = (serializers.BooleanField, serializers.CharField, serializers.FloatField,
+                      serializers.IntegerField, serializers.ReadOnlyField)
+
+# Nested serializers, computed fields and relations other than a single primary key.
+UNSUPPORTED_FIELDS = (serializers.BaseSerializer, serializers.ManyRelatedField, serializers.RelatedField,
+                      serializers.SerializerMethodField)
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path of a ModelSerializer for list endpoints.
+
+    The rows are fetched with queryset.values() and the response dicts are built straight from
+    them, without model instances nor the per field dispatch of the serializer, and are
+    rendered to the same JSON. Only flat serializers are supported: plain model fields, dotted
+    sources and primary keys of relations. The fields that don't pass the database value
+    through, such as dates, are converted with their own to_representation().
+
+        values_serializer = ValuesSerializer(ClientSerializer)
+        rows = paginator.paginate_queryset(values_serializer.get_queryset(clients), request)
+        data = values_serializer.to_representation(rows)
+
+    """
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    @cached_property
+    def fields(self):
+        """
+        [(field name, values() lookup, converter or None)] of the readable fields.
+        """
+        if self.serializer_class.to_representation is not serializers.ModelSerializer.to_representation:
+            raise ImproperlyConfigured(f"{self.serializer_class.__name__} overrides to_representation(), "
+                                       f"it can't be read from values().")
+
+        fields = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+
+            primary_key = isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None
+            if field.source == "*" or isinstance(field, UNSUPPORTED_FIELDS) and not primary_key:
+                raise ImproperlyConfigured(f"The {name} field of {self.serializer_class.__name__} can't be "
+                                           f"read from values().")
+
+            converter = None if primary_key or isinstance(field, PASSTHROUGH_FIELDS) else field.to_representation
+            fields.append((name, "__".join(field.source_attrs), converter))
+        return fields
+
+    def get_queryset(self, queryset):
+        return queryset.values(*{lookup: None for _, lookup, _ in self.fields})
+
+    def to_representation(self, rows):
+        with timed("serializer"):
+            fields = self.fields
+            if all(converter is None for _, _, converter in fields):
+                return [{name: row[lookup] for name, lookup, _ in fields} for row in rows]
+
+            return [{name: row[lookup] if converter is None or row[lookup] is None else converter(row[lookup])
+                     for name, lookup, converter in fields} for row in rows]
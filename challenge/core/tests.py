@@ -0,0 +1,311 @@
+import contextvars
+import datetime
+import decimal
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import serializers
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core.client.serializers import AccountSerializer
+from core.client.serializers import ClientSerializer
+from core.factories import AccountFactory
+from core.factories import ClientFactory
+from core.middleware import ProfilingMiddleware
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Client
+from core.models import Movement
+from core.movements.serializers import MovementSerializer
+from core.parsers import FastJSONParser
+from core.profiling import profile_request
+from core.profiling import timed
+from core.renderers import FastJSONRenderer
+from core.routers import PrimaryReplicaRouter
+from core.routers import use_primary
+from core.serializers import ValuesSerializer
+
+
+def run_in_new_context(function, *args):
+    # The router keeps its state in a context variable, every check starts from a clean context.
+    return contextvars.Context().run(function, *args)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class PrimaryReplicaRouterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_database(self):
+        return self.router.db_for_read(Client)
+
+    def read_after_write(self):
+        self.router.db_for_write(Client)
+        return self.read_database()
+
+    def read_with_primary(self):
+        with use_primary():
+            return self.read_database()
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(run_in_new_context(self.read_database), "replica")
+
+    def test_reads_stay_on_primary_after_write(self):
+        self.assertEqual(run_in_new_context(self.read_after_write), "default")
+
+    def test_reads_stay_on_primary_inside_use_primary(self):
+        self.assertEqual(run_in_new_context(self.read_with_primary), "default")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_reads_go_to_primary_without_replicas(self):
+        self.assertEqual(run_in_new_context(self.read_database), "default")
+
+    def test_migrations_only_run_on_primary(self):
+        self.assertTrue(self.router.allow_migrate("default", "core"))
+        self.assertFalse(self.router.allow_migrate("replica", "core"))
+
+    def route_request(self, method):
+        databases = []
+        middleware = ReplicaRoutingMiddleware(lambda request: databases.append(self.read_database()) or HttpResponse())
+        middleware(getattr(self.factory, method)("/"))
+        databases.append(self.read_database())
+        return databases
+
+    def test_middleware_pins_unsafe_requests_to_primary(self):
+        self.assertEqual(run_in_new_context(self.route_request, "get"), ["replica", "replica"])
+        self.assertEqual(run_in_new_context(self.route_request, "post"), ["default", "replica"])
+        self.assertEqual(run_in_new_context(self.route_request, "delete"), ["default", "replica"])
+
+    async def test_async_middleware_pins_unsafe_requests_to_primary(self):
+        databases = []
+
+        async def get_response(request):
+            databases.append(self.read_database())
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        await middleware(self.factory.get("/"))
+        await middleware(self.factory.put("/"))
+
+        self.assertEqual(databases, ["replica", "default"])
+
+
+@unittest.skipUnless("replica" in settings.DATABASES, "Set DB_REPLICA_HOST to run the replica tests.")
+class ReplicaRoutingTestCase(TransactionTestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        client = ClientFactory()
+        client.save()
+        self.account = AccountFactory(client=client)
+        self.account.save()
+
+    def capture(self):
+        return CaptureQueriesContext(connections["default"]), CaptureQueriesContext(connections["replica"])
+
+    def test_safe_requests_read_from_replica(self):
+        primary, replica = self.capture()
+        with primary, replica:
+            response = self.client.get(reverse("clients_accounts", kwargs={"pk": self.account.client_id}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(primary), 0)
+        self.assertEqual(len(replica), 3)
+
+    def test_writes_and_their_reads_use_primary(self):
+        primary, replica = self.capture()
+        with primary, replica:
+            response = self.client.post(reverse("movements"), data={"account": self.account.id,
+                                                                    "movement_type": "cash_inflow",
+                                                                    "amount": 100.0})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertGreater(len(primary), 0)
+        self.assertEqual(len(replica), 0)
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        client = ClientFactory()
+        client.save()
+        self.client_id = client.id
+        self.dump_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dump_dir)
+
+    def profiling(self, **options):
+        return override_settings(PROFILING={"ENABLED": True, "DUMP_DIR": self.dump_dir, **options})
+
+    def test_requests_report_server_timing(self):
+        with self.profiling(), self.assertLogs("core.profiling", level="INFO") as logs:
+            response = self.client.get(reverse("clients_detail", kwargs={"pk": self.client_id}))
+
+        timings = {metric.split(";")[0]: metric for metric in response["Server-Timing"].split(", ")}
+        self.assertEqual(set(timings), {"db", "http", "serializer", "total"})
+        self.assertIn('desc="4 queries"', timings["db"])
+        self.assertIn('desc="0 calls"', timings["http"])
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["route"], "clients_detail")
+        self.assertEqual(record["status"], status.HTTP_200_OK)
+        self.assertEqual(record["db_queries"], 4)
+        self.assertIsNone(record["profile"])
+
+    def test_slow_sampled_requests_dump_their_profile(self):
+        with self.profiling(SAMPLE_RATE=1.0, SLOW_REQUEST_MS=0), self.assertLogs("core.profiling") as logs:
+            self.client.get(reverse("clients_detail", kwargs={"pk": self.client_id}))
+
+        path = json.loads(logs.records[0].getMessage())["profile"]
+        self.assertEqual(os.listdir(self.dump_dir), [os.path.basename(path)])
+
+    def test_disabled_profiling_is_removed_from_the_chain(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: HttpResponse())
+
+        response = self.client.get(reverse("clients_detail", kwargs={"pk": self.client_id}))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_nested_sections_are_counted_once(self):
+        with timed("serializer"):
+            pass
+
+        with profile_request() as profile:
+            with timed("serializer"), timed("serializer"):
+                pass
+            with timed("http"):
+                pass
+
+        self.assertEqual(profile.counts, {"serializer": 1, "http": 1})
+
+
+class FastJSONTestCase(TestCase):
+    def setUp(self):
+        client = ClientFactory()
+        client.save()
+        self.account = AccountFactory(client=client)
+        self.account.save()
+
+    def get_payload(self):
+        movement = self.client.post(reverse("movements"), data={"account": self.account.id,
+                                                                "movement_type": "cash_inflow",
+                                                                "amount": 10.5}).data
+        return {
+            "movements": [movement, MovementSerializer(self.account.movement_set.first()).data],
+            "datetime": timezone.now(),
+            "date": datetime.date(2023, 12, 1),
+            "decimal": decimal.Decimal("10.25"),
+            "uuid": uuid.uuid4(),
+            "lazy": gettext_lazy("Client"),
+            "separators": "line\u2028paragraph\u2029",
+            "unicode": "Cañón",
+            "floats": [1e16, 1e-7, -2.5e-300, 1.5e300, 0.00001, 0.0001, 123456789.125, 10.00001, 100.00005,
+                       -20.000012],
+            "exponent_strings": ["1e16", "0.00001", "\"1e5\""],
+        }
+
+    def test_renders_like_the_drf_renderer(self):
+        payload = self.get_payload()
+
+        self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_falls_back_to_the_drf_renderer(self):
+        payload = {1: "int key", "big": 2 ** 70}
+
+        self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+        self.assertEqual(FastJSONRenderer().render({"a": 1}, "application/json; indent=2"),
+                         JSONRenderer().render({"a": 1}, "application/json; indent=2"))
+        with self.assertRaises(ValueError):
+            FastJSONRenderer().render({"movements": [{"amount": None}, {"amount": float("nan")}]})
+        payload = self.get_payload()
+        with mock.patch("core.renderers.orjson", None):
+            self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_parses_json(self):
+        parser = FastJSONParser()
+
+        self.assertEqual(parser.parse(io.BytesIO('{"name": "Cañón"}'.encode())), {"name": "Cañón"})
+        self.assertEqual(parser.parse(io.BytesIO('{"name": "Cañón"}'.encode("latin-1")),
+                                      parser_context={"encoding": "latin-1"}), {"name": "Cañón"})
+        for content in (b"{", b'{"amount": NaN}'):
+            with self.subTest(content=content), self.assertRaises(ParseError):
+                parser.parse(io.BytesIO(content))
+
+    def test_api_uses_the_fast_classes(self):
+        response = self.client.post(reverse("movements"), data=json.dumps({"account": self.account.id,
+                                                                           "movement_type": "cash_inflow",
+                                                                           "amount": 10.5}),
+                                    content_type="application/json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(json.loads(response.content)["amount"], 10.5)
+
+    def test_numbers_ending_like_an_exponent_are_kept(self):
+        response = self.client.post(reverse("movements"), data={"account": self.account.id,
+                                                                "movement_type": "cash_inflow",
+                                                                "amount": 10.00001})
+
+        self.assertIn(b'"amount":10.00001', response.content)
+        self.assertEqual(FastJSONRenderer().render([100.00005, 0.00001]), b"[100.00005,1e-05]")
+
+
+class FlatMovementSerializer(serializers.ModelSerializer):
+    client = serializers.IntegerField(source="account.client_id")
+
+    class Meta:
+        model = Movement
+        fields = ["id", "account", "client", "movement_type", "amount", "date"]
+
+
+class ValuesSerializerTestCase(TestCase):
+    def setUp(self):
+        for name in ["Cliente", "Cañón \"Comillas\"", "line\u2028break"]:
+            client = ClientFactory(name=name)
+            client.save()
+            account = AccountFactory(client=client)
+            account.save()
+            self.client.post(reverse("movements"), data={"account": account.id, "movement_type": "cash_inflow",
+                                                         "amount": 10.25})
+
+    def assert_same_json(self, serializer_class, queryset):
+        values_serializer = ValuesSerializer(serializer_class)
+        fast = values_serializer.to_representation(values_serializer.get_queryset(queryset))
+
+        renderer = FastJSONRenderer()
+        self.assertEqual(renderer.render(fast), renderer.render(serializer_class(queryset, many=True).data))
+
+    def test_renders_like_the_serializer(self):
+        self.assert_same_json(ClientSerializer, Client.objects.order_by("id"))
+        self.assert_same_json(FlatMovementSerializer, Movement.objects.order_by("id"))
+
+    def test_client_list_renders_like_the_serializer(self):
+        response = self.client.get(reverse("clients"))
+
+        expected = ClientSerializer(Client.objects.order_by("id"), many=True).data
+        self.assertEqual(json.loads(response.content)["results"], json.loads(FastJSONRenderer().render(expected)))
+
+    def test_rejects_serializers_that_need_instances(self):
+        for serializer_class in (AccountSerializer, MovementSerializer):
+            with self.subTest(serializer=serializer_class.__name__), self.assertRaises(ImproperlyConfigured):
+                ValuesSerializer(serializer_class).fields